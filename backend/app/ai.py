@@ -0,0 +1,31 @@
+"""Gemini adapter.
+
+``google.generativeai`` pulls in gRPC and protobuf and takes most of a
+second to import, so it is loaded and configured on the first call rather
+than when the API starts.
+"""
+from app.config import get_settings
+
+settings = get_settings()
+
+MODEL = "gemini-1.5-flash"
+
+_genai = None
+
+
+def _client():
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        _genai = genai
+    return _genai
+
+
+def is_configured() -> bool:
+    return bool(settings.GEMINI_API_KEY)
+
+
+async def generate_text(prompt: str, model: str = MODEL) -> str:
+    response = await _client().GenerativeModel(model).generate_content_async(prompt)
+    return response.text
@@ -0,0 +1,124 @@
+"""Vectorized amortization engine for EMI-based liabilities.
+
+Every function takes NumPy arrays (one element per loan, or per scenario)
+and broadcasts, so a user's whole loan book or a batch of what-if scenarios
+is evaluated in a handful of array operations. Projections use float64 and
+are rounded to paise only when they leave the engine.
+
+Conventions: ``balance`` is the outstanding principal today, ``rate`` the
+monthly rate (annual percent / 1200) and ``emi`` the monthly instalment.
+"""
+from datetime import date
+
+import numpy as np
+
+# Schedules are capped at 50 years
+MAX_MONTHS = 600
+
+
+def monthly_rate(annual_percent) -> np.ndarray:
+    return np.asarray(annual_percent, dtype=np.float64) / 1200.0
+
+
+def balance_after(balance, rate, emi, months) -> np.ndarray:
+    """Outstanding principal after ``months`` instalments (may go negative)."""
+    growth = (1.0 + rate) ** months
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annuity = np.where(rate > 0, (growth - 1.0) / rate, months)
+    return balance * growth - emi * annuity
+
+
+def remaining_months(balance, rate, emi) -> np.ndarray:
+    """Instalments left until payoff; ``inf`` where the EMI never covers interest."""
+    balance, rate, emi = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64) for a in (balance, rate, emi)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = 1.0 - rate * balance / emi
+        months = np.where(rate > 0, -np.log(ratio) / np.log1p(rate), balance / emi)
+    months = np.where((emi <= 0) | ((rate > 0) & (ratio <= 0)), np.inf, months)
+    # Guard against float noise turning an exact 12.0 into 13 instalments
+    months = np.ceil(months - 1e-9)
+    return np.where(balance <= 0, 0.0, months)
+
+
+def interest_outstanding(balance, rate, emi, months=None) -> np.ndarray:
+    """Interest still to be paid over the remaining tenure (``inf`` if unbounded)."""
+    if months is None:
+        months = remaining_months(balance, rate, emi)
+    finite = np.isfinite(months) & (months > 0)
+    n = np.where(finite, months, 1.0)
+    # The last instalment only clears what is left
+    final_payment = balance_after(balance, rate, emi, n - 1) * (1.0 + rate)
+    interest = emi * (n - 1) + final_payment - balance
+    return np.where(finite, interest, np.where(months == 0, 0.0, np.inf))
+
+
+def emi_for(balance, rate, months) -> np.ndarray:
+    """Instalment that clears ``balance`` in ``months`` payments."""
+    balance, rate, months = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64) for a in (balance, rate, months)))
+    growth = (1.0 + rate) ** months
+    with np.errstate(divide="ignore", invalid="ignore"):
+        emi = np.where(rate > 0, balance * rate * growth / (growth - 1.0), balance / months)
+    return np.where(months > 0, emi, 0.0)
+
+
+def schedule(balance, rate, emi, months: int):
+    """Month-by-month schedule for many loans: arrays shaped (loans, months).
+
+    Returns ``(payment, principal, interest, closing_balance)``; rows past a
+    loan's payoff are zero.
+    """
+    balance, rate, emi = (np.atleast_1d(np.asarray(a, dtype=np.float64))[:, None] for a in (balance, rate, emi))
+    k = np.arange(months, dtype=np.float64)[None, :]
+    opening = np.clip(balance_after(balance, rate, emi, k), 0.0, None)
+    interest = opening * rate
+    payment = np.minimum(emi, opening + interest)
+    principal = payment - interest
+    closing = np.clip(opening - principal, 0.0, None)
+    return payment, principal, interest, closing
+
+
+def _month_start(months: np.ndarray) -> np.ndarray:
+    return months.astype("datetime64[M]").astype("datetime64[D]")
+
+
+def _due_in_month(months: np.ndarray, emi_day: np.ndarray) -> np.ndarray:
+    """EMI date in each month, clamping e.g. day 31 to the month's last day."""
+    start = _month_start(months)
+    length = (_month_start(months + 1) - start).astype(np.int64)
+    return start + (np.minimum(emi_day, length) - 1).astype("timedelta64[D]")
+
+
+def next_emi_dates(emi_day, today: date) -> np.ndarray:
+    """Next EMI date on or after ``today`` for each loan (datetime64[D])."""
+    emi_day = np.atleast_1d(np.asarray(emi_day, dtype=np.int64))
+    this_month = np.full(emi_day.shape, np.datetime64(today, "M"))
+    due = _due_in_month(this_month, emi_day)
+    return np.where(due < np.datetime64(today, "D"), _due_in_month(this_month + 1, emi_day), due)
+
+
+def emi_dates(first_due: np.datetime64, emi_day: int, count: int) -> np.ndarray:
+    months = np.datetime64(first_due, "M") + np.arange(count)
+    return _due_in_month(months, np.full(count, emi_day, dtype=np.int64))
+
+
+def evaluate_prepayments(balance: float, rate: float, emi: float, lump_sum, extra_monthly, reduce_emi):
+    """Evaluate a batch of prepayment scenarios against one loan.
+
+    ``reduce_emi`` selects, per scenario, whether the lump sum lowers the
+    instalment (keeping tenure) or shortens tenure (keeping the instalment).
+    ``extra_monthly`` is added on top of the instalment in either mode.
+    Returns ``(new_emi, months, interest)`` arrays, one element per scenario.
+    """
+    lump_sum = np.asarray(lump_sum, dtype=np.float64)
+    extra_monthly = np.asarray(extra_monthly, dtype=np.float64)
+    reduce_emi = np.asarray(reduce_emi, dtype=bool)
+
+    base_months = remaining_months(balance, rate, emi)
+    new_balance = np.clip(balance - lump_sum, 0.0, None)
+    kept_tenure_emi = emi_for(new_balance, rate, np.where(np.isfinite(base_months), base_months, MAX_MONTHS))
+    new_emi = np.where(reduce_emi, kept_tenure_emi, emi)
+
+    paying = new_emi + extra_monthly
+    months = remaining_months(new_balance, rate, paying)
+    interest = interest_outstanding(new_balance, rate, paying, months)
+    return new_emi, months, interest
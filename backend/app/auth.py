@@ -26,9 +26,12 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def create_access_token(user_id: UUID) -> str:
+def create_access_token(user_id: UUID, plan: str = None) -> str:
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     payload = {"sub": str(user_id), "exp": expire, "type": "access"}
+    if plan:
+        # Lets the rate limiter pick plan limits without a database lookup
+        payload["plan"] = plan
     return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
 
 
@@ -74,7 +77,9 @@ async def get_current_user(
             detail="Invalid token payload",
         )
     
-    result = await db.execute(select(User).where(User.id == UUID(user_id)))
+    result = await db.execute(
+        select(User).where(User.id == UUID(user_id)).where(User.deleted_at.is_(None))
+    )
     user = result.scalar_one_or_none()
     
     if user is None:
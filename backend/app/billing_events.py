@@ -0,0 +1,576 @@
+"""Billing webhook events: verification, storage and ordered processing.
+
+The webhook only verifies the signature and stores the event under its
+provider event id, so bursts are acknowledged quickly and redeliveries are
+no-ops. Stored events are applied to ``Subscription`` / ``User.plan`` by
+background workers; events of one customer always go to the same worker
+and are additionally serialised across processes with an advisory lock.
+Events for a customer no user is linked to yet wait as ``unlinked`` and are
+applied, in the order they occurred, once an event links the customer.
+
+Replay stored events (e.g. after fixing a processing bug)::
+
+    python -m app.billing_events replay --status failed
+    python -m app.billing_events replay --customer cus_123
+    python -m app.billing_events replay --event-id evt_1 --event-id evt_2
+
+Print a locally signed fake event for testing the webhook::
+
+    python -m app.billing_events fake stripe customer.subscription.updated --customer cus_123 --plan pro
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Mapping, Optional, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import and_, exists, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session
+from app.entitlements import invalidate_entitlements, max_accounts_for
+from app.models import BillingEvent, Subscription, User
+from app.versions import bump_versions, PROFILE
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Statuses that need no further processing; "unlinked" events are re-driven by
+# the event that links their customer
+FINISHED = ("processed", "ignored", "skipped")
+STATUSES = ("pending", "processed", "ignored", "skipped", "unlinked", "failed")
+
+
+class SignatureError(ValueError):
+    pass
+
+
+class UnknownPlanError(ValueError):
+    pass
+
+
+# ============ Signatures ============
+
+def sign_stripe(body: bytes, secret: str, timestamp: int = None) -> str:
+    """``Stripe-Signature`` header value for ``body``."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_stripe(body: bytes, header: str, secret: str, tolerance: int = None) -> None:
+    tolerance = settings.STRIPE_WEBHOOK_TOLERANCE_SECONDS if tolerance is None else tolerance
+    parts: Dict[str, List[str]] = {}
+    for item in header.split(","):
+        key, _, value = item.strip().partition("=")
+        parts.setdefault(key, []).append(value)
+
+    try:
+        timestamp = int(parts["t"][0])
+    except (KeyError, ValueError):
+        raise SignatureError("Malformed Stripe-Signature header")
+    if abs(time.time() - timestamp) > tolerance:
+        raise SignatureError("Stripe signature timestamp outside tolerance")
+
+    expected = sign_stripe(body, secret, timestamp).split("v1=", 1)[1]
+    if not any(hmac.compare_digest(expected, candidate) for candidate in parts.get("v1", [])):
+        raise SignatureError("Invalid Stripe signature")
+
+
+def sign_razorpay(body: bytes, secret: str) -> str:
+    """``X-Razorpay-Signature`` header value for ``body``."""
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_razorpay(body: bytes, signature: str, secret: str) -> None:
+    if not hmac.compare_digest(sign_razorpay(body, secret), signature):
+        raise SignatureError("Invalid Razorpay signature")
+
+
+def _timestamp(value) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, tz=timezone.utc) if value else None
+
+
+def parse_webhook(body: bytes, headers: Mapping[str, str]) -> BillingEvent:
+    """Verify a webhook delivery and turn it into an unsaved ``BillingEvent``.
+
+    Raises ``SignatureError`` when the provider cannot be identified or the
+    signature does not match.
+    """
+    if "stripe-signature" in headers:
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            raise SignatureError("Stripe webhooks are not configured")
+        verify_stripe(body, headers["stripe-signature"], settings.STRIPE_WEBHOOK_SECRET)
+        payload = json.loads(body)
+        return BillingEvent(
+            provider="stripe",
+            event_id=payload["id"],
+            event_type=payload["type"],
+            customer_id=payload["data"]["object"].get("customer"),
+            occurred_at=_timestamp(payload.get("created")),
+            payload=payload,
+        )
+
+    if "x-razorpay-signature" in headers:
+        if not settings.RAZORPAY_WEBHOOK_SECRET:
+            raise SignatureError("Razorpay webhooks are not configured")
+        verify_razorpay(body, headers["x-razorpay-signature"], settings.RAZORPAY_WEBHOOK_SECRET)
+        payload = json.loads(body)
+        entity = payload.get("payload", {}).get("subscription", {}).get("entity", {})
+        # Razorpay only sends the event id as a header
+        event_id = headers.get("x-razorpay-event-id") or hashlib.sha256(body).hexdigest()
+        return BillingEvent(
+            provider="razorpay",
+            event_id=event_id,
+            event_type=payload["event"],
+            customer_id=entity.get("customer_id"),
+            occurred_at=_timestamp(payload.get("created_at")),
+            payload=payload,
+        )
+
+    raise SignatureError("Missing webhook signature")
+
+
+async def store_event(db: AsyncSession, event: BillingEvent) -> Optional[UUID]:
+    """Insert ``event`` unless it was already received; returns the new row id."""
+    stmt = (
+        insert(BillingEvent)
+        .values(
+            provider=event.provider,
+            event_id=event.event_id,
+            event_type=event.event_type,
+            customer_id=event.customer_id,
+            occurred_at=event.occurred_at,
+            payload=event.payload,
+            status="pending",
+            attempts=0,
+        )
+        .on_conflict_do_nothing(constraint="uq_billing_events_provider_event")
+        .returning(BillingEvent.id)
+    )
+    return await db.scalar(stmt)
+
+
+# ============ Applying events ============
+
+STRIPE_STATUS = {
+    "active": "active",
+    "trialing": "trialing",
+    "past_due": "past_due",
+    "unpaid": "past_due",
+    "incomplete": "past_due",
+    "paused": "past_due",
+    "canceled": "cancelled",
+    "incomplete_expired": "cancelled",
+}
+
+RAZORPAY_STATUS = {
+    "authenticated": "active",
+    "active": "active",
+    "pending": "past_due",
+    "halted": "past_due",
+    "paused": "past_due",
+    "cancelled": "cancelled",
+    "completed": "cancelled",
+    "expired": "cancelled",
+}
+
+BILLING_CYCLES = {"month": "monthly", "monthly": "monthly", "year": "yearly", "yearly": "yearly"}
+
+
+def _plan(plan: Optional[str], lookup_key: Optional[str] = None) -> Optional[str]:
+    """A known plan from event metadata, else from a Stripe price lookup key.
+
+    Raises ``UnknownPlanError`` for anything else, so the event fails rather
+    than writing a plan no entitlement knows about.
+    """
+    if not plan and lookup_key:
+        plan = settings.BILLING_PRICE_PLANS.get(lookup_key)
+        if plan is None:
+            raise UnknownPlanError(f"price lookup key {lookup_key!r} is not in BILLING_PRICE_PLANS")
+    if plan and plan not in settings.PLAN_MAX_ACCOUNTS:
+        raise UnknownPlanError(f"unknown plan {plan!r}")
+    return plan or None
+
+
+def _user_id(value) -> Optional[UUID]:
+    try:
+        return UUID(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+def _stripe_change(event_type: str, obj: dict) -> Optional[dict]:
+    if event_type == "checkout.session.completed":
+        return {
+            "user_id": _user_id(obj.get("client_reference_id")),
+            "subscription_id": obj.get("subscription"),
+            "plan": _plan((obj.get("metadata") or {}).get("plan")),
+        }
+    if event_type in ("customer.subscription.created", "customer.subscription.updated", "customer.subscription.deleted"):
+        items = (obj.get("items") or {}).get("data") or [{}]
+        price = items[0].get("price") or {}
+        status = "cancelled" if event_type.endswith(".deleted") else STRIPE_STATUS.get(obj.get("status"))
+        return {
+            "user_id": _user_id((obj.get("metadata") or {}).get("user_id")),
+            "subscription_id": obj.get("id"),
+            "plan": _plan((obj.get("metadata") or {}).get("plan"), price.get("lookup_key")),
+            "status": status,
+            "billing_cycle": BILLING_CYCLES.get((price.get("recurring") or {}).get("interval")),
+            "current_period_start": _timestamp(obj.get("current_period_start")),
+            "current_period_end": _timestamp(obj.get("current_period_end")),
+        }
+    if event_type == "invoice.payment_failed":
+        return {"status": "past_due"}
+    return None
+
+
+def _razorpay_change(event_type: str, entity: dict) -> Optional[dict]:
+    if not event_type.startswith("subscription."):
+        return None
+    notes = entity.get("notes") or {}
+    return {
+        "user_id": _user_id(notes.get("user_id")),
+        "subscription_id": entity.get("id"),
+        "plan": _plan(notes.get("plan")),
+        "status": RAZORPAY_STATUS.get(entity.get("status")),
+        "billing_cycle": BILLING_CYCLES.get(notes.get("billing_cycle")),
+        "current_period_start": _timestamp(entity.get("current_start")),
+        "current_period_end": _timestamp(entity.get("current_end")),
+    }
+
+
+def subscription_change(event: BillingEvent) -> Optional[dict]:
+    """Subscription fields carried by ``event``, or ``None`` for events we ignore."""
+    if event.provider == "stripe":
+        return _stripe_change(event.event_type, event.payload["data"]["object"])
+    entity = event.payload.get("payload", {}).get("subscription", {}).get("entity", {})
+    return _razorpay_change(event.event_type, entity)
+
+
+async def apply_change(db: AsyncSession, event: BillingEvent, change: dict) -> Optional[UUID]:
+    """Update the customer's subscription and plan; returns the user id, or ``None`` if unknown."""
+    customer_key = f"{event.provider}_customer_id"
+    subscription_key = f"{event.provider}_subscription_id"
+
+    sub = None
+    if event.customer_id:
+        sub = await db.scalar(
+            select(Subscription).where(getattr(Subscription, customer_key) == event.customer_id)
+        )
+    if sub is None and change.get("user_id"):
+        sub = await db.scalar(select(Subscription).where(Subscription.user_id == change["user_id"]))
+        if sub is None:
+            if await db.get(User, change["user_id"]) is None:
+                return None
+            sub = Subscription(user_id=change["user_id"], plan="free", max_accounts=max_accounts_for("free"))
+            db.add(sub)
+    if sub is None:
+        return None
+
+    if event.customer_id:
+        setattr(sub, customer_key, event.customer_id)
+    if change.get("subscription_id"):
+        setattr(sub, subscription_key, change["subscription_id"])
+    for field in ("status", "billing_cycle", "current_period_start", "current_period_end"):
+        if change.get(field) is not None:
+            setattr(sub, field, change[field])
+
+    if change.get("status") == "cancelled":
+        sub.plan = "free"
+    elif change.get("plan"):
+        sub.plan = change["plan"]
+    sub.max_accounts = max_accounts_for(sub.plan)
+
+    await db.flush()
+    await db.execute(
+        update(User)
+        .where(User.id == sub.user_id)
+        .values(plan=sub.plan, plan_expires_at=None if sub.plan == "free" else sub.current_period_end)
+    )
+    await bump_versions(db, sub.user_id, PROFILE)
+    return sub.user_id
+
+
+def _superseded(event: BillingEvent):
+    """A newer event for the same customer has already been applied."""
+    return exists().where(
+        BillingEvent.provider == event.provider,
+        BillingEvent.customer_id == event.customer_id,
+        BillingEvent.status == "processed",
+        BillingEvent.occurred_at > event.occurred_at,
+        BillingEvent.id != event.id,
+    )
+
+
+async def _apply_unlinked(db: AsyncSession, event: BillingEvent) -> None:
+    """Apply the customer's ``unlinked`` events now that ``event`` linked it.
+
+    ``event`` is applied again in its place among them, so the subscription
+    ends up as if every event had arrived in order. An event that fails is
+    marked failed without holding up the rest.
+    """
+    waiting = (await db.scalars(
+        select(BillingEvent)
+        .where(BillingEvent.provider == event.provider)
+        .where(BillingEvent.customer_id == event.customer_id)
+        .where(BillingEvent.status == "unlinked")
+        .where(BillingEvent.id != event.id)
+        .with_for_update()
+    )).all()
+    if not waiting:
+        return
+
+    # Nothing from outside may be flushed, and so expired, inside the savepoints below
+    await db.flush()
+    now = datetime.now(timezone.utc)
+    earliest = datetime.min.replace(tzinfo=timezone.utc)
+    for other in sorted([*waiting, event], key=lambda e: (e.occurred_at or earliest, e.received_at or now)):
+        if other is event:
+            await apply_change(db, event, subscription_change(event))
+            continue
+        other_pk = other.id
+        try:
+            async with db.begin_nested():
+                await apply_change(db, other, subscription_change(other))
+        except Exception as exc:
+            logger.exception("billing event %s failed", other_pk)
+            await db.execute(
+                update(BillingEvent)
+                .where(BillingEvent.id == other_pk)
+                .values(status="failed", attempts=BillingEvent.attempts + 1, error=str(exc)[:1000])
+            )
+        else:
+            other.status = "processed"
+            other.error = None
+            other.attempts += 1
+            other.processed_at = now
+
+
+async def process_event(event_pk: UUID, force: bool = False) -> str:
+    """Apply one stored event; returns its final status."""
+    async with async_session() as db:
+        event = await db.get(BillingEvent, event_pk, with_for_update=True)
+        if event is None:
+            return "missing"
+        if event.status in FINISHED and not force:
+            return event.status
+
+        user_id = None
+        try:
+            if event.customer_id:
+                # Serialise one customer's events across workers and processes
+                await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"{event.provider}:{event.customer_id}"))))
+
+            change = subscription_change(event)
+            if change is None:
+                event.status = "ignored"
+            elif event.customer_id and event.occurred_at and await db.scalar(select(_superseded(event))):
+                event.status = "skipped"
+                event.error = "superseded by a newer event"
+            else:
+                user_id = await apply_change(db, event, change)
+                if user_id:
+                    event.status = "processed"
+                    event.error = None
+                    if event.customer_id:
+                        await _apply_unlinked(db, event)
+                elif event.customer_id:
+                    # Waits for the event that links this customer to a user
+                    event.status = "unlinked"
+                    event.error = "customer not linked to a user yet"
+                else:
+                    event.status = "skipped"
+                    event.error = "unknown customer"
+
+            event.attempts += 1
+            event.processed_at = datetime.now(timezone.utc)
+            status = event.status
+            await db.commit()
+        except Exception as exc:
+            logger.exception("billing event %s failed", event_pk)
+            await db.rollback()
+            await db.execute(
+                update(BillingEvent)
+                .where(BillingEvent.id == event_pk)
+                .values(status="failed", attempts=BillingEvent.attempts + 1, error=str(exc)[:1000])
+            )
+            await db.commit()
+            return "failed"
+
+    if user_id:
+        invalidate_entitlements(user_id)
+    return status
+
+
+class EventDispatcher:
+    """Background workers for stored events, one queue per shard of customers.
+
+    Sharding by customer keeps each customer's events in arrival order while
+    different customers are processed concurrently.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._queues = [asyncio.Queue() for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+
+    async def stop(self, timeout: float = 0) -> None:
+        """Let queued events finish for up to ``timeout`` seconds, then stop the workers.
+
+        Anything still queued stays ``pending`` and is picked up by
+        ``process_pending_events`` later.
+        """
+        if timeout > 0 and self._tasks:
+            try:
+                await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("stopping with %d billing events queued", sum(q.qsize() for q in self._queues))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, event_pk: UUID, customer_id: Optional[str]) -> None:
+        if not self._tasks:
+            self.start()
+        shard = zlib.crc32((customer_id or str(event_pk)).encode()) % self.workers
+        self._queues[shard].put_nowait(event_pk)
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            event_pk = await queue.get()
+            try:
+                await process_event(event_pk)
+            except Exception:
+                logger.exception("billing event %s could not be processed", event_pk)
+            finally:
+                queue.task_done()
+
+
+dispatcher = EventDispatcher(settings.BILLING_WORKERS)
+
+
+async def process_pending_events(limit: int = 500) -> int:
+    """Process events left pending (e.g. by a restart) or failed, oldest first."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=60)
+    async with async_session() as db:
+        event_pks = (await db.scalars(
+            select(BillingEvent.id)
+            .where(or_(
+                and_(BillingEvent.status == "pending", BillingEvent.received_at < cutoff),
+                and_(BillingEvent.status == "failed", BillingEvent.attempts < settings.BILLING_MAX_ATTEMPTS),
+            ))
+            .order_by(BillingEvent.occurred_at.nulls_first(), BillingEvent.received_at)
+            .limit(limit)
+        )).all()
+
+    for event_pk in event_pks:
+        await process_event(event_pk)
+    return len(event_pks)
+
+
+# ============ Tooling ============
+
+async def replay(event_ids=None, customer: str = None, status: str = None, since: datetime = None) -> Dict[str, int]:
+    """Reprocess stored events in the order they occurred."""
+    query = select(BillingEvent.id)
+    if event_ids:
+        query = query.where(BillingEvent.event_id.in_(event_ids))
+    if customer:
+        query = query.where(BillingEvent.customer_id == customer)
+    if status:
+        query = query.where(BillingEvent.status == status)
+    if since:
+        query = query.where(BillingEvent.received_at >= since)
+    query = query.order_by(BillingEvent.occurred_at.nulls_first(), BillingEvent.received_at)
+
+    async with async_session() as db:
+        event_pks = (await db.scalars(query)).all()
+
+    counts: Dict[str, int] = {}
+    for event_pk in event_pks:
+        result = await process_event(event_pk, force=True)
+        counts[result] = counts.get(result, 0) + 1
+    return counts
+
+
+def fake_event(
+    provider: str, event_type: str, customer_id: str, secret: str = None, occurred_at: int = None, **fields
+) -> Tuple[bytes, Dict[str, str]]:
+    """A locally signed webhook delivery: ``(body, headers)``.
+
+    ``fields`` become the subscription object (Stripe) or entity (Razorpay);
+    ``occurred_at`` (epoch seconds) defaults to now.
+    """
+    now = int(time.time())
+    occurred_at = now if occurred_at is None else occurred_at
+    if provider == "stripe":
+        secret = secret or settings.STRIPE_WEBHOOK_SECRET
+        obj = {"object": "subscription", "id": f"sub_{uuid4().hex[:14]}", "customer": customer_id, **fields}
+        body = json.dumps({"id": f"evt_{uuid4().hex}", "type": event_type, "created": occurred_at, "data": {"object": obj}}).encode()
+        return body, {"Stripe-Signature": sign_stripe(body, secret, now), "Content-Type": "application/json"}
+
+    secret = secret or settings.RAZORPAY_WEBHOOK_SECRET
+    entity = {"id": f"sub_{uuid4().hex[:14]}", "customer_id": customer_id, **fields}
+    body = json.dumps({
+        "entity": "event",
+        "event": event_type,
+        "contains": ["subscription"],
+        "payload": {"subscription": {"entity": entity}},
+        "created_at": occurred_at,
+    }).encode()
+    return body, {
+        "X-Razorpay-Signature": sign_razorpay(body, secret),
+        "X-Razorpay-Event-Id": f"evt_{uuid4().hex}",
+        "Content-Type": "application/json",
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Billing webhook event tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = commands.add_parser("replay", help="reprocess stored events")
+    replay_parser.add_argument("--event-id", action="append", dest="event_ids")
+    replay_parser.add_argument("--customer")
+    replay_parser.add_argument("--status", choices=STATUSES)
+    replay_parser.add_argument("--since", type=datetime.fromisoformat)
+
+    fake_parser = commands.add_parser("fake", help="print a locally signed fake event")
+    fake_parser.add_argument("provider", choices=["stripe", "razorpay"])
+    fake_parser.add_argument("event_type")
+    fake_parser.add_argument("--customer", required=True)
+    fake_parser.add_argument("--status", default="active")
+    fake_parser.add_argument("--plan")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "replay":
+        if not (args.event_ids or args.customer or args.status or args.since):
+            parser.error("pass at least one filter")
+        counts = asyncio.run(replay(args.event_ids, args.customer, args.status, args.since))
+        print(" ".join(f"{status}={count}" for status, count in sorted(counts.items())) or "no events")
+    else:
+        fields = {"status": args.status}
+        if args.plan:
+            fields["metadata" if args.provider == "stripe" else "notes"] = {"plan": args.plan}
+        body, headers = fake_event(args.provider, args.event_type, args.customer, **fields)
+        # The body must be sent byte for byte for the signature to match
+        print(json.dumps({"headers": headers, "body": body.decode()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
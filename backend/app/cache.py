@@ -0,0 +1,62 @@
+"""Small in-process caches with hit/miss accounting.
+
+Caches are per worker. Anything that must be consistent across workers
+keys its entries on a value that changes with the underlying row (e.g.
+``updated_at``) rather than relying on explicit invalidation alone.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, name: str, maxsize: int = 1024) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Read without touching recency or hit/miss counts."""
+        return self._data.get(key, default)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def invalidate_where(self, predicate) -> None:
+        """Drop every entry whose key satisfies ``predicate``."""
+        for key in [k for k in self._data if predicate(k)]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_ratio(self) -> Optional[float]:
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+
+# name -> cache, for introspection and metrics
+caches: Dict[str, LRUCache] = {}
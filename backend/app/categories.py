@@ -0,0 +1,128 @@
+"""The category tree and spending rollups over it.
+
+``categories.parent_id`` forms a tree of any depth. The whole tree is small
+reference data, so each worker keeps it in memory with a precomputed
+ancestor map (category id -> the ids from itself up to its root), refreshed
+after ``CATEGORY_TREE_TTL_SECONDS``. Rollups run one query grouped by
+``category_id`` and fold each leaf total into its ancestors in Python, so
+the depth of the tree never adds queries or joins. Grouping by id rather
+than name also keeps same-named categories in different branches apart.
+"""
+import asyncio
+import hashlib
+import time
+from decimal import Decimal
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import get_db
+from app.models import Category
+from app.responses import dumps
+
+settings = get_settings()
+
+
+class CategoryNode(NamedTuple):
+    id: int
+    name: str
+    parent_id: Optional[int]
+    icon: Optional[str]
+    color: Optional[str]
+    is_income: bool
+
+
+class CategoryTree:
+    def __init__(self) -> None:
+        self.nodes: Dict[int, CategoryNode] = {}
+        self.ancestors: Dict[int, Tuple[int, ...]] = {}
+        # Depth-first order, children by name; parents always precede their children
+        self.order: List[int] = []
+        self.etag = ""
+        self.body = b""
+        self.loaded_at: Optional[float] = None
+
+    def load(self, rows: Iterable[Tuple]) -> None:
+        nodes = {row[0]: CategoryNode(*row) for row in rows}
+        ancestors: Dict[int, Tuple[int, ...]] = {}
+        for category_id in nodes:
+            chain = [category_id]
+            parent = nodes[category_id].parent_id
+            # A dangling parent_id ends the chain; a category on a cycle becomes a root
+            while parent in nodes:
+                if parent in chain:
+                    chain = [category_id]
+                    break
+                chain.append(parent)
+                parent = nodes[parent].parent_id
+            ancestors[category_id] = tuple(chain)
+        
+        self.nodes = nodes
+        self.ancestors = ancestors
+        
+        children: Dict[Optional[int], List[int]] = {}
+        for category_id in nodes:
+            children.setdefault(self.parent(category_id), []).append(category_id)
+        order: List[int] = []
+        stack = sorted(children.get(None, []), key=lambda i: nodes[i].name, reverse=True)
+        while stack:
+            category_id = stack.pop()
+            order.append(category_id)
+            stack.extend(sorted(children.get(category_id, []), key=lambda i: nodes[i].name, reverse=True))
+        self.order = order
+        self.body = dumps({"categories": [self.describe(i) for i in order]})
+        self.etag = f'W/"{hashlib.blake2b(self.body, digest_size=12).hexdigest()}"'
+        self.loaded_at = time.monotonic()
+
+    async def load_table(self, db: AsyncSession) -> None:
+        result = await db.execute(select(
+            Category.id, Category.name, Category.parent_id, Category.icon, Category.color, Category.is_income
+        ))
+        self.load(result.all())
+
+    def parent(self, category_id: int) -> Optional[int]:
+        """Parent within the tree; ``None`` for roots, including ones whose parent_id is broken."""
+        chain = self.ancestors[category_id]
+        return chain[1] if len(chain) > 1 else None
+
+    def depth(self, category_id: int) -> int:
+        return len(self.ancestors[category_id]) - 1
+
+    def describe(self, category_id: int) -> dict:
+        return {
+            **self.nodes[category_id]._asdict(),
+            "parent_id": self.parent(category_id),
+            "depth": self.depth(category_id),
+            "path": [self.nodes[i].name for i in reversed(self.ancestors[category_id])],
+        }
+
+    def rollup(self, totals: Mapping[int, Decimal]) -> Dict[int, Decimal]:
+        """Fold per-category ``totals`` into every ancestor; ids not in the tree are dropped."""
+        rolled: Dict[int, Decimal] = {}
+        for category_id, total in totals.items():
+            for ancestor in self.ancestors.get(category_id, ()):
+                rolled[ancestor] = rolled.get(ancestor, Decimal(0)) + total
+        return rolled
+
+
+_tree = CategoryTree()
+_lock = asyncio.Lock()
+
+
+async def get_category_tree(db: AsyncSession = Depends(get_db)) -> CategoryTree:
+    """Dependency returning the shared category tree, reloading it when stale."""
+    loaded_at = _tree.loaded_at
+    if loaded_at is not None and time.monotonic() - loaded_at < settings.CATEGORY_TREE_TTL_SECONDS:
+        return _tree
+    
+    async with _lock:
+        if _tree.loaded_at == loaded_at:
+            await _tree.load_table(db)
+    return _tree
+
+
+async def load_category_tree(db: AsyncSession) -> None:
+    await _tree.load_table(db)
@@ -0,0 +1,321 @@
+"""Columnar (Parquet / Arrow IPC) export of a user's ledger.
+
+Each table is read from a server-side cursor and written one record batch
+per cursor partition, so memory is bounded by ``EXPORT_BATCH_SIZE`` rows.
+Money columns are written as ``decimal128`` and stay exact.
+
+Postgres sends money as integer cents and timestamps as integer
+microseconds, which Arrow takes without building a ``Decimal`` or
+``datetime`` per value; that conversion was most of the Python-side cost.
+
+Bulk export for many users::
+
+    python -m app.columnar --all --format parquet --out /data/exports
+    python -m app.columnar <user_id> [<user_id> ...] --out /data/exports
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from typing import Dict, List, Tuple
+from uuid import UUID
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import BigInteger, String, cast, func, select
+
+from app.database import async_session
+from app.exports import stream_rows
+from app.models import Account, AccountType, Asset, Liability, Transaction, User
+from app.routers.transactions import ACCOUNT_NOT_DELETED
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Rows per Parquet row group, buffered across cursor partitions
+ROW_GROUP_ROWS = 20_000
+
+MONEY = pa.decimal128(18, 2)
+RATE = pa.decimal128(5, 2)
+TIMESTAMP = pa.timestamp("us")
+TIMESTAMP_TZ = pa.timestamp("us", tz="UTC")
+
+
+def _uuid(column):
+    # Let Postgres render UUIDs as text rather than converting in Python
+    return cast(column, String).label(column.key)
+
+
+def _cents(column):
+    # Unscaled decimal128 value for a NUMERIC(_, 2) column
+    return cast(column * 100, BigInteger).label(column.key)
+
+
+def _micros(column):
+    # Microseconds since the epoch; naive timestamps are read as UTC, as Arrow does
+    return cast(func.extract("epoch", column) * 1_000_000, BigInteger).label(column.key)
+
+
+# table name -> (source table, [(column expression, arrow type)])
+TABLES: Dict[str, Tuple[object, List[Tuple[object, pa.DataType]]]] = {
+    "transactions": (Transaction, [
+        (_uuid(Transaction.id), pa.string()),
+        (_uuid(Transaction.account_id), pa.string()),
+        (Transaction.category_id, pa.int32()),
+        (_cents(Transaction.amount), MONEY),
+        (Transaction.currency, pa.string()),
+        (Transaction.transaction_type, pa.string()),
+        (Transaction.description, pa.string()),
+        (Transaction.merchant_name, pa.string()),
+        (Transaction.is_recurring, pa.bool_()),
+        (Transaction.is_subscription, pa.bool_()),
+        (Transaction.tags, pa.list_(pa.string())),
+        (_micros(Transaction.transaction_date), TIMESTAMP),
+        (_micros(Transaction.posted_date), TIMESTAMP),
+        (_micros(Transaction.created_at), TIMESTAMP_TZ),
+    ]),
+    "accounts": (Account, [
+        (_uuid(Account.id), pa.string()),
+        (AccountType.name.label("account_type"), pa.string()),
+        (Account.name, pa.string()),
+        (Account.institution, pa.string()),
+        (_cents(Account.current_balance), MONEY),
+        (_cents(Account.available_balance), MONEY),
+        (Account.currency, pa.string()),
+        (Account.connection_type, pa.string()),
+        (Account.provider, pa.string()),
+        (Account.sync_status, pa.string()),
+        (Account.is_hidden, pa.bool_()),
+        (Account.is_archived, pa.bool_()),
+        (_micros(Account.last_synced_at), TIMESTAMP_TZ),
+        (_micros(Account.created_at), TIMESTAMP_TZ),
+    ]),
+    "assets": (Asset, [
+        (_uuid(Asset.id), pa.string()),
+        (Asset.name, pa.string()),
+        (Asset.asset_type, pa.string()),
+        (_cents(Asset.current_value), MONEY),
+        (_cents(Asset.purchase_value), MONEY),
+        (_micros(Asset.purchase_date), TIMESTAMP),
+        (Asset.currency, pa.string()),
+        (_micros(Asset.created_at), TIMESTAMP_TZ),
+        (_micros(Asset.updated_at), TIMESTAMP_TZ),
+    ]),
+    "liabilities": (Liability, [
+        (_uuid(Liability.id), pa.string()),
+        (_uuid(Liability.linked_account_id), pa.string()),
+        (Liability.name, pa.string()),
+        (Liability.liability_type, pa.string()),
+        (_cents(Liability.principal_amount), MONEY),
+        (_cents(Liability.current_balance), MONEY),
+        (_cents(Liability.interest_rate), RATE),
+        (Liability.currency, pa.string()),
+        (_cents(Liability.emi_amount), MONEY),
+        (Liability.emi_day, pa.int32()),
+        (_micros(Liability.start_date), TIMESTAMP),
+        (_micros(Liability.end_date), TIMESTAMP),
+        (Liability.lender, pa.string()),
+        (_micros(Liability.created_at), TIMESTAMP_TZ),
+    ]),
+}
+
+
+# Repetitive columns worth dictionary-encoding in Parquet; on ids, dates and
+# free text the dictionary only costs time before Parquet falls back to plain
+DICTIONARY_COLUMNS = {
+    "category_id", "currency", "transaction_type", "merchant_name", "is_recurring", "is_subscription",
+    "account_type", "institution", "connection_type", "provider", "sync_status", "is_hidden", "is_archived",
+    "asset_type", "liability_type", "lender", "emi_day",
+}
+
+
+def table_schema(name: str) -> pa.Schema:
+    _, columns = TABLES[name]
+    return pa.schema([pa.field(expr.key, arrow_type) for expr, arrow_type in columns])
+
+
+def table_query(name: str, user_id: UUID):
+    model, columns = TABLES[name]
+    query = select(*[expr for expr, _ in columns]).select_from(model).where(model.user_id == user_id)
+    # Soft-deleted accounts and their transactions are gone as far as the user is concerned
+    if model is Account:
+        query = query.outerjoin(AccountType, Account.account_type_id == AccountType.id)
+        query = query.where(Account.deleted_at.is_(None))
+    elif model is Transaction:
+        query = query.where(ACCOUNT_NOT_DELETED)
+    return query
+
+
+def to_array(values, arrow_type: pa.DataType) -> pa.Array:
+    if pa.types.is_decimal(arrow_type):
+        # Same 16-byte layout at any scale, so the cents are reinterpreted in place
+        return pa.array(values, type=pa.int64()).cast(pa.decimal128(19, 0)).view(arrow_type)
+    if pa.types.is_timestamp(arrow_type):
+        return pa.array(values, type=pa.int64()).view(arrow_type)
+    return pa.array(values, type=arrow_type)
+
+
+def to_record_batch(rows, schema: pa.Schema) -> pa.RecordBatch:
+    """Transpose a partition of row tuples into a typed record batch."""
+    columns = list(zip(*rows))
+    arrays = [to_array(values, field.type) for values, field in zip(columns, schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class ParquetWriter:
+    """Collects record batches into row groups of ``ROW_GROUP_ROWS``.
+
+    A row group per cursor partition would be tiny, and each one costs a
+    set of column chunks, statistics and compression frames.
+    """
+
+    def __init__(self, sink, schema: pa.Schema) -> None:
+        dictionary = [name for name in schema.names if name in DICTIONARY_COLUMNS]
+        self._writer = pq.ParquetWriter(sink, schema, compression="zstd", use_dictionary=dictionary)
+        self._pending: List[pa.RecordBatch] = []
+        self._rows = 0
+
+    def write_batch(self, batch: pa.RecordBatch) -> None:
+        self._pending.append(batch)
+        self._rows += batch.num_rows
+        if self._rows >= ROW_GROUP_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            self._writer.write_table(pa.Table.from_batches(self._pending))
+        self._pending = []
+        self._rows = 0
+
+    def close(self) -> None:
+        try:
+            self._flush()
+        finally:
+            self._writer.close()
+
+
+def open_writer(sink, schema: pa.Schema, fmt: str):
+    if fmt == "parquet":
+        return ParquetWriter(sink, schema)
+    return pa.ipc.new_file(sink, schema)
+
+
+async def export_table(name: str, user_id: UUID, sink, fmt: str = "parquet") -> int:
+    """Write one table for one user to ``sink``; returns the row count."""
+    schema = table_schema(name)
+    writer = open_writer(sink, schema, fmt)
+    rows = 0
+    try:
+        async for partition in stream_rows(table_query(name, user_id)):
+            # Keep conversion and encoding off the event loop
+            batch = await asyncio.to_thread(to_record_batch, partition, schema)
+            await asyncio.to_thread(writer.write_batch, batch)
+            rows += len(partition)
+    finally:
+        writer.close()
+    return rows
+
+
+async def export_user(user_id: UUID, directory: str, fmt: str = "parquet") -> Dict[str, int]:
+    """Write every ledger table for a user into ``directory``."""
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for name in TABLES:
+        path = os.path.join(directory, name + FORMATS[fmt])
+        counts[name] = await export_table(name, user_id, path, fmt)
+    return counts
+
+
+async def export_user_archive(user_id: UUID, fmt: str = "parquet") -> Tuple[str, str]:
+    """Export a user into a temporary zip; returns ``(zip_path, temp_dir)``.
+
+    The caller removes ``temp_dir`` once the file has been sent.
+    """
+    temp_dir = tempfile.mkdtemp(prefix="payfolio-export-")
+    try:
+        data_dir = os.path.join(temp_dir, "ledger")
+        await export_user(user_id, data_dir, fmt)
+        
+        zip_path = os.path.join(temp_dir, "ledger.zip")
+        # Parquet/Arrow files are already compressed; store them as-is
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as archive:
+            for name in sorted(os.listdir(data_dir)):
+                archive.write(os.path.join(data_dir, name), arcname=name)
+    except BaseException:
+        # Nothing will be sent, so nobody else removes the partial files
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return zip_path, temp_dir
+
+
+async def _all_user_ids():
+    async with async_session() as session:
+        result = await session.stream_scalars(select(User.id).where(User.deleted_at.is_(None)).execution_options(yield_per=1000))
+        async for user_id in result:
+            yield user_id
+
+
+async def bulk_export(user_ids, out_dir: str, fmt: str, concurrency: int) -> List[UUID]:
+    """Export every user in ``user_ids``; returns the ones whose export failed."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    started = time.perf_counter()
+    total_rows = 0
+    failed: List[UUID] = []
+
+    async def worker():
+        nonlocal total_rows
+        while (user_id := await queue.get()) is not None:
+            # One bad user must not take the worker down; the queue would stop draining
+            try:
+                counts = await export_user(user_id, os.path.join(out_dir, str(user_id)), fmt)
+            except Exception:
+                logger.exception("export failed for user %s", user_id)
+                failed.append(user_id)
+                continue
+            total_rows += sum(counts.values())
+            print(f"{user_id}: " + " ".join(f"{k}={v}" for k, v in counts.items()))
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    async for user_id in user_ids:
+        await queue.put(user_id)
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+
+    elapsed = time.perf_counter() - started
+    print(f"exported {total_rows} rows in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    return failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk columnar export of user ledgers")
+    parser.add_argument("user_ids", nargs="*", type=UUID)
+    parser.add_argument("--all", action="store_true", help="export every user")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    if not args.all and not args.user_ids:
+        parser.error("pass user ids or --all")
+
+    async def given_ids():
+        for user_id in args.user_ids:
+            yield user_id
+
+    logging.basicConfig(level=logging.INFO)
+    user_ids = _all_user_ids() if args.all else given_ids()
+    failed = asyncio.run(bulk_export(user_ids, args.out, args.format, args.concurrency))
+    if failed:
+        print(f"{len(failed)} users failed: " + " ".join(map(str, failed)), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
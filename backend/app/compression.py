@@ -0,0 +1,176 @@
+"""Negotiated gzip / brotli response compression.
+
+Responses below ``minimum_size`` go out untouched. Streaming responses are
+compressed incrementally so exports keep flowing to the client.
+"""
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; fall back to gzip
+    brotli = None
+
+# Payloads that are already compressed and gain nothing from another pass
+ALREADY_COMPRESSED = {
+    "application/zip",
+    "application/gzip",
+    "application/vnd.apache.parquet",
+    "application/vnd.apache.arrow.file",
+    "image/png",
+    "image/jpeg",
+}
+
+# Streams whose chunks must reach the client as they are sent; a compressor would hold them back
+UNBUFFERED = {"text/event-stream"}
+
+
+class _Gzip:
+    encoding = "gzip"
+
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class _Brotli:
+    encoding = "br"
+
+    def __init__(self, quality: int):
+        self._obj = brotli.Compressor(quality=quality, mode=brotli.MODE_TEXT)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data)
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+def parse_accept_encoding(value: str) -> dict:
+    codings = {}
+    for part in value.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding.strip().lower()] = q
+    return codings
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose(self, accept_encoding: str) -> Optional[str]:
+        codings = parse_accept_encoding(accept_encoding)
+        if brotli is not None and codings.get("br", 0) > 0:
+            return "br"
+        if codings.get("gzip", 0) > 0:
+            return "gzip"
+        return None
+
+    def compressor(self, encoding: str):
+        if encoding == "br":
+            return _Brotli(self.brotli_quality)
+        return _Gzip(self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.choose(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Optional[Message] = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "").split(";")[0].strip()
+            self.passthrough = (
+                "content-encoding" in headers or content_type in ALREADY_COMPRESSED or content_type in UNBUFFERED
+            )
+            return
+
+        if message["type"] != "http.response.body":
+            await self.downstream(message)
+            return
+
+        if self.passthrough:
+            if self.start_message is not None:
+                await self.downstream(self.start_message)
+                self.start_message = None
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body and len(body) < self.middleware.minimum_size:
+                # Small, complete response: send as-is
+                self.passthrough = True
+                await self.downstream(self.start_message)
+                self.start_message = None
+                await self.downstream(message)
+                return
+
+            self.compressor = self.middleware.compressor(self.encoding)
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+
+            if not more_body:
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(compressed))
+                await self.downstream(self.start_message)
+                await self.downstream({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming: length is unknown up front
+            del headers["Content-Length"]
+            await self.downstream(self.start_message)
+
+        chunk = self.compressor.compress(body)
+        if not more_body:
+            chunk += self.compressor.finish()
+        if chunk or not more_body:
+            await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
@@ -28,10 +30,87 @@ class Settings(BaseSettings):
     # Razorpay
     RAZORPAY_KEY_ID: str = ""
     RAZORPAY_KEY_SECRET: str = ""
+    RAZORPAY_WEBHOOK_SECRET: str = ""
+    
+    # Billing webhooks
+    STRIPE_WEBHOOK_TOLERANCE_SECONDS: int = 300
+    BILLING_WORKERS: int = 4
+    BILLING_RETRY_INTERVAL_SECONDS: int = 60  # 0 disables the in-process retry of stuck events
+    BILLING_MAX_ATTEMPTS: int = 5
+    PLAN_MAX_ACCOUNTS: Dict[str, int] = {"free": 2, "pro": 10, "business": 25, "enterprise": 100}
+    # Stripe price lookup key -> plan, for subscriptions without a plan in their metadata
+    BILLING_PRICE_PLANS: Dict[str, str] = {
+        "pro_monthly": "pro",
+        "pro_yearly": "pro",
+        "business_monthly": "business",
+        "business_yearly": "business",
+        "enterprise_monthly": "enterprise",
+        "enterprise_yearly": "enterprise",
+    }
     
     # AI
     GEMINI_API_KEY: str = ""
     
+    # FX
+    FX_RATES_FILE: str = ""  # CSV with date,currency,rate; falls back to the fx_rates table
+    FX_RATES_TTL_SECONDS: int = 3600
+    
+    # Categories
+    CATEGORY_TREE_TTL_SECONDS: int = 300  # how long a worker serves its in-memory category tree
+    
+    # Responses
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 4
+    
+    # Jobs
+    INSIGHT_PURGE_INTERVAL_SECONDS: int = 3600  # 0 disables the in-process purge
+    INSIGHT_PURGE_BATCH_SIZE: int = 500
+    NETWORTH_ROLLUP_INTERVAL_SECONDS: int = 3600  # 0 disables the in-process refresh
+    VALUATION_BATCH_SIZE: int = 10000
+    MERCHANT_BACKFILL_BATCH_SIZE: int = 5000
+    DELETE_INLINE_MAX_ROWS: int = 10000  # larger users/accounts are purged in the background
+    DELETE_PURGE_BATCH_SIZE: int = 5000
+    DELETED_PURGE_INTERVAL_SECONDS: int = 600  # 0 disables resuming interrupted purges
+    
+    # Admission control (per-plan limits; 0 = unlimited)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory, redis or module:Class
+    RATE_LIMIT_REDIS_URL: str = ""
+    RATE_LIMIT_PER_MINUTE: Dict[str, int] = {"free": 30, "pro": 100, "business": 300, "enterprise": 0}
+    RATE_LIMIT_PER_DAY: Dict[str, int] = {"free": 1000, "pro": 10000, "business": 50000, "enterprise": 0}
+    RATE_LIMIT_IP_PER_MINUTE: int = 60  # unauthenticated requests
+    # Proxies (IPs or CIDRs) whose X-Forwarded-For is honoured; empty trusts nobody
+    RATE_LIMIT_TRUSTED_PROXIES: List[str] = []
+    RATE_LIMIT_LEASE_SECONDS: int = 300  # a crashed worker's concurrency slot frees up after this
+    INSIGHTS_GENERATE_CONCURRENCY: int = 4
+    STATS_SUMMARY_CONCURRENCY: int = 16
+    ADMISSION_QUEUE_FACTOR: int = 2  # shed once this many requests per pooled connection are in flight
+    ADMISSION_RETRY_AFTER_SECONDS: int = 2
+    
+    # Observability
+    METRICS_ENABLED: bool = True
+    QUERY_BUDGET_MODE: str = "off"  # off, log (staging) or raise (tests)
+    QUERY_BUDGET_DEFAULT: int = 20  # SQL statements per request unless the route declares its own
+    
+    # Plan entitlements cache
+    ENTITLEMENT_TTL_SECONDS: int = 60
+    
+    # Live updates (GET /v1/events)
+    EVENTS_BACKEND: str = "memory"  # memory (single worker), postgres (LISTEN/NOTIFY), redis or module:Class
+    EVENTS_REDIS_URL: str = ""
+    EVENTS_HEARTBEAT_SECONDS: int = 25
+    EVENTS_MAX_STREAMS_PER_USER: int = 5  # per worker
+    
+    # Worker lifecycle
+    POOL_WARMUP_CONNECTIONS: int = 5  # opened and primed before taking traffic; 0 disables warm-up
+    WARMUP_TIMEOUT_SECONDS: int = 15
+    SHUTDOWN_TIMEOUT_SECONDS: int = 25  # for in-flight requests and background work together
+    
+    # Takeout archives
+    TAKEOUT_DIR: str = ""  # defaults to the system temp directory; must be shared storage across hosts
+    TAKEOUT_TTL_SECONDS: int = 86400
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,44 @@
+"""Shape-preserving downsampling for chart series."""
+from typing import List, Sequence, Tuple
+
+
+def lttb(points: Sequence[Tuple[float, float]], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of the ``threshold`` points to keep, always including
+    the first and last point. ``points`` must be sorted by x and
+    ``threshold`` must be at least 3.
+    """
+    n = len(points)
+    if threshold >= n:
+        return list(range(n))
+
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third vertex of the triangle
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        count = next_end - next_start
+        avg_x = sum(p[0] for p in points[next_start:next_end]) / count
+        avg_y = sum(p[1] for p in points[next_start:next_end]) / count
+
+        # Pick the point in this bucket forming the largest triangle with a and the average
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = points[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+
+    selected.append(n - 1)
+    return selected
@@ -0,0 +1,97 @@
+"""Per-user plan entitlements, cached in process.
+
+An entry holds the user's plan, their account limit and how many active
+(non-archived) accounts they have. Writers keep it current on this worker
+with ``adjust_active_accounts`` / ``invalidate_entitlements``; entries also
+expire after ``ENTITLEMENT_TTL_SECONDS`` so changes made on other workers
+are picked up without a shared store.
+"""
+import time
+from typing import Optional
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import get_current_user
+from app.cache import LRUCache
+from app.config import get_settings
+from app.database import get_db
+from app.models import Account, Subscription, User
+
+settings = get_settings()
+
+DEFAULT_MAX_ACCOUNTS = 2
+
+# user id -> Entitlements
+entitlement_cache = LRUCache("entitlements", maxsize=10000)
+
+
+def max_accounts_for(plan: str) -> int:
+    return settings.PLAN_MAX_ACCOUNTS.get(plan, DEFAULT_MAX_ACCOUNTS)
+
+
+class Entitlements:
+    __slots__ = ("plan", "max_accounts", "active_accounts", "expires_at")
+
+    def __init__(self, plan: str, max_accounts: int, active_accounts: int):
+        self.plan = plan
+        self.max_accounts = max_accounts
+        self.active_accounts = active_accounts
+        self.expires_at = time.monotonic() + settings.ENTITLEMENT_TTL_SECONDS
+
+    @property
+    def can_add_account(self) -> bool:
+        return self.active_accounts < self.max_accounts
+
+
+async def load_entitlements(user: User, db: AsyncSession) -> Entitlements:
+    """Read a user's entitlements with a single query."""
+    subscription = select(Subscription).where(Subscription.user_id == user.id)
+    row = (await db.execute(
+        select(
+            subscription.with_only_columns(Subscription.plan).scalar_subquery().label("plan"),
+            subscription.with_only_columns(Subscription.max_accounts).scalar_subquery().label("max_accounts"),
+            select(func.count(Account.id))
+            .where(Account.user_id == user.id)
+            .where(Account.is_archived == False)
+            .scalar_subquery()
+            .label("active_accounts"),
+        )
+    )).one()
+
+    return Entitlements(
+        plan=row.plan or user.plan or "free",
+        max_accounts=row.max_accounts if row.max_accounts is not None else DEFAULT_MAX_ACCOUNTS,
+        active_accounts=row.active_accounts,
+    )
+
+
+async def get_entitlements(user: User, db: AsyncSession) -> Entitlements:
+    """Cached entitlements for ``user``; only a miss or an expired entry hits the database."""
+    entry: Optional[Entitlements] = entitlement_cache.get(user.id)
+    if entry is None or entry.expires_at < time.monotonic():
+        entry = await load_entitlements(user, db)
+        entitlement_cache.set(user.id, entry)
+    return entry
+
+
+async def current_entitlements(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Entitlements:
+    """Dependency for plan-gated endpoints."""
+    return await get_entitlements(current_user, db)
+
+
+def adjust_active_accounts(user_id: UUID, delta: int) -> None:
+    """Apply a committed change in the number of active accounts."""
+    entry: Optional[Entitlements] = entitlement_cache.get(user_id)
+    if entry is not None:
+        entry.active_accounts = max(entry.active_accounts + delta, 0)
+
+
+def invalidate_entitlements(user_id: UUID) -> None:
+    """Drop the entry after a plan or subscription change."""
+    entitlement_cache.invalidate(user_id)
@@ -0,0 +1,244 @@
+"""Per-user change notifications pushed to open dashboards.
+
+Every write path already calls ``bump_versions`` inside its transaction;
+that also queues a notification on the session, and once the transaction
+commits the user's subscribers are told which resources changed
+(``accounts``, ``transactions``, ``insights``, ...). Nothing is sent for
+rolled-back work. Clients hold one ``GET /v1/events`` stream and refetch
+only what changed; their conditional GETs make that a 304 when another tab
+already did.
+
+Notifications travel through a pluggable backend so that writes on one
+worker reach streams held by another (``EVENTS_BACKEND``):
+``MemoryBackend`` (single worker, the default), ``PostgresBackend``
+(``LISTEN``/``NOTIFY`` on the application database) or ``RedisBackend``
+(pub/sub; needs ``redis``). Each subscriber coalesces pending resources
+into a set, so a burst of writes is one event and a slow client never
+grows a queue.
+"""
+import asyncio
+import importlib
+import json
+import logging
+from typing import Callable, Dict, Iterable, Optional, Set
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CHANNEL = "payfolio_events"
+# Delay before a backend listener reconnects after losing its connection
+RECONNECT_SECONDS = 5
+
+
+class Subscriber:
+    def __init__(self) -> None:
+        self.pending: Set[str] = set()
+        self.wake = asyncio.Event()
+        self.closed = False
+
+    def notify(self, resources: Iterable[str]) -> None:
+        self.pending.update(resources)
+        self.wake.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self.wake.set()
+
+    def take(self) -> Set[str]:
+        """Resources changed since the last call."""
+        pending, self.pending = self.pending, set()
+        self.wake.clear()
+        return pending
+
+
+class MemoryBackend:
+    """Delivers straight back to this worker; only correct with a single worker."""
+
+    async def start(self, deliver: Callable[[str], None]) -> None:
+        self._deliver = deliver
+
+    async def publish(self, message: str) -> None:
+        self._deliver(message)
+
+    async def stop(self) -> None:
+        pass
+
+
+class PostgresBackend:
+    """``NOTIFY``/``LISTEN`` on one dedicated connection per worker, outside the pool."""
+
+    def __init__(self, dsn: str = None) -> None:
+        self.dsn = dsn or settings.DATABASE_URL
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Callable[[str], None]) -> None:
+        self._deliver = deliver
+        self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        import asyncpg
+
+        while True:
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    conn = await asyncpg.connect(self.dsn)
+                    await conn.add_listener(CHANNEL, lambda _conn, _pid, _channel, payload: self._deliver(payload))
+                    self._conn = conn
+            except Exception:
+                logger.exception("event listener could not connect; retrying")
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def publish(self, message: str) -> None:
+        # asyncpg runs one statement at a time per connection
+        async with self._lock:
+            if self._conn is None or self._conn.is_closed():
+                raise ConnectionError("event listener is not connected")
+            await self._conn.execute("SELECT pg_notify($1, $2)", CHANNEL, message)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        if self._conn is not None:
+            await self._conn.close()
+
+
+class RedisBackend:
+    """Redis pub/sub (``EVENTS_REDIS_URL``)."""
+
+    def __init__(self, url: str = None) -> None:
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RedisBackend needs the 'redis' package")
+        self._redis = redis.from_url(url or settings.EVENTS_REDIS_URL)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Callable[[str], None]) -> None:
+        self._deliver = deliver
+        self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._deliver(message["data"].decode())
+            except Exception:
+                logger.exception("event listener lost its connection; retrying")
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def publish(self, message: str) -> None:
+        await self._redis.publish(CHANNEL, message)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        await self._redis.aclose()
+
+
+def load_backend(name: str):
+    """``memory``, ``postgres``, ``redis`` or a ``module:Class`` path to a custom backend."""
+    if name == "memory":
+        return MemoryBackend()
+    if name == "postgres":
+        return PostgresBackend()
+    if name == "redis":
+        return RedisBackend()
+    module, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module), attr)()
+
+
+class Broker:
+    """This worker's subscribers, fed by the backend."""
+
+    def __init__(self) -> None:
+        self.subscribers: Dict[UUID, Set[Subscriber]] = {}
+        self.backend = None
+        self._publishing: Set[asyncio.Task] = set()
+
+    async def start(self, backend=None) -> None:
+        self.backend = backend or load_backend(settings.EVENTS_BACKEND)
+        await self.backend.start(self.deliver)
+
+    async def close(self) -> None:
+        """End every open stream (clients reconnect elsewhere) and stop the backend."""
+        for subscribers in self.subscribers.values():
+            for subscriber in subscribers:
+                subscriber.close()
+        if self.backend is not None:
+            await self.backend.stop()
+            self.backend = None
+
+    def has_room(self, user_id: UUID) -> bool:
+        """Whether the user is below ``EVENTS_MAX_STREAMS_PER_USER`` open streams on this worker."""
+        return len(self.subscribers.get(user_id, ())) < settings.EVENTS_MAX_STREAMS_PER_USER
+
+    def subscribe(self, user_id: UUID) -> Subscriber:
+        subscriber = Subscriber()
+        self.subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id: UUID, subscriber: Subscriber) -> None:
+        subscribers = self.subscribers.get(user_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[user_id]
+
+    def deliver(self, message: str) -> None:
+        """Hand a backend message to this worker's subscribers for its user."""
+        try:
+            payload = json.loads(message)
+            subscribers = self.subscribers.get(UUID(payload["user_id"]), ())
+        except (ValueError, KeyError, TypeError):
+            logger.warning("dropping malformed event %r", message)
+            return
+        for subscriber in subscribers:
+            subscriber.notify(payload["resources"])
+
+    def publish(self, user_id: UUID, resources: Iterable[str]) -> None:
+        """Send without waiting; called from commit hooks, which cannot await."""
+        if self.backend is None:
+            return
+        message = json.dumps({"user_id": str(user_id), "resources": sorted(resources)})
+        task = asyncio.get_running_loop().create_task(self._publish(message))
+        self._publishing.add(task)
+        task.add_done_callback(self._publishing.discard)
+
+    async def _publish(self, message: str) -> None:
+        try:
+            await self.backend.publish(message)
+        except Exception:
+            # Clients resync on reconnect and ETags keep them correct meanwhile
+            logger.exception("event publish failed")
+
+
+broker = Broker()
+
+
+def publish_on_commit(db: AsyncSession, user_id: UUID, resources: Iterable[str]) -> None:
+    """Notify ``user_id``'s streams about ``resources`` once ``db`` commits."""
+    pending = db.sync_session.info.setdefault("pending_events", {})
+    pending.setdefault(user_id, set()).update(resources)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    for user_id, resources in session.info.pop("pending_events", {}).items():
+        broker.publish(user_id, resources)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop("pending_events", None)
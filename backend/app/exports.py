@@ -0,0 +1,60 @@
+"""Streaming exports built on server-side cursors.
+
+Rows are pulled from the database in partitions of ``EXPORT_BATCH_SIZE`` and
+written straight to the response, so memory stays flat regardless of how
+many rows a user has.
+"""
+import csv
+import io
+from typing import AsyncIterator, Sequence
+
+from sqlalchemy import Select
+
+from app.database import async_session
+from app.responses import dumps
+
+EXPORT_BATCH_SIZE = 2000
+
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return "|".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return dumps(value).decode()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+async def stream_rows(query: Select, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence]:
+    """Yield batches of rows from a server-side cursor in a dedicated session.
+
+    The request-scoped session is closed before a streaming body is sent, so
+    exports always open their own.
+    """
+    async with async_session() as session:
+        result = await session.stream(query.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            yield partition
+
+
+async def stream_csv(query: Select, columns: Sequence[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    
+    async for partition in stream_rows(query):
+        writer.writerows([csv_value(v) for v in row] for row in partition)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate(0)
+    
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def stream_ndjson(query: Select, columns: Sequence[str]) -> AsyncIterator[bytes]:
+    async for partition in stream_rows(query):
+        yield b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in partition)
@@ -0,0 +1,150 @@
+"""Foreign-exchange rates and currency conversion for aggregations.
+
+Rates are loaded from ``FX_RATES_FILE`` (CSV with ``date,currency,rate``
+columns) when set, otherwise from the ``fx_rates`` table, and cached in
+memory by date. Each rate is the number of units of a currency per one unit
+of the pivot currency, so any pair converts as ``rate[to] / rate[from]``.
+
+Aggregations stay set-wise: ``convert_column`` multiplies an amount column
+by a ``CASE currency WHEN ... END`` factor so sums run in a single SQL pass.
+Rows in a currency without a rate are left out of the sums rather than
+counted 1:1, and ``unconverted_column`` collects those currencies in the same
+pass so responses can say which ones are missing.
+"""
+import asyncio
+import bisect
+import csv
+import logging
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Depends
+from sqlalchemy import case, distinct, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import get_db
+from app.models import FxRate
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CENT = Decimal("0.01")
+
+
+class FxRateStore:
+    def __init__(self) -> None:
+        self._dates: List[date] = []
+        self._rates: Dict[date, Dict[str, Decimal]] = {}
+        self._factors: Dict[Tuple[str, date], Dict[str, Decimal]] = {}
+        self.loaded_at: Optional[float] = None
+
+    def load(self, rows: Iterable[Tuple[str, date, Decimal]]) -> None:
+        rates: Dict[date, Dict[str, Decimal]] = {}
+        for currency, rate_date, rate in rows:
+            rates.setdefault(rate_date, {})[currency.upper()] = Decimal(rate)
+        self._dates = sorted(rates)
+        # Carry forward currencies missing from a later snapshot
+        previous: Dict[str, Decimal] = {}
+        for rate_date in self._dates:
+            previous = rates[rate_date] = {**previous, **rates[rate_date]}
+        self._rates = rates
+        self._factors = {}
+        self.loaded_at = time.monotonic()
+
+    def load_file(self, path: str) -> None:
+        with open(path, newline="") as f:
+            self.load(
+                (row["currency"], date.fromisoformat(row["date"]), Decimal(row["rate"]))
+                for row in csv.DictReader(f)
+            )
+
+    async def load_table(self, db: AsyncSession) -> None:
+        result = await db.execute(select(FxRate.currency, FxRate.rate_date, FxRate.rate))
+        self.load(result.all())
+
+    def _snapshot(self, on: date) -> Optional[date]:
+        """Latest snapshot date at or before ``on`` (earliest one if ``on`` predates all)."""
+        if not self._dates:
+            return None
+        index = bisect.bisect_right(self._dates, on) - 1
+        return self._dates[max(index, 0)]
+
+    def rates_on(self, on: date) -> Dict[str, Decimal]:
+        snapshot = self._snapshot(on)
+        return self._rates[snapshot] if snapshot else {}
+
+    def factors(self, target: str, on: Optional[date] = None) -> Dict[str, Decimal]:
+        """Multipliers converting each currency with a rate into ``target`` (itself 1).
+
+        Only ``target`` is convertible when it has no rate of its own.
+        """
+        snapshot = self._snapshot(on or date.today())
+        key = (target, snapshot)
+        if key not in self._factors:
+            rates = self._rates.get(snapshot, {})
+            target_rate = rates.get(target)
+            factors = {
+                currency: target_rate / rate
+                for currency, rate in rates.items()
+            } if target_rate else {}
+            factors[target] = Decimal(1)
+            self._factors[key] = factors
+        return self._factors[key]
+
+    def convert(self, amount: Decimal, from_currency: str, to_currency: str, on: Optional[date] = None) -> Decimal:
+        """Raises ``KeyError`` when ``from_currency`` has no rate."""
+        if from_currency == to_currency:
+            return amount
+        return (amount * self.factors(to_currency, on)[from_currency]).quantize(CENT)
+
+
+def convert_column(amount_column, currency_column, factors: Dict[str, Decimal]):
+    """SQL expression converting ``amount_column`` with per-row currency factors.
+
+    NULL for rows in a currency without a rate, so sums leave them out.
+    """
+    return amount_column * case(factors, value=currency_column)
+
+
+def unconverted_column(currency_column, factors: Dict[str, Decimal]):
+    """Aggregate listing the currencies ``convert_column`` left out (NULL when none)."""
+    return func.array_agg(distinct(currency_column)).filter(currency_column.not_in(list(factors))).label("unconverted")
+
+
+def unconverted_currencies(user_id, *found: Optional[Iterable[str]]) -> List[str]:
+    """Merge ``unconverted_column`` results, logging when any currency was left out."""
+    currencies = sorted({currency for values in found if values for currency in values if currency})
+    if currencies:
+        logger.warning("no FX rate for %s; left out of totals for user %s", ", ".join(currencies), user_id)
+    return currencies
+
+
+_store = FxRateStore()
+_lock = asyncio.Lock()
+
+
+async def get_fx_rates(db: AsyncSession = Depends(get_db)) -> FxRateStore:
+    """Dependency returning the shared rate store, reloading it when stale."""
+    loaded_at = _store.loaded_at
+    if loaded_at is not None and time.monotonic() - loaded_at < settings.FX_RATES_TTL_SECONDS:
+        return _store
+    
+    async with _lock:
+        if _store.loaded_at == loaded_at:
+            await load_fx_rates(db)
+    return _store
+
+
+async def load_fx_rates(db: AsyncSession) -> None:
+    """(Re)load the shared rate store from ``FX_RATES_FILE`` or the table."""
+    if settings.FX_RATES_FILE:
+        _store.load_file(settings.FX_RATES_FILE)
+    else:
+        await _store.load_table(db)
+
+
+def as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
@@ -0,0 +1,268 @@
+"""Periodic maintenance jobs.
+
+Run once from cron with ``python -m app.jobs <job>`` or let the API schedule
+them in-process (see the ``*_INTERVAL_SECONDS`` settings).
+"""
+import argparse
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import Date, String, cast, delete, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.billing_events import process_pending_events
+from app.config import get_settings
+from app.database import async_session, engine
+from app.models import Account, Insight, NetWorthHistory, NetWorthRollup, Transaction, User
+from app.versions import bump_versions, bump_versions_for, ACCOUNTS, NETWORTH, TRANSACTIONS
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+async def purge_insights(batch_size: int = None) -> int:
+    """Delete expired or dismissed insights in small batches.
+
+    Each batch runs in its own short transaction so the purge never holds
+    long locks on the insights table. Returns the number of rows deleted.
+    """
+    batch_size = batch_size or settings.INSIGHT_PURGE_BATCH_SIZE
+    total = 0
+    
+    while True:
+        now = datetime.now(timezone.utc)
+        batch = (
+            select(Insight.id)
+            .where(or_(Insight.is_dismissed == True, Insight.valid_until <= now))
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with async_session() as db:
+            result = await db.execute(delete(Insight).where(Insight.id.in_(batch)))
+            await db.commit()
+        
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            break
+        # Let other work on the event loop and the database breathe between batches
+        await asyncio.sleep(0)
+    
+    return total
+
+
+async def needs_background_purge(db, column, value) -> bool:
+    """Whether more than ``DELETE_INLINE_MAX_ROWS`` transactions match ``column == value``."""
+    limit = settings.DELETE_INLINE_MAX_ROWS
+    capped = select(Transaction.id).where(column == value).limit(limit + 1).subquery()
+    count = await db.scalar(select(func.count()).select_from(capped))
+    return count > limit
+
+
+async def _delete_transactions(column, value, batch_size: int) -> int:
+    """Delete the transactions matching ``column == value`` one bounded batch at a time."""
+    total = 0
+    
+    while True:
+        batch = select(Transaction.id).where(column == value).limit(batch_size).scalar_subquery()
+        async with async_session() as db:
+            result = await db.execute(delete(Transaction).where(Transaction.id.in_(batch)))
+            await db.commit()
+        
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
+        await asyncio.sleep(0)
+
+
+@asynccontextmanager
+async def _purge_lock(key: str):
+    """Advisory lock held for a whole purge; yields whether this process got it.
+
+    The request's background task, ``purge_deleted`` in every worker and cron
+    may all pick up the same id; only the holder purges it, the rest skip.
+    Held on its own autocommit connection, since the batches commit on others.
+    """
+    lock = func.hashtext(f"purge:{key}")
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = await conn.scalar(select(func.pg_try_advisory_lock(lock)))
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.scalar(select(func.pg_advisory_unlock(lock)))
+
+
+async def purge_account(account_id: UUID, batch_size: int = None) -> int:
+    """Delete an account's transactions in batches, then the account itself.
+
+    Returns 0 without doing anything while another purge of the account runs.
+    """
+    async with _purge_lock(f"account:{account_id}") as acquired:
+        if not acquired:
+            logger.info("account %s is already being purged", account_id)
+            return 0
+        return await _purge_account(account_id, batch_size or settings.DELETE_PURGE_BATCH_SIZE)
+
+
+async def _purge_account(account_id: UUID, batch_size: int) -> int:
+    total = await _delete_transactions(Transaction.account_id, account_id, batch_size)
+    
+    async with async_session() as db:
+        user_id = await db.scalar(
+            delete(Account).where(Account.id == account_id).returning(Account.user_id)
+        )
+        if user_id is not None:
+            await bump_versions(db, user_id, ACCOUNTS, TRANSACTIONS)
+            total += 1
+        await db.commit()
+    
+    return total
+
+
+async def purge_user(user_id: UUID, batch_size: int = None) -> int:
+    """Delete a user's transactions in batches, then the user.
+
+    Everything else the user owns is small and goes with the ``users`` row
+    through ``ON DELETE CASCADE``. Returns 0 without doing anything while
+    another purge of the user runs.
+    """
+    async with _purge_lock(f"user:{user_id}") as acquired:
+        if not acquired:
+            logger.info("user %s is already being purged", user_id)
+            return 0
+        return await _purge_user(user_id, batch_size or settings.DELETE_PURGE_BATCH_SIZE)
+
+
+async def _purge_user(user_id: UUID, batch_size: int) -> int:
+    total = await _delete_transactions(Transaction.user_id, user_id, batch_size)
+    
+    async with async_session() as db:
+        result = await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+    
+    return total + result.rowcount
+
+
+async def purge_deleted(batch_size: int = None) -> int:
+    """Finish purging users and accounts marked deleted, e.g. after a restart.
+
+    Ids another process is already purging are skipped (see ``_purge_lock``).
+    """
+    async with async_session() as db:
+        user_ids = (await db.scalars(select(User.id).where(User.deleted_at.isnot(None)))).all()
+        account_ids = (await db.scalars(select(Account.id).where(Account.deleted_at.isnot(None)))).all()
+    
+    total = 0
+    for user_id in user_ids:
+        total += await purge_user(user_id, batch_size)
+    for account_id in account_ids:
+        total += await purge_account(account_id, batch_size)
+    
+    return total
+
+
+ROLLUP_PERIODS = ("week", "month")
+
+
+async def refresh_networth_rollups(since: date = None) -> int:
+    """Recompute weekly and monthly net worth rollups from daily snapshots.
+
+    Each rollup row holds the closing snapshot of its period. Only periods
+    touching ``since`` (default: the last two months) are rewritten, so the
+    hourly run stays cheap; use ``backfill-networth-rollups`` for history.
+    Users whose rollups changed get their NETWORTH version bumped; a new daily
+    snapshot always moves its week's and month's closing row, so this is
+    also what invalidates cached history after snapshots are written.
+    Returns the number of rollup rows that changed.
+    """
+    since = since or date.today() - timedelta(days=62)
+    total = 0
+    
+    for period in ROLLUP_PERIODS:
+        period_start = cast(func.date_trunc(period, NetWorthHistory.snapshot_date), Date)
+        closing = (
+            select(
+                NetWorthHistory.user_id,
+                literal(period, String(10)),
+                period_start,
+                NetWorthHistory.snapshot_date,
+                NetWorthHistory.total_assets,
+                NetWorthHistory.total_liabilities,
+                NetWorthHistory.net_worth,
+            )
+            .where(NetWorthHistory.snapshot_date >= func.date_trunc(period, cast(since, Date)))
+            .distinct(NetWorthHistory.user_id, period_start)
+            .order_by(NetWorthHistory.user_id, period_start, NetWorthHistory.snapshot_date.desc())
+        )
+        stmt = insert(NetWorthRollup).from_select(
+            ["user_id", "period", "period_start", "snapshot_date", "total_assets", "total_liabilities", "net_worth"],
+            closing,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[NetWorthRollup.user_id, NetWorthRollup.period, NetWorthRollup.period_start],
+            set_={
+                "snapshot_date": stmt.excluded.snapshot_date,
+                "total_assets": stmt.excluded.total_assets,
+                "total_liabilities": stmt.excluded.total_liabilities,
+                "net_worth": stmt.excluded.net_worth,
+            },
+            # Unchanged rows are left alone, so they don't bump versions every hour
+            where=or_(
+                NetWorthRollup.snapshot_date.is_distinct_from(stmt.excluded.snapshot_date),
+                NetWorthRollup.total_assets.is_distinct_from(stmt.excluded.total_assets),
+                NetWorthRollup.total_liabilities.is_distinct_from(stmt.excluded.total_liabilities),
+                NetWorthRollup.net_worth.is_distinct_from(stmt.excluded.net_worth),
+            ),
+        )
+        # One statement: upsert, bump the owners' versions, count changed rows
+        changed = stmt.returning(NetWorthRollup.user_id).cte("changed")
+        bumped = bump_versions_for(changed, NETWORTH).cte("bumped")
+        async with async_session() as db:
+            result = await db.execute(select(func.count()).select_from(changed).add_cte(bumped))
+            total += result.scalar_one()
+            await db.commit()
+    
+    return total
+
+
+async def backfill_networth_rollups() -> int:
+    return await refresh_networth_rollups(since=date(1970, 1, 1))
+
+
+async def run_periodic(job, interval_seconds: int) -> None:
+    """Run ``job`` forever, sleeping ``interval_seconds`` between runs."""
+    while True:
+        try:
+            deleted = await job()
+            logger.info("%s removed %d rows", job.__name__, deleted)
+        except Exception:
+            logger.exception("%s failed", job.__name__)
+        await asyncio.sleep(interval_seconds)
+
+
+JOBS = {
+    "purge-insights": purge_insights,
+    "purge-deleted": purge_deleted,
+    "refresh-networth-rollups": refresh_networth_rollups,
+    "backfill-networth-rollups": backfill_networth_rollups,
+    "process-billing-events": process_pending_events,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run Payfolio maintenance jobs")
+    parser.add_argument("job", choices=sorted(JOBS))
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    count = asyncio.run(JOBS[args.job]())
+    print(f"{args.job}: {count} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Worker lifecycle: warm up before taking traffic, drain before exiting.
+
+On startup ``warm_up`` opens ``POOL_WARMUP_CONNECTIONS`` pooled connections
+at once, pings each, and runs the hottest read statements on every one of
+them so asyncpg's per-connection prepared statement cache is already
+populated (the statements are parameterized with a user that does not
+exist, so they return nothing). Reference data (FX rates, the category
+tree) is loaded into memory. A failed warm-up is logged and the worker
+starts cold rather than not at all.
+
+On shutdown ``DrainMiddleware`` turns new requests away with 503 while
+in-flight ones finish, background work is given the rest of
+``SHUTDOWN_TIMEOUT_SECONDS`` to wind down, and the engine is disposed.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import List
+from uuid import UUID
+
+from sqlalchemy import Executable, func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.categories import load_category_tree
+from app.config import get_settings
+from app.entitlements import load_entitlements
+from app.fx import load_fx_rates
+from app.models import Asset, Insight, Liability, Transaction, User
+from app.responses import dumps
+from app.routers.accounts import accounts_query
+from app.routers.assets import ASSET_COLUMNS
+from app.routers.insights import INSIGHT_COLUMNS, active_insight_filter
+from app.routers.liabilities import LIABILITY_COLUMNS
+from app.routers.transactions import filter_transactions, transaction_page
+from app.versions import ACCOUNTS, TRANSACTIONS, get_versions
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+NOBODY = UUID(int=0)
+
+
+def hot_queries() -> List[Executable]:
+    """Statements behind the most requested endpoints, built the way the endpoints build them."""
+    transactions = filter_transactions(select(Transaction.id).where(Transaction.user_id == NOBODY))
+    return [
+        select(User).where(User.id == NOBODY).where(User.deleted_at.is_(None)),
+        accounts_query(NOBODY),
+        select(func.count()).select_from(transactions.subquery()),
+        transaction_page(transactions, 50, 0),
+        select(*ASSET_COLUMNS).where(Asset.user_id == NOBODY).order_by(Asset.created_at.desc()),
+        select(*LIABILITY_COLUMNS).where(Liability.user_id == NOBODY).order_by(Liability.created_at.desc()),
+        (
+            select(*INSIGHT_COLUMNS)
+            .where(active_insight_filter(NOBODY, datetime.now(timezone.utc)))
+            .order_by(Insight.priority.desc(), Insight.created_at.desc(), Insight.id.desc())
+            .limit(21)
+        ),
+    ]
+
+
+async def _warm_connection(conn: AsyncConnection) -> None:
+    await conn.execute(text("SELECT 1"))
+    db = AsyncSession(bind=conn)
+    # Version lookups come in one- and two-resource shapes
+    await get_versions(db, NOBODY, (ACCOUNTS,))
+    await get_versions(db, NOBODY, (TRANSACTIONS, ACCOUNTS))
+    await load_entitlements(User(id=NOBODY, plan="free"), db)
+    for statement in hot_queries():
+        await db.execute(statement)
+    await db.close()
+    await conn.rollback()
+
+
+async def preload_reference_data(engine: AsyncEngine) -> None:
+    async with AsyncSession(engine) as db:
+        await load_fx_rates(db)
+        await load_category_tree(db)
+
+
+async def warm_up(engine: AsyncEngine) -> None:
+    count = min(settings.POOL_WARMUP_CONNECTIONS, engine.pool.size())
+    if count <= 0:
+        return
+    started = time.perf_counter()
+    # Every task holds its connection until all are warm, so the pool opens `count` distinct ones
+    barrier = asyncio.Barrier(count)
+
+    async def warm_one() -> None:
+        async with engine.connect() as conn:
+            try:
+                await _warm_connection(conn)
+            except BaseException:
+                await barrier.abort()
+                raise
+            await barrier.wait()
+
+    try:
+        async with asyncio.timeout(settings.WARMUP_TIMEOUT_SECONDS):
+            await asyncio.gather(*(warm_one() for _ in range(count)))
+            await preload_reference_data(engine)
+    except Exception:
+        logger.exception("warm-up failed; starting cold")
+        return
+    logger.info("warmed %d connections in %.2fs", count, time.perf_counter() - started)
+
+
+class Drain:
+    """In-flight request count and the draining flag shared with ``DrainMiddleware``."""
+
+    def __init__(self) -> None:
+        self.draining = False
+        self.in_flight = 0
+
+    def start(self) -> None:
+        self.draining = True
+
+    async def wait(self, deadline: float) -> bool:
+        """Wait until no requests are in flight or ``deadline`` (monotonic) passes."""
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return not self.in_flight
+
+
+drain = Drain()
+
+
+class DrainMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if drain.draining:
+            # Health checks fail too, so the load balancer stops routing here
+            body = dumps({"detail": {"code": "SHUTTING_DOWN", "message": "This worker is shutting down, retry"}})
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                    (b"retry-after", b"1"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        drain.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            drain.in_flight -= 1
@@ -1,19 +1,76 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+from app.compression import CompressionMiddleware
 from app.config import get_settings
-from app.routers import auth, users, accounts, transactions, assets, liabilities, insights, billing
+from app.database import engine
+from app.events import broker as event_broker
+from app.billing_events import dispatcher as billing_dispatcher, process_pending_events
+from app.jobs import run_periodic, purge_insights, purge_deleted, refresh_networth_rollups
+from app.lifecycle import DrainMiddleware, drain, warm_up
+from app.metrics import MetricsMiddleware, instrument_engine, render_metrics
+from app.querybudget import QueryBudgetMiddleware
+from app.ratelimit import AdmissionMiddleware
+from app.responses import FastJSONResponse
+from app.routers import auth, users, accounts, transactions, categories, assets, liabilities, insights, billing, networth, events
+from app import takeout
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up(engine)
+    await event_broker.start()
+    
+    schedule = [
+        (purge_insights, settings.INSIGHT_PURGE_INTERVAL_SECONDS),
+        (refresh_networth_rollups, settings.NETWORTH_ROLLUP_INTERVAL_SECONDS),
+        (purge_deleted, settings.DELETED_PURGE_INTERVAL_SECONDS),
+        (process_pending_events, settings.BILLING_RETRY_INTERVAL_SECONDS),
+    ]
+    background_tasks = [
+        asyncio.create_task(run_periodic(job, interval))
+        for job, interval in schedule
+        if interval > 0
+    ]
+    
+    yield
+    
+    # Refuse new requests, let in-flight ones finish, then wind down background work
+    deadline = time.monotonic() + settings.SHUTDOWN_TIMEOUT_SECONDS
+    drain.start()
+    # Event streams never finish on their own; end them so clients reconnect elsewhere
+    await event_broker.close()
+    await drain.wait(deadline)
+    # Periodic jobs work in committed batches and resume on the next start
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await billing_dispatcher.stop(timeout=deadline - time.monotonic())
+    await takeout.shutdown(timeout=deadline - time.monotonic())
+    await engine.dispose()
+
+
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="Unified Financial Operating System API",
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
 )
 
+# Admission control (added before CORS so rejections still carry CORS headers)
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(AdmissionMiddleware, pool=engine.pool)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -21,18 +78,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],
 )
 
+# Compression (added last so it wraps CORS and sees final payloads)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=settings.GZIP_LEVEL,
+    brotli_quality=settings.BROTLI_QUALITY,
+)
+
+# Query budgets (no-op unless QUERY_BUDGET_MODE is log or raise)
+instrument_engine(engine)
+app.add_middleware(QueryBudgetMiddleware)
+
+# Metrics (so latency includes every other middleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Drain (outermost, so shutdown turns requests away before any other work)
+app.add_middleware(DrainMiddleware)
+
 
 # Routers
 app.include_router(auth.router, prefix="/v1/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/v1/users", tags=["Users"])
 app.include_router(accounts.router, prefix="/v1/accounts", tags=["Accounts"])
 app.include_router(transactions.router, prefix="/v1/transactions", tags=["Transactions"])
+app.include_router(categories.router, prefix="/v1/categories", tags=["Categories"])
 app.include_router(assets.router, prefix="/v1/assets", tags=["Assets"])
 app.include_router(liabilities.router, prefix="/v1/liabilities", tags=["Liabilities"])
 app.include_router(insights.router, prefix="/v1/insights", tags=["Insights"])
 app.include_router(billing.router, prefix="/v1/billing", tags=["Billing"])
+app.include_router(networth.router, prefix="/v1/networth", tags=["Net Worth"])
+app.include_router(events.router, prefix="/v1/events", tags=["Events"])
 
 
 @app.get("/")
@@ -43,3 +123,10 @@ async def root():
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if not settings.METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(render_metrics(engine.pool), media_type="text/plain; version=0.0.4")
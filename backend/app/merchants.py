@@ -0,0 +1,213 @@
+"""Merchant dimension: normalizing free-text merchant names to ``merchants`` rows.
+
+A raw ``merchant_name`` ("UPI/40291/SWIGGY", "AMZN Mktp", "Amazon.in") is
+reduced to a match key by token rules: lower-case words, with payment-rail
+prefixes, reference numbers, web domains and legal or marketplace suffixes
+dropped and known abbreviations expanded. The key is then looked up in
+``merchant_aliases`` (curated: key -> merchant), then in
+``merchants.normalized_name``; keys seen for the first time become new
+merchants. Resolution is set-wise, so a batch of rows costs two statements
+however many distinct names it has.
+
+Transactions get ``merchant_id`` when written. Rows written before that,
+and merchants merged by a new alias, are fixed up in batches::
+
+    python -m app.merchants backfill
+    python -m app.merchants alias "AMAZON PAY" "Amazon"
+"""
+import argparse
+import asyncio
+import logging
+import re
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, literal, select, union_all, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session
+from app.models import Merchant, MerchantAlias, Transaction
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+WORD = re.compile(r"[^\W_]+")
+DOMAIN = re.compile(r"\.(?:com|co|in|net|org)\b")
+# Payment rails and channels that prefix bank statement descriptors, and web prefixes
+NOISE = {"upi", "neft", "imps", "rtgs", "nach", "ach", "pos", "ecom", "vps", "ibl", "billpay", "www", "http", "https"}
+# Dropped from the end of a name as long as something else is left
+SUFFIXES = {"pvt", "private", "ltd", "limited", "llp", "inc", "mktp", "marketplace", "online", "store"}
+# Abbreviations that statements use for well-known merchants
+REWRITES = {"amzn": "amazon", "swgy": "swiggy", "zmt": "zomato", "flpkrt": "flipkart", "mmt": "makemytrip"}
+
+
+def normalize(raw: Optional[str]) -> str:
+    """Match key for a raw merchant name; empty when nothing identifying is left."""
+    if not raw:
+        return ""
+    words = [
+        REWRITES.get(word, word)
+        for word in WORD.findall(DOMAIN.sub(" ", raw.lower()))
+        # Reference numbers carry several digits; names like "1mg" don't
+        if word not in NOISE and sum(c.isdigit() for c in word) < 4
+    ]
+    while len(words) > 1 and words[-1] in SUFFIXES:
+        words.pop()
+    # "AMAZON AMAZON.IN" and similar repeats
+    words = [word for i, word in enumerate(words) if i == 0 or word != words[i - 1]]
+    return " ".join(words)[:255]
+
+
+def display_name(raw: str, key: str) -> str:
+    """Name for a new merchant: the raw name when it is clean, else the title-cased key."""
+    clean = raw.strip()
+    return clean[:255] if WORD.findall(clean.lower()) == key.split() else key.title()
+
+
+async def resolve_merchants(db: AsyncSession, names: Iterable[Optional[str]]) -> Dict[str, int]:
+    """Merchant id for every raw name that normalizes to a key, creating missing merchants.
+
+    Call inside the transaction that writes the rows; the new merchants
+    commit with it.
+    """
+    keys = {name: normalize(name) for name in set(names) if name}
+    wanted = {key for key in keys.values() if key}
+    if not wanted:
+        return {}
+
+    # Aliases sort after direct matches so they win
+    lookup = union_all(
+        select(Merchant.normalized_name.label("key"), Merchant.id, literal(0).label("priority"))
+        .where(Merchant.normalized_name.in_(wanted)),
+        select(MerchantAlias.alias, MerchantAlias.merchant_id, literal(1))
+        .where(MerchantAlias.alias.in_(wanted)),
+    ).order_by("priority")
+    found = {row.key: row.id for row in await db.execute(lookup)}
+
+    missing = sorted(wanted - found.keys())
+    if missing:
+        first_seen = {}
+        for name, key in keys.items():
+            first_seen.setdefault(key, name)
+        stmt = insert(Merchant).values(
+            [{"name": display_name(first_seen[key], key), "normalized_name": key} for key in missing]
+        )
+        # A no-op update so rows created concurrently by another writer still come back
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Merchant.normalized_name],
+            set_={"normalized_name": stmt.excluded.normalized_name},
+        ).returning(Merchant.normalized_name, Merchant.id)
+        found.update({row.normalized_name: row.id for row in await db.execute(stmt)})
+
+    return {name: found[key] for name, key in keys.items() if key}
+
+
+async def backfill_merchants(batch_size: int = None) -> int:
+    """Assign ``merchant_id`` to transactions that have a merchant name but no merchant.
+
+    Walks the table in primary-key order, one short transaction per batch,
+    so it is safe on a live database and resumes where it stopped. Names
+    that normalize to nothing stay unassigned. Returns the rows updated.
+    """
+    batch_size = batch_size or settings.MERCHANT_BACKFILL_BATCH_SIZE
+    total = 0
+    after = None
+
+    while True:
+        query = (
+            select(Transaction.id, Transaction.merchant_name)
+            .where(Transaction.merchant_id.is_(None))
+            .where(Transaction.merchant_name.is_not(None))
+            .order_by(Transaction.id)
+            .limit(batch_size)
+        )
+        if after is not None:
+            query = query.where(Transaction.id > after)
+
+        async with async_session() as db:
+            rows = (await db.execute(query)).all()
+            merchant_ids = await resolve_merchants(db, (row.merchant_name for row in rows))
+            if merchant_ids:
+                result = await db.execute(
+                    update(Transaction)
+                    .where(Transaction.id.in_([row.id for row in rows]))
+                    .where(Transaction.merchant_id.is_(None))
+                    .values(merchant_id=case(merchant_ids, value=Transaction.merchant_name))
+                    .execution_options(synchronize_session=False)
+                )
+                total += result.rowcount
+            await db.commit()
+
+        if len(rows) < batch_size:
+            return total
+        after = rows[-1].id
+        await asyncio.sleep(0)
+
+
+async def add_alias(alias: str, target: str, batch_size: int = None) -> int:
+    """Make names normalizing like ``alias`` resolve to the merchant for ``target``.
+
+    Transactions and aliases already pointing at the merchant previously
+    matched by that key move to the target in batches; the old row stays so
+    in-flight writes that resolved to it still commit. Returns the
+    transactions moved.
+    """
+    batch_size = batch_size or settings.MERCHANT_BACKFILL_BATCH_SIZE
+    key = normalize(alias)
+    if not key:
+        raise ValueError(f"{alias!r} has no identifying words")
+
+    async with async_session() as db:
+        target_id = (await resolve_merchants(db, [target]))[target]
+        stmt = insert(MerchantAlias).values(alias=key, merchant_id=target_id)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[MerchantAlias.alias], set_={"merchant_id": target_id}
+        ))
+        old_id = await db.scalar(
+            select(Merchant.id).where(Merchant.normalized_name == key).where(Merchant.id != target_id)
+        )
+        if old_id is not None:
+            await db.execute(
+                update(MerchantAlias).where(MerchantAlias.merchant_id == old_id).values(merchant_id=target_id)
+            )
+        await db.commit()
+
+    total = 0
+    while old_id is not None:
+        batch = select(Transaction.id).where(Transaction.merchant_id == old_id).limit(batch_size).scalar_subquery()
+        async with async_session() as db:
+            result = await db.execute(
+                update(Transaction)
+                .where(Transaction.id.in_(batch))
+                .values(merchant_id=target_id)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            break
+        await asyncio.sleep(0)
+
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Normalize transaction merchants")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backfill", help="assign merchants to transactions that have none")
+    alias = commands.add_parser("alias", help="resolve names like ALIAS to the merchant for TARGET")
+    alias.add_argument("alias")
+    alias.add_argument("target")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "backfill":
+        print(f"backfill: {asyncio.run(backfill_merchants())} transactions assigned")
+    else:
+        print(f"alias: {asyncio.run(add_alias(args.alias, args.target))} transactions moved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Prometheus metrics served at ``/metrics``.
+
+``MetricsMiddleware`` times every request and labels it with the matched
+route template (``/v1/accounts/{account_id}``) rather than the raw path, so
+series stay bounded. SQLAlchemy cursor events count statements and DB time
+against the request that issued them through a context variable. Pool
+gauges and the hit ratios of every ``app.cache`` cache are read at scrape
+time. Everything is plain in-process counters; a scrape renders them in the
+Prometheus text format.
+"""
+import re
+import time
+from bisect import bisect_left
+from collections import Counter as CounterDict
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.cache import caches
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+DB_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Collected:
+    """A metric whose values are read from elsewhere at scrape time."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), kind: str = "gauge") -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def render(self, values: Dict[Tuple[str, ...], float]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in values.items():
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+request_duration = Histogram(
+    "payfolio_http_request_duration_seconds", "Request latency by route template and status",
+    LATENCY_BUCKETS, ("method", "route", "status"),
+)
+request_queries = Histogram(
+    "payfolio_http_request_db_queries", "SQL statements issued per request",
+    QUERY_COUNT_BUCKETS, ("method", "route"),
+)
+request_db_time = Histogram(
+    "payfolio_http_request_db_seconds", "Time spent in SQL statements per request",
+    DB_TIME_BUCKETS, ("method", "route"),
+)
+db_queries = Counter("payfolio_db_queries_total", "SQL statements executed, including background jobs")
+db_seconds = Counter("payfolio_db_query_seconds_total", "Time spent executing SQL statements")
+
+pool_connections = Collected("payfolio_db_pool_connections", "Database pool connections by state", ("state",))
+cache_lookups = Collected("payfolio_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"), "counter")
+cache_entries = Collected("payfolio_cache_entries", "Entries held by each cache", ("cache",))
+cache_hit_ratio = Collected("payfolio_cache_hit_ratio", "Hits / lookups for each cache", ("cache",))
+
+
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\$\d+|%\(\w+\)s|\?)\s*,)+\s*(?:\$\d+|%\(\w+\)s|\?)\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Statement text with literals, placeholders and IN-lists normalised."""
+    statement = _PLACEHOLDER_LIST.sub("(?, ...)", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _LITERAL.sub("?", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class RequestStats:
+    """SQL accounting for the request running in the current context.
+
+    ``statements`` (fingerprint -> count) is only collected when someone,
+    such as the query-budget guard, asks for it.
+    """
+
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Optional[CounterDict] = None
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    db_queries.inc()
+    db_seconds.inc(amount=elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if stats.statements is not None:
+            stats.statements[fingerprint(statement)] += 1
+
+
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine) -> None:
+    """Count statements and DB time on ``engine`` (an ``AsyncEngine`` or ``Engine``); idempotent."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if event.contains(sync_engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            template = getattr(route, "path_format", None) or "unmatched"
+            method = scope["method"]
+            request_duration.observe((method, template, str(status_code)), elapsed)
+            request_queries.observe((method, template), stats.queries)
+            request_db_time.observe((method, template), stats.db_seconds)
+
+
+def render_metrics(pool=None) -> str:
+    lines: List[str] = []
+    for metric in (request_duration, request_queries, request_db_time, db_queries, db_seconds):
+        lines.extend(metric.render())
+
+    if pool is not None:
+        lines.extend(pool_connections.render({
+            ("size",): pool.size(),
+            ("checked_out",): pool.checkedout(),
+            ("checked_in",): pool.checkedin(),
+            ("overflow",): max(pool.overflow(), 0),
+        }))
+
+    lines.extend(cache_lookups.render({
+        key: value
+        for name, cache in caches.items()
+        for key, value in (((name, "hit"), cache.hits), ((name, "miss"), cache.misses))
+    }))
+    lines.extend(cache_entries.render({(name,): len(cache) for name, cache in caches.items()}))
+    lines.extend(cache_hit_ratio.render({
+        (name,): cache.hit_ratio for name, cache in caches.items() if cache.hit_ratio is not None
+    }))
+    return "\n".join(lines) + "\n"
@@ -1,10 +1,10 @@
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from typing import Optional, List
 from uuid import UUID
 import sqlalchemy as sa
-from sqlalchemy import String, Boolean, DateTime, Integer, Numeric, Text, ForeignKey, ARRAY
-from sqlalchemy.dialects.postgresql import UUID as PGUUID, JSONB
+from sqlalchemy import String, Boolean, Date, DateTime, Integer, Numeric, Text, ForeignKey, ARRAY
+from sqlalchemy.dialects.postgresql import UUID as PGUUID, JSONB, TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -32,15 +32,21 @@ class User(Base):
     # Metadata
     email_verified: Mapped[bool] = mapped_column(Boolean, default=False)
     last_login_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    # Set while a large account is being purged in the background
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now())
     
-    # Relationships
-    accounts: Mapped[List["Account"]] = relationship(back_populates="user", cascade="all, delete-orphan")
-    transactions: Mapped[List["Transaction"]] = relationship(back_populates="user", cascade="all, delete-orphan")
-    assets: Mapped[List["Asset"]] = relationship(back_populates="user", cascade="all, delete-orphan")
-    liabilities: Mapped[List["Liability"]] = relationship(back_populates="user", cascade="all, delete-orphan")
-    insights: Mapped[List["Insight"]] = relationship(back_populates="user", cascade="all, delete-orphan")
+    # Relationships (children are removed by ON DELETE CASCADE, never loaded for deletion)
+    accounts: Mapped[List["Account"]] = relationship(back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    transactions: Mapped[List["Transaction"]] = relationship(back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    assets: Mapped[List["Asset"]] = relationship(back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    liabilities: Mapped[List["Liability"]] = relationship(back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    insights: Mapped[List["Insight"]] = relationship(back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        sa.Index("idx_users_deleted", "deleted_at", postgresql_where=sa.text("deleted_at IS NOT NULL")),
+    )
 
 
 class AccountType(Base):
@@ -86,13 +92,19 @@ class Account(Base):
     # Metadata
     is_hidden: Mapped[bool] = mapped_column(Boolean, default=False)
     is_archived: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Set while an account with many transactions is being purged in the background
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now())
     
     # Relationships
     user: Mapped["User"] = relationship(back_populates="accounts")
     account_type: Mapped[Optional["AccountType"]] = relationship(back_populates="accounts")
-    transactions: Mapped[List["Transaction"]] = relationship(back_populates="account", cascade="all, delete-orphan")
+    transactions: Mapped[List["Transaction"]] = relationship(back_populates="account", cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        sa.Index("idx_accounts_deleted", "deleted_at", postgresql_where=sa.text("deleted_at IS NOT NULL")),
+    )
 
 
 class Category(Base):
@@ -108,6 +120,25 @@ class Category(Base):
     transactions: Mapped[List["Transaction"]] = relationship(back_populates="category")
 
 
+class Merchant(Base):
+    __tablename__ = "merchants"
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+    # Match key produced by app.merchants.normalize
+    normalized_name: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now())
+
+
+class MerchantAlias(Base):
+    __tablename__ = "merchant_aliases"
+    
+    # A normalized key that should resolve to another merchant's row
+    alias: Mapped[str] = mapped_column(String(255), primary_key=True)
+    merchant_id: Mapped[int] = mapped_column(Integer, ForeignKey("merchants.id", ondelete="CASCADE"), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now())
+
+
 class Transaction(Base):
     __tablename__ = "transactions"
     
@@ -125,6 +156,19 @@ class Transaction(Base):
     description: Mapped[Optional[str]] = mapped_column(Text)
     merchant_name: Mapped[Optional[str]] = mapped_column(String(255))
     merchant_logo: Mapped[Optional[str]] = mapped_column(Text)
+    merchant_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("merchants.id"))
+    
+    # Maintained by Postgres; merchant words weigh more than memo words. Not
+    # loaded with the entity (see app.search)
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        sa.Computed(
+            "setweight(to_tsvector('simple', regexp_replace(coalesce(merchant_name, ''), '[^[:alnum:]]+', ' ', 'g')), 'A')"
+            " || setweight(to_tsvector('simple', regexp_replace(coalesce(description, ''), '[^[:alnum:]]+', ' ', 'g')), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
     
     # Classification
     is_recurring: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -149,6 +193,25 @@ class Transaction(Base):
     user: Mapped["User"] = relationship(back_populates="transactions")
     account: Mapped["Account"] = relationship(back_populates="transactions")
     category: Mapped[Optional["Category"]] = relationship(back_populates="transactions")
+    
+    __table_args__ = (
+        # Per-user merchant rollups
+        sa.Index("idx_transactions_user_merchant", "user_id", "merchant_id"),
+        # Search, scoped to one user's rows (btree_gin lets user_id share the GIN index)
+        sa.Index("idx_transactions_search", "user_id", "search_vector", postgresql_using="gin"),
+        sa.Index(
+            "idx_transactions_merchant_trgm",
+            "user_id", "merchant_name",
+            postgresql_using="gin",
+            postgresql_ops={"merchant_name": "gin_trgm_ops"},
+        ),
+        sa.Index(
+            "idx_transactions_description_trgm",
+            "user_id", "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+    )
 
 
 class Asset(Base):
@@ -165,12 +228,37 @@ class Asset(Base):
     purchase_date: Mapped[Optional[datetime]] = mapped_column(DateTime)
     currency: Mapped[str] = mapped_column(String(3), default="INR")
     
+    # Client-supplied identifier for idempotent batch imports
+    client_key: Mapped[Optional[str]] = mapped_column(String(100))
+    
+    # Valuation: current_value = quantity * price of `symbol` (or of `asset_type`)
+    symbol: Mapped[Optional[str]] = mapped_column(String(64))
+    quantity: Mapped[Optional[Decimal]] = mapped_column(Numeric(18, 6))
+    
+    # Maintained by Postgres
+    gain: Mapped[Optional[Decimal]] = mapped_column(
+        Numeric(18, 2),
+        sa.Computed("CASE WHEN purchase_value <> 0 THEN current_value - purchase_value END", persisted=True),
+    )
+    gain_percent: Mapped[Optional[Decimal]] = mapped_column(
+        Numeric(12, 4),
+        sa.Computed(
+            "CASE WHEN purchase_value > 0 THEN ROUND((current_value - purchase_value) * 100 / purchase_value, 4) END",
+            persisted=True,
+        ),
+    )
+    
     notes: Mapped[Optional[str]] = mapped_column(Text)
     
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now())
     
     user: Mapped["User"] = relationship(back_populates="assets")
+    
+    __table_args__ = (
+        sa.Index("idx_assets_valued", "id", postgresql_where=sa.text("quantity IS NOT NULL")),
+        sa.UniqueConstraint("user_id", "client_key", name="uq_assets_user_client_key"),
+    )
 
 
 class Liability(Base):
@@ -178,7 +266,7 @@ class Liability(Base):
     
     id: Mapped[UUID] = mapped_column(PGUUID(as_uuid=True), primary_key=True, server_default=sa.text("gen_random_uuid()"))
     user_id: Mapped[UUID] = mapped_column(PGUUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    linked_account_id: Mapped[Optional[UUID]] = mapped_column(PGUUID(as_uuid=True), ForeignKey("accounts.id"))
+    linked_account_id: Mapped[Optional[UUID]] = mapped_column(PGUUID(as_uuid=True), ForeignKey("accounts.id", ondelete="SET NULL"))
     
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     liability_type: Mapped[Optional[str]] = mapped_column(String(50))
@@ -196,10 +284,17 @@ class Liability(Base):
     lender: Mapped[Optional[str]] = mapped_column(String(100))
     notes: Mapped[Optional[str]] = mapped_column(Text)
     
+    # Client-supplied identifier for idempotent batch imports
+    client_key: Mapped[Optional[str]] = mapped_column(String(100))
+    
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now())
     
     user: Mapped["User"] = relationship(back_populates="liabilities")
+    
+    __table_args__ = (
+        sa.UniqueConstraint("user_id", "client_key", name="uq_liabilities_user_client_key"),
+    )
 
 
 class Insight(Base):
@@ -228,6 +323,23 @@ class Insight(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now())
     
     user: Mapped["User"] = relationship(back_populates="insights")
+    
+    __table_args__ = (
+        # Keyset pagination for the active feed, in list order
+        sa.Index(
+            "idx_insights_user_feed",
+            "user_id", sa.text("priority DESC"), sa.text("created_at DESC"), sa.text("id DESC"),
+            postgresql_where=sa.text("is_dismissed = FALSE"),
+        ),
+        # Unread badge count
+        sa.Index(
+            "idx_insights_unread",
+            "user_id",
+            postgresql_where=sa.text("is_read = FALSE AND is_dismissed = FALSE"),
+        ),
+        # Purge job scans
+        sa.Index("idx_insights_valid_until", "valid_until", postgresql_where=sa.text("valid_until IS NOT NULL")),
+    )
 
 
 class Subscription(Base):
@@ -254,6 +366,68 @@ class Subscription(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now())
 
 
+class BillingEvent(Base):
+    """Raw billing webhook event, stored once per provider event id."""
+    __tablename__ = "billing_events"
+    
+    id: Mapped[UUID] = mapped_column(PGUUID(as_uuid=True), primary_key=True, server_default=sa.text("gen_random_uuid()"))
+    provider: Mapped[str] = mapped_column(String(20), nullable=False)  # stripe, razorpay
+    event_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    event_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    customer_id: Mapped[Optional[str]] = mapped_column(String(255))
+    occurred_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending, processed, ignored, skipped, unlinked, failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[Optional[str]] = mapped_column(Text)
+    
+    received_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now())
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    
+    __table_args__ = (
+        sa.UniqueConstraint("provider", "event_id", name="uq_billing_events_provider_event"),
+        sa.Index("idx_billing_events_customer", "provider", "customer_id", "occurred_at"),
+        sa.Index(
+            "idx_billing_events_pending",
+            "received_at",
+            postgresql_where=sa.text("status IN ('pending', 'failed')"),
+        ),
+    )
+
+
+class TakeoutJob(Base):
+    """A full data takeout; the archive lives under ``TAKEOUT_DIR``, shared by all workers."""
+    __tablename__ = "takeout_jobs"
+    
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[UUID] = mapped_column(PGUUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending, running, done, failed
+    current_table: Mapped[Optional[str]] = mapped_column(String(50))
+    tables_done: Mapped[int] = mapped_column(Integer, default=0)
+    tables_total: Mapped[int] = mapped_column(Integer, nullable=False)
+    rows_written: Mapped[int] = mapped_column(sa.BigInteger, default=0)
+    error: Mapped[Optional[str]] = mapped_column(Text)
+    path: Mapped[Optional[str]] = mapped_column(Text)
+    
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # Progress heartbeat; a running job that stops updating was lost with its worker
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    
+    __table_args__ = (
+        sa.Index("idx_takeout_jobs_user", "user_id", "created_at"),
+        # One unfinished job per user, across workers
+        sa.Index(
+            "uq_takeout_jobs_user_unfinished",
+            "user_id",
+            unique=True,
+            postgresql_where=sa.text("status IN ('pending', 'running')"),
+        ),
+    )
+
+
 class NetWorthHistory(Base):
     __tablename__ = "net_worth_history"
     
@@ -269,3 +443,47 @@ class NetWorthHistory(Base):
     breakdown: Mapped[Optional[dict]] = mapped_column(JSONB)
     
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now())
+
+
+class NetWorthRollup(Base):
+    __tablename__ = "net_worth_rollups"
+    
+    user_id: Mapped[UUID] = mapped_column(PGUUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    period: Mapped[str] = mapped_column(String(10), primary_key=True)  # week, month
+    period_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    
+    # Closing snapshot of the period
+    snapshot_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    total_assets: Mapped[Decimal] = mapped_column(Numeric(18, 2), nullable=False)
+    total_liabilities: Mapped[Decimal] = mapped_column(Numeric(18, 2), nullable=False)
+    net_worth: Mapped[Decimal] = mapped_column(Numeric(18, 2), nullable=False)
+
+
+class UserDataVersion(Base):
+    __tablename__ = "user_data_versions"
+    
+    user_id: Mapped[UUID] = mapped_column(PGUUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    resource: Mapped[str] = mapped_column(String(30), primary_key=True)
+    version: Mapped[int] = mapped_column(sa.BigInteger, nullable=False, default=1)
+    
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now())
+
+
+class FxRate(Base):
+    __tablename__ = "fx_rates"
+    
+    # Units of `currency` per one unit of the pivot currency (USD) on `rate_date`
+    currency: Mapped[str] = mapped_column(String(3), primary_key=True)
+    rate_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    rate: Mapped[Decimal] = mapped_column(Numeric(20, 10), nullable=False)
+
+
+class AssetPrice(Base):
+    __tablename__ = "asset_prices"
+    
+    # A ticker/ISIN for listed holdings, or an asset_type (e.g. "gold") for unit prices
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    price: Mapped[Decimal] = mapped_column(Numeric(18, 6), nullable=False)
+    price_date: Mapped[Optional[date]] = mapped_column(Date)
+    
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now())
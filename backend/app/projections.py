@@ -0,0 +1,57 @@
+"""Read fast path for list endpoints.
+
+List endpoints select just the columns their response schema needs with a
+Core statement, so no ORM entities, identity map or unused heavy columns
+(``raw_data`` and friends) are involved. Each row mapping is validated by a
+``TypeAdapter`` compiled once at import, and the result is serialized to
+JSON by pydantic-core in the same step. This bypasses FastAPI's own
+re-validation of the return value; ``response_model`` still documents the
+endpoint.
+"""
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import ColumnElement, inspect
+
+
+def schema_columns(schema: Type[BaseModel], model, **expressions: ColumnElement) -> List[ColumnElement]:
+    """Columns for each field of ``schema``: ``expressions`` by name, else the model column of that name.
+
+    Fields with neither (nested objects, values computed in Python) are left
+    for the caller to fill in.
+    """
+    model_columns = inspect(model).column_attrs.keys()
+    columns = []
+    for name in schema.model_fields:
+        if name in expressions:
+            columns.append(expressions[name].label(name))
+        elif name in model_columns:
+            columns.append(getattr(model, name))
+    return columns
+
+
+def nest(row: Dict[str, Any], field: str, prefix: str) -> Dict[str, Any]:
+    """Move ``prefix``-ed keys of a flat row into a sub-dict under ``field`` (``None`` when its id is null)."""
+    nested = {key[len(prefix):]: row.pop(key) for key in [k for k in row if k.startswith(prefix)]}
+    row[field] = nested if nested.get("id") is not None else None
+    return row
+
+
+class Projection:
+    """A response schema compiled for rendering rows straight to JSON."""
+
+    def __init__(self, schema) -> None:
+        self.adapter = TypeAdapter(schema)
+
+    def render(self, content: Any, response: Optional[Response] = None) -> Response:
+        """Validate ``content`` (mappings, not ORM objects) and serialize it.
+
+        ``response`` is the endpoint's injected ``Response``; its headers (the
+        ETag set by ``conditional_get``) are carried over.
+        """
+        body = self.adapter.dump_json(self.adapter.validate_python(content))
+        rendered = Response(body, media_type="application/json")
+        if response is not None:
+            rendered.headers.raw.extend(response.headers.raw)
+        return rendered
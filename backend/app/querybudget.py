@@ -0,0 +1,146 @@
+"""Per-route SQL statement budgets, to catch N+1 query patterns before production.
+
+Every route may issue at most ``QUERY_BUDGET_DEFAULT`` statements unless its
+endpoint declares its own limit with ``@query_budget(n)``. The guard is off
+in production; with ``QUERY_BUDGET_MODE=log`` (staging) an over-budget
+request logs the statements it ran, fingerprinted and counted, and with
+``raise`` (tests) the response is replaced by a 500 carrying the same
+report. Statement counting rides on the cursor events from ``app.metrics``.
+"""
+import logging
+from collections import Counter
+from typing import Callable, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import get_settings
+from app.metrics import RequestStats, current_request
+from app.responses import dumps
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Called with every QueryBudgetExceeded, whatever the mode (used by app.testing)
+listeners: List[Callable[["QueryBudgetExceeded"], None]] = []
+
+
+def query_budget(limit: int):
+    """Declare the maximum number of SQL statements a route may issue."""
+    def decorator(endpoint):
+        endpoint.query_budget = limit
+        return endpoint
+    return decorator
+
+
+def budget_for(route) -> int:
+    endpoint = getattr(route, "endpoint", None)
+    return getattr(endpoint, "query_budget", settings.QUERY_BUDGET_DEFAULT)
+
+
+class QueryBudgetExceeded(Exception):
+    def __init__(self, method: str, route: str, queries: int, budget: int, statements) -> None:
+        self.method = method
+        self.route = route
+        self.queries = queries
+        self.budget = budget
+        # [(fingerprint, count)], most repeated first
+        self.statements = statements.most_common()
+        super().__init__(f"{method} {route} ran {queries} SQL statements (budget {budget})")
+
+    def report(self, limit: Optional[int] = None) -> dict:
+        return {
+            "route": f"{self.method} {self.route}",
+            "queries": self.queries,
+            "budget": self.budget,
+            "statements": [
+                {"statement": statement, "count": count} for statement, count in self.statements[:limit]
+            ],
+        }
+
+
+class QueryBudgetMiddleware:
+    """Counts the statements each request runs and enforces its route's budget.
+
+    Must sit inside ``MetricsMiddleware`` when both are installed, so they
+    share the request's ``RequestStats``.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Read per request so tests can switch modes on a running app
+        mode = settings.QUERY_BUDGET_MODE
+        if scope["type"] != "http" or mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        stats = current_request.get()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = current_request.set(stats)
+        if stats.statements is None:
+            stats.statements = Counter()
+        start_queries = stats.queries
+        reported = replaced = False
+
+        def check() -> Optional[QueryBudgetExceeded]:
+            route = scope.get("route")
+            if route is None:
+                return None
+            queries = stats.queries - start_queries
+            budget = budget_for(route)
+            if queries <= budget:
+                return None
+            return QueryBudgetExceeded(scope["method"], route.path_format, queries, budget, stats.statements)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal reported, replaced
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                exceeded = check()
+                if exceeded is not None:
+                    reported = True
+                    self._handle(exceeded, mode)
+                    if mode == "raise":
+                        replaced = True
+                        await self._reject(send, exceeded)
+                        return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+            # Streaming bodies query after the headers have gone out; those
+            # overruns can only be reported
+            if not reported:
+                exceeded = check()
+                if exceeded is not None:
+                    self._handle(exceeded, mode)
+        finally:
+            if token is not None:
+                current_request.reset(token)
+
+    def _handle(self, exceeded: QueryBudgetExceeded, mode: str) -> None:
+        for listener in listeners:
+            listener(exceeded)
+        top = ", ".join(f"{count}x {statement[:200]}" for statement, count in exceeded.statements[:5])
+        log = logger.error if mode == "raise" else logger.warning
+        log("%s; top statements: %s", exceeded, top)
+
+    async def _reject(self, send: Send, exceeded: QueryBudgetExceeded) -> None:
+        body = dumps({"detail": {
+            "code": "QUERY_BUDGET_EXCEEDED",
+            "message": str(exceeded),
+            **exceeded.report(limit=20),
+        }})
+        await send({
+            "type": "http.response.start",
+            "status": 500,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,294 @@
+"""Admission control: per-plan rate limits, route concurrency caps and load shedding.
+
+Every request is charged against a token bucket (requests per minute) and a
+daily counter, keyed by user for authenticated requests and by client IP
+otherwise. Limits come from the user's plan (``RATE_LIMIT_PER_MINUTE`` /
+``RATE_LIMIT_PER_DAY``; 0 means unlimited). Expensive routes additionally
+get a cap on concurrent executions, and when every pooled DB connection is
+checked out and requests are already queueing, new ones are turned away
+with 503 before they can pile onto the pool.
+
+Counters live in a pluggable backend: ``MemoryBackend`` (per worker, the
+default) or ``RedisBackend`` (shared across workers; needs ``redis``).
+"""
+import importlib
+import ipaddress
+import math
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.auth import decode_token
+from app.config import get_settings
+from app.entitlements import entitlement_cache
+from app.responses import dumps
+
+settings = get_settings()
+
+# (method, path) -> max concurrent executions across the backend's scope
+CONCURRENCY_LIMITS: Dict[Tuple[str, str], int] = {
+    ("POST", "/v1/insights/generate"): settings.INSIGHTS_GENERATE_CONCURRENCY,
+    ("GET", "/v1/transactions/stats/summary"): settings.STATS_SUMMARY_CONCURRENCY,
+}
+
+# Never limited, so health checks and scrapes keep working under load. Payment
+# webhooks are signature-checked and arrive in bursts from a few provider IPs.
+EXEMPT_PATHS = {"/", "/health", "/metrics", "/v1/billing/webhook"}
+
+# Long-lived streams: rate limited on connect, but not counted as queued work for load shedding
+STREAMING_PATHS = {"/v1/events"}
+
+DAY = 86400
+
+TRUSTED_PROXIES = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.RATE_LIMIT_TRUSTED_PROXIES]
+
+
+class MemoryBackend:
+    """Counters for a single worker process."""
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._windows: Dict[str, Tuple[int, int]] = {}
+        self._active: Dict[str, int] = {}
+
+    async def take(self, key: str, capacity: int, per_second: float) -> float:
+        """Take one token; returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * per_second)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / per_second
+        self._buckets[key] = (tokens - 1, now)
+        if len(self._buckets) > self.max_keys:
+            self._sweep(now)
+        return 0.0
+
+    def _sweep(self, now: float) -> None:
+        # Buckets idle long enough to have refilled hold no information
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated > 60:
+                del self._buckets[key]
+
+    async def hit(self, key: str, window: int) -> int:
+        """Count a request in the current fixed window; returns the new count."""
+        current = int(time.time()) // window
+        start, count = self._windows.get(key, (current, 0))
+        count = count + 1 if start == current else 1
+        self._windows[key] = (current, count)
+        if len(self._windows) > self.max_keys:
+            self._windows = {k: v for k, v in self._windows.items() if v[0] == current}
+        return count
+
+    async def acquire(self, key: str, limit: int) -> Optional[str]:
+        """Take a concurrency slot; returns a lease to release it with, or ``None`` if all are taken."""
+        if self._active.get(key, 0) >= limit:
+            return None
+        self._active[key] = self._active.get(key, 0) + 1
+        return key
+
+    async def release(self, key: str, lease: str) -> None:
+        self._active[key] = max(self._active.get(key, 1) - 1, 0)
+
+
+# KEYS[1] = bucket; ARGV = capacity, tokens per second, now
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local wait = 0
+if tokens < 1 then
+  wait = (1 - tokens) / rate
+else
+  tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+# KEYS[1] = sorted set of leases scored by expiry; ARGV = limit, lease, now, lease seconds.
+# Leases of workers that died before releasing expire instead of holding their slot forever.
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+  return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[4]), ARGV[2])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[4])) + 1)
+return 1
+"""
+
+
+class RedisBackend:
+    """Counters shared by every worker through Redis (``RATE_LIMIT_REDIS_URL``)."""
+
+    def __init__(self, url: str = None) -> None:
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RedisBackend needs the 'redis' package")
+        self._redis = redis.from_url(url or settings.RATE_LIMIT_REDIS_URL)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+        self._acquire = self._redis.register_script(_ACQUIRE_SCRIPT)
+
+    async def take(self, key: str, capacity: int, per_second: float) -> float:
+        return float(await self._take(keys=[key], args=[capacity, per_second, time.time()]))
+
+    async def hit(self, key: str, window: int) -> int:
+        window_key = f"{key}:{int(time.time()) // window}"
+        async with self._redis.pipeline(transaction=True) as pipe:
+            count, _ = await pipe.incr(window_key).expire(window_key, window).execute()
+        return count
+
+    async def acquire(self, key: str, limit: int) -> Optional[str]:
+        lease = uuid.uuid4().hex
+        args = [limit, lease, time.time(), settings.RATE_LIMIT_LEASE_SECONDS]
+        return lease if await self._acquire(keys=[key], args=args) else None
+
+    async def release(self, key: str, lease: str) -> None:
+        await self._redis.zrem(key, lease)
+
+
+def load_backend(name: str):
+    """``memory``, ``redis`` or a ``module:Class`` path to a custom backend."""
+    if name == "memory":
+        return MemoryBackend()
+    if name == "redis":
+        return RedisBackend()
+    module, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module), attr)()
+
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def _client_ip(scope: Scope) -> str:
+    """The connecting address, or, behind trusted proxies, the nearest hop they didn't add.
+
+    Clients can prepend anything to ``X-Forwarded-For``, so the header is
+    read right to left and only while each hop is a trusted proxy.
+    """
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if not _trusted(address):
+        return address
+    hops = [
+        hop.strip()
+        for name, value in scope["headers"] if name == b"x-forwarded-for"
+        for hop in value.decode("latin-1").split(",")
+    ]
+    for hop in reversed(hops):
+        if hop and not _trusted(hop):
+            return hop
+        address = hop or address
+    return address
+
+
+def _identity(scope: Scope) -> Tuple[str, Optional[str]]:
+    """``(rate limit key, plan)``; the plan is ``None`` for anonymous callers."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            payload = decode_token(token) if scheme.lower() == "bearer" else None
+            try:
+                user_id = UUID(payload["sub"])
+            except (TypeError, KeyError, ValueError):
+                break
+            # Prefer the cached plan, which follows upgrades before the token does
+            entry = entitlement_cache.peek(user_id)
+            plan = entry.plan if entry is not None else payload.get("plan") or "free"
+            return f"user:{user_id}", plan
+    return f"ip:{_client_ip(scope)}", None
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp, backend=None, pool=None) -> None:
+        self.app = app
+        self.backend = backend or load_backend(settings.RATE_LIMIT_BACKEND)
+        self.pool = pool
+        self.in_flight = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        key, plan = _identity(scope)
+        rejection = await self._check_rate(key, plan) or self._check_pool()
+        if rejection:
+            await self._reject(send, *rejection)
+            return
+
+        if scope["path"] in STREAMING_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        concurrency_key = lease = None
+        limit = CONCURRENCY_LIMITS.get((scope["method"], scope["path"]))
+        if limit:
+            concurrency_key = f"rl:active:{scope['path']}"
+            lease = await self.backend.acquire(concurrency_key, limit)
+            if lease is None:
+                await self._reject(send, 503, "BUSY", "Too many of these requests are running, try again shortly", 1)
+                return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            if lease is not None:
+                await self.backend.release(concurrency_key, lease)
+
+    async def _check_rate(self, key: str, plan: Optional[str]):
+        if plan is None:
+            per_minute, per_day = settings.RATE_LIMIT_IP_PER_MINUTE, 0
+        else:
+            per_minute = settings.RATE_LIMIT_PER_MINUTE.get(plan, settings.RATE_LIMIT_PER_MINUTE["free"])
+            per_day = settings.RATE_LIMIT_PER_DAY.get(plan, settings.RATE_LIMIT_PER_DAY["free"])
+
+        if per_minute:
+            wait = await self.backend.take(f"rl:min:{key}", per_minute, per_minute / 60)
+            if wait:
+                return 429, "RATE_LIMITED", "Too many requests", wait
+        if per_day:
+            if await self.backend.hit(f"rl:day:{key}", DAY) > per_day:
+                return 429, "RATE_LIMITED", "Daily request limit reached", DAY - time.time() % DAY
+        return None
+
+    def _check_pool(self):
+        """Shed load when every connection is busy and requests are already queueing for one."""
+        if self.pool is None:
+            return None
+        capacity = self.pool.size() + max(getattr(self.pool, "_max_overflow", 0), 0)
+        if self.pool.checkedout() >= capacity and self.in_flight >= capacity * settings.ADMISSION_QUEUE_FACTOR:
+            return 503, "OVERLOADED", "The service is busy, try again shortly", settings.ADMISSION_RETRY_AFTER_SECONDS
+        return None
+
+    async def _reject(self, send: Send, status: int, code: str, message: str, retry_after: float) -> None:
+        body = dumps({"detail": {"code": code, "message": message}})
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(math.ceil(retry_after), 1)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,30 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _default(obj: Any) -> Any:
+    # Keep Decimal exact on the wire, matching Pydantic's JSON mode
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to JSON bytes; UUID, datetime and numpy types are handled natively."""
+    return orjson.dumps(
+        content,
+        default=_default,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: orjson-backed JSON with Decimal support."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
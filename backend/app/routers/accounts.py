@@ -1,73 +1,69 @@
 from typing import List, Optional
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
-from app.models import User, Account, AccountType, Subscription
+from app.models import User, Account, AccountType, Transaction
 from app.schemas import AccountCreate, AccountUpdate, AccountResponse, AccountListResponse
 from app.auth import get_current_user
+from app.entitlements import adjust_active_accounts, get_entitlements
+from app.jobs import needs_background_purge, purge_account
+from app.querybudget import query_budget
+from app.versions import bump_versions, conditional_get, ACCOUNTS, TRANSACTIONS
 
 router = APIRouter()
 
 
 async def check_account_limit(user: User, db: AsyncSession) -> bool:
     """Check if user has reached their account limit."""
-    # Get subscription
-    sub_result = await db.execute(
-        select(Subscription).where(Subscription.user_id == user.id)
+    entitlements = await get_entitlements(user, db)
+    return entitlements.can_add_account
+
+
+def account_limit_exceeded() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_402_PAYMENT_REQUIRED,
+        detail={
+            "code": "ACCOUNT_LIMIT_EXCEEDED",
+            "message": "You've reached your account limit. Upgrade to add more accounts.",
+            "upgrade_url": "/billing/checkout?plan=pro"
+        }
     )
-    subscription = sub_result.scalar_one_or_none()
-    
-    max_accounts = subscription.max_accounts if subscription else 2
-    
-    # Count existing accounts
-    count_result = await db.execute(
-        select(func.count(Account.id))
-        .where(Account.user_id == user.id)
-        .where(Account.is_archived == False)
+
+
+def accounts_query(user_id: UUID, include_archived: bool = False):
+    """A user's accounts with their type names, newest first."""
+    query = (
+        select(Account, AccountType.name)
+        .outerjoin(AccountType, AccountType.id == Account.account_type_id)
+        .where(Account.user_id == user_id)
+        .where(Account.deleted_at.is_(None))
     )
-    current_count = count_result.scalar() or 0
     
-    return current_count < max_accounts
+    if not include_archived:
+        query = query.where(Account.is_archived == False)
+    
+    return query.order_by(Account.created_at.desc())
 
 
-@router.get("", response_model=AccountListResponse)
+@router.get("", response_model=AccountListResponse, dependencies=[Depends(conditional_get(ACCOUNTS))])
+@query_budget(5)
 async def list_accounts(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     include_archived: bool = False
 ):
     """List all accounts for current user."""
-    query = (
-        select(Account)
-        .where(Account.user_id == current_user.id)
-    )
-    
-    if not include_archived:
-        query = query.where(Account.is_archived == False)
-    
-    query = query.order_by(Account.created_at.desc())
-    
-    result = await db.execute(query)
-    accounts = result.scalars().all()
+    result = await db.execute(accounts_query(current_user.id, include_archived))
     
-    # Get account type names
     account_responses = []
     by_type = {}
     
-    for account in accounts:
-        # Get type name
-        type_name = None
-        if account.account_type_id:
-            type_result = await db.execute(
-                select(AccountType.name).where(AccountType.id == account.account_type_id)
-            )
-            type_name = type_result.scalar()
-        
+    for account, type_name in result.all():
         account_resp = AccountResponse(
             id=account.id,
             name=account.name,
@@ -101,14 +97,7 @@ async def create_account(
     """Create a new account."""
     # Check limit
     if not await check_account_limit(current_user, db):
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail={
-                "code": "ACCOUNT_LIMIT_EXCEEDED",
-                "message": "You've reached your account limit. Upgrade to add more accounts.",
-                "upgrade_url": "/billing/checkout?plan=pro"
-            }
-        )
+        raise account_limit_exceeded()
     
     # Get account type ID
     type_result = await db.execute(
@@ -127,7 +116,9 @@ async def create_account(
     )
     
     db.add(account)
+    await bump_versions(db, current_user.id, ACCOUNTS)
     await db.commit()
+    adjust_active_accounts(current_user.id, 1)
     await db.refresh(account)
     
     return AccountResponse(
@@ -144,7 +135,7 @@ async def create_account(
     )
 
 
-@router.get("/{account_id}", response_model=AccountResponse)
+@router.get("/{account_id}", response_model=AccountResponse, dependencies=[Depends(conditional_get(ACCOUNTS))])
 async def get_account(
     account_id: UUID,
     current_user: User = Depends(get_current_user),
@@ -155,6 +146,7 @@ async def get_account(
         select(Account)
         .where(Account.id == account_id)
         .where(Account.user_id == current_user.id)
+        .where(Account.deleted_at.is_(None))
     )
     account = result.scalar_one_or_none()
     
@@ -198,6 +190,7 @@ async def update_account(
         select(Account)
         .where(Account.id == account_id)
         .where(Account.user_id == current_user.id)
+        .where(Account.deleted_at.is_(None))
     )
     account = result.scalar_one_or_none()
     
@@ -216,7 +209,16 @@ async def update_account(
     if account_data.is_hidden is not None:
         account.is_hidden = account_data.is_hidden
     
+    active_delta = 0
+    if account_data.is_archived is not None and account_data.is_archived != account.is_archived:
+        if not account_data.is_archived and not await check_account_limit(current_user, db):
+            raise account_limit_exceeded()
+        account.is_archived = account_data.is_archived
+        active_delta = -1 if account_data.is_archived else 1
+    
+    await bump_versions(db, current_user.id, ACCOUNTS)
     await db.commit()
+    adjust_active_accounts(current_user.id, active_delta)
     await db.refresh(account)
     
     # Get type name
@@ -244,6 +246,7 @@ async def update_account(
 @router.delete("/{account_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_account(
     account_id: UUID,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -252,6 +255,7 @@ async def delete_account(
         select(Account)
         .where(Account.id == account_id)
         .where(Account.user_id == current_user.id)
+        .where(Account.deleted_at.is_(None))
     )
     account = result.scalar_one_or_none()
     
@@ -261,8 +265,23 @@ async def delete_account(
             detail="Account not found"
         )
     
+    active_delta = 0 if account.is_archived else -1
+    
+    if await needs_background_purge(db, Transaction.account_id, account.id):
+        # Hide the account now and delete its transactions in batches after responding
+        account.deleted_at = datetime.now(timezone.utc)
+        account.is_archived = True
+        await bump_versions(db, current_user.id, ACCOUNTS)
+        await db.commit()
+        adjust_active_accounts(current_user.id, active_delta)
+        background_tasks.add_task(purge_account, account.id)
+        return
+    
+    # Transactions go with the account through ON DELETE CASCADE
     await db.delete(account)
+    await bump_versions(db, current_user.id, ACCOUNTS, TRANSACTIONS)
     await db.commit()
+    adjust_active_accounts(current_user.id, active_delta)
 
 
 @router.post("/{account_id}/sync")
@@ -276,6 +295,7 @@ async def sync_account(
         select(Account)
         .where(Account.id == account_id)
         .where(Account.user_id == current_user.id)
+        .where(Account.deleted_at.is_(None))
     )
     account = result.scalar_one_or_none()
     
@@ -294,6 +314,7 @@ async def sync_account(
     # TODO: Implement actual sync logic based on provider
     account.last_synced_at = datetime.utcnow()
     account.sync_status = "ok"
+    await bump_versions(db, current_user.id, ACCOUNTS)
     await db.commit()
     
     return {"message": "Account synced successfully", "last_synced_at": account.last_synced_at}
@@ -3,43 +3,45 @@ from uuid import UUID
 from datetime import datetime
 from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select, func, literal_column
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.models import User, Asset
-from app.schemas import AssetCreate, AssetUpdate, AssetResponse
+from app.schemas import (
+    AssetCreate,
+    AssetUpdate,
+    AssetResponse,
+    AssetBatchRequest,
+    AssetBatchResult,
+    AssetBatchResponse,
+)
 from app.auth import get_current_user
+from app.projections import Projection, schema_columns
+from app.versions import bump_versions, conditional_get, ASSETS
 
 router = APIRouter()
 
+ASSET_COLUMNS = schema_columns(AssetResponse, Asset)
+asset_list = Projection(List[AssetResponse])
 
-@router.get("", response_model=List[AssetResponse])
+
+@router.get("", response_model=List[AssetResponse], dependencies=[Depends(conditional_get(ASSETS))])
 async def list_assets(
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """List all manual assets."""
+    # gain / gain_percent are generated columns
     result = await db.execute(
-        select(Asset)
+        select(*ASSET_COLUMNS)
         .where(Asset.user_id == current_user.id)
         .order_by(Asset.created_at.desc())
     )
-    assets = result.scalars().all()
-    
-    responses = []
-    for asset in assets:
-        resp = AssetResponse.model_validate(asset)
-        if asset.purchase_value:
-            resp.gain = asset.current_value - asset.purchase_value
-            if asset.purchase_value > 0:
-                resp.gain_percent = float((resp.gain / asset.purchase_value) * 100)
-            else:
-                resp.gain_percent = 0.0
-        responses.append(resp)
-        
-    return responses
+    return asset_list.render(result.mappings().all(), response)
 
 
 @router.post("", response_model=AssetResponse, status_code=status.HTTP_201_CREATED)
@@ -56,22 +58,72 @@ async def create_asset(
         current_value=asset_data.current_value,
         purchase_value=asset_data.purchase_value,
         purchase_date=asset_data.purchase_date,
+        symbol=asset_data.symbol,
+        quantity=asset_data.quantity,
         notes=asset_data.notes
     )
     
     db.add(asset)
+    await bump_versions(db, current_user.id, ASSETS)
     await db.commit()
     await db.refresh(asset)
     
-    resp = AssetResponse.model_validate(asset)
-    if asset.purchase_value:
-        resp.gain = asset.current_value - asset.purchase_value
-        if asset.purchase_value > 0:
-            resp.gain_percent = float((resp.gain / asset.purchase_value) * 100)
-    return resp
+    return AssetResponse.model_validate(asset)
+
+
+@router.post("/batch", response_model=AssetBatchResponse)
+async def upsert_assets(
+    batch: AssetBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create or update many assets in one statement, matched on client_key."""
+    keys = [item.client_key for item in batch.items]
+    if len(set(keys)) != len(keys):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Duplicate client_key in batch")
+    
+    stmt = insert(Asset).values([
+        {"user_id": current_user.id, **item.model_dump()}
+        for item in batch.items
+    ])
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_assets_user_client_key",
+        set_={
+            "name": stmt.excluded.name,
+            "asset_type": stmt.excluded.asset_type,
+            "current_value": stmt.excluded.current_value,
+            "purchase_value": stmt.excluded.purchase_value,
+            "purchase_date": stmt.excluded.purchase_date,
+            "symbol": stmt.excluded.symbol,
+            "quantity": stmt.excluded.quantity,
+            "notes": stmt.excluded.notes,
+            "updated_at": func.now(),
+        }
+    ).returning(
+        *Asset.__table__.c,
+        # xmax is 0 only for freshly inserted row versions
+        (literal_column("xmax") == 0).label("inserted")
+    )
+    
+    rows = (await db.execute(stmt)).all()
+    await bump_versions(db, current_user.id, ASSETS)
+    await db.commit()
+    
+    by_key = {row.client_key: row for row in rows}
+    results = [
+        AssetBatchResult(
+            client_key=key,
+            status="created" if by_key[key].inserted else "updated",
+            asset=AssetResponse.model_validate(by_key[key])
+        )
+        for key in keys
+    ]
+    created = sum(1 for r in results if r.status == "created")
+    
+    return AssetBatchResponse(results=results, created=created, updated=len(results) - created)
 
 
-@router.get("/{asset_id}", response_model=AssetResponse)
+@router.get("/{asset_id}", response_model=AssetResponse, dependencies=[Depends(conditional_get(ASSETS))])
 async def get_asset(
     asset_id: UUID,
     current_user: User = Depends(get_current_user),
@@ -88,12 +140,7 @@ async def get_asset(
     if not asset:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Asset not found")
         
-    resp = AssetResponse.model_validate(asset)
-    if asset.purchase_value:
-        resp.gain = asset.current_value - asset.purchase_value
-        if asset.purchase_value > 0:
-            resp.gain_percent = float((resp.gain / asset.purchase_value) * 100)
-    return resp
+    return AssetResponse.model_validate(asset)
 
 
 @router.patch("/{asset_id}", response_model=AssetResponse)
@@ -118,18 +165,18 @@ async def update_asset(
         asset.name = asset_data.name
     if asset_data.current_value is not None:
         asset.current_value = asset_data.current_value
+    if asset_data.symbol is not None:
+        asset.symbol = asset_data.symbol
+    if asset_data.quantity is not None:
+        asset.quantity = asset_data.quantity
     if asset_data.notes is not None:
         asset.notes = asset_data.notes
         
+    await bump_versions(db, current_user.id, ASSETS)
     await db.commit()
     await db.refresh(asset)
     
-    resp = AssetResponse.model_validate(asset)
-    if asset.purchase_value:
-        resp.gain = asset.current_value - asset.purchase_value
-        if asset.purchase_value > 0:
-            resp.gain_percent = float((resp.gain / asset.purchase_value) * 100)
-    return resp
+    return AssetResponse.model_validate(asset)
 
 
 @router.delete("/{asset_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -150,4 +197,5 @@ async def delete_asset(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Asset not found")
         
     await db.delete(asset)
+    await bump_versions(db, current_user.id, ASSETS)
     await db.commit()
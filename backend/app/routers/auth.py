@@ -45,7 +45,7 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     await db.refresh(user)
     
     # Generate tokens
-    access_token = create_access_token(user.id)
+    access_token = create_access_token(user.id, user.plan)
     refresh_token = create_refresh_token(user.id)
     
     return AuthResponse(
@@ -58,7 +58,9 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
 @router.post("/login", response_model=AuthResponse)
 async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     """Authenticate user and return tokens."""
-    result = await db.execute(select(User).where(User.email == credentials.email))
+    result = await db.execute(
+        select(User).where(User.email == credentials.email).where(User.deleted_at.is_(None))
+    )
     user = result.scalar_one_or_none()
     
     if user is None or not verify_password(credentials.password, user.password_hash):
@@ -71,7 +73,7 @@ async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     user.last_login_at = datetime.utcnow()
     await db.commit()
     
-    access_token = create_access_token(user.id)
+    access_token = create_access_token(user.id, user.plan)
     refresh_token = create_refresh_token(user.id)
     
     return AuthResponse(
@@ -93,7 +95,9 @@ async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_db)):
         )
     
     user_id = payload.get("sub")
-    result = await db.execute(select(User).where(User.id == UUID(user_id)))
+    result = await db.execute(
+        select(User).where(User.id == UUID(user_id)).where(User.deleted_at.is_(None))
+    )
     user = result.scalar_one_or_none()
     
     if user is None:
@@ -102,7 +106,7 @@ async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_db)):
             detail="User not found"
         )
     
-    new_access_token = create_access_token(user.id)
+    new_access_token = create_access_token(user.id, user.plan)
     new_refresh_token = create_refresh_token(user.id)
     
     return Token(
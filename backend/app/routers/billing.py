@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -9,6 +9,8 @@ from app.database import get_db
 from app.models import User, Subscription
 from app.schemas import CheckoutRequest, CheckoutResponse, SubscriptionResponse
 from app.auth import get_current_user
+from app.billing_events import SignatureError, dispatcher, parse_webhook, store_event
+from app.entitlements import invalidate_entitlements, max_accounts_for
 
 router = APIRouter()
 
@@ -26,9 +28,10 @@ async def get_subscription(
     
     if not sub:
         # Create default free subscription
-        sub = Subscription(user_id=current_user.id, plan="free", max_accounts=2)
+        sub = Subscription(user_id=current_user.id, plan="free", max_accounts=max_accounts_for("free"))
         db.add(sub)
         await db.commit()
+        invalidate_entitlements(current_user.id)
         await db.refresh(sub)
         
     return SubscriptionResponse(
@@ -64,7 +67,22 @@ async def create_checkout_session(
         session_id="sess_mock_123456789"
     )
 
-# Webhook endpoint would go here
 @router.post("/webhook")
-async def payment_webhook():
+async def payment_webhook(request: Request, db: AsyncSession = Depends(get_db)):
+    """Verify and store a Stripe/Razorpay event; it is applied in the background."""
+    body = await request.body()
+    try:
+        event = parse_webhook(body, request.headers)
+    except SignatureError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    except (ValueError, KeyError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed event")
+    
+    event_pk = await store_event(db, event)
+    await db.commit()
+    
+    if event_pk is None:
+        return {"status": "duplicate"}
+    
+    dispatcher.submit(event_pk, event.customer_id)
     return {"status": "received"}
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+
+from app.auth import get_current_user
+from app.categories import CategoryTree, get_category_tree
+from app.config import get_settings
+from app.models import User
+from app.schemas import CategoryTreeResponse
+from app.versions import etag_matches
+
+router = APIRouter()
+settings = get_settings()
+
+
+@router.get("", response_model=CategoryTreeResponse)
+async def list_categories(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    tree: CategoryTree = Depends(get_category_tree)
+):
+    """The full category tree, depth-first.
+
+    The same for every user, so the body is rendered once per tree load and
+    clients may reuse it for ``CATEGORY_TREE_TTL_SECONDS`` and revalidate
+    with ``If-None-Match`` after that.
+    """
+    headers = {"ETag": tree.etag, "Cache-Control": f"private, max-age={settings.CATEGORY_TREE_TTL_SECONDS}"}
+    if etag_matches(request.headers.get("if-none-match", ""), tree.etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return Response(tree.body, media_type="application/json", headers=headers)
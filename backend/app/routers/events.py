@@ -0,0 +1,68 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import get_current_user
+from app.config import get_settings
+from app.database import get_db
+from app.events import broker
+from app.models import User
+from app.responses import dumps
+
+router = APIRouter()
+settings = get_settings()
+
+# Client reconnect delay after the stream ends (deploys, worker drain)
+RETRY_MS = 3000
+
+
+def sse(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+async def event_stream(user: User):
+    # Subscribed here rather than in the endpoint, so a client gone before
+    # the body starts never leaves a subscriber behind
+    subscriber = broker.subscribe(user.id)
+    try:
+        yield f"retry: {RETRY_MS}\n\n".encode()
+        # Anything may have changed while disconnected
+        yield sse("ready", {})
+        while True:
+            try:
+                async with asyncio.timeout(settings.EVENTS_HEARTBEAT_SECONDS):
+                    await subscriber.wake.wait()
+            except TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield b": keep-alive\n\n"
+                continue
+            if subscriber.closed:
+                return
+            yield sse("changed", {"resources": sorted(subscriber.take())})
+    finally:
+        broker.unsubscribe(user.id, subscriber)
+
+
+@router.get("")
+async def stream_events(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Server-sent events announcing which of the user's resources changed.
+
+    Sends ``ready`` on connect, then ``changed`` with ``{"resources": [...]}``
+    after each committed write; comment lines keep the connection alive.
+    """
+    if not broker.has_room(current_user.id):
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many open event streams")
+
+    # The stream outlives the request; don't hold a pooled connection for it
+    await db.close()
+
+    return StreamingResponse(
+        event_stream(current_user),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,50 +1,92 @@
+import base64
+import json
 from typing import List, Optional
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select, update, func
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import select, update, func, and_, or_, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-import google.generativeai as genai
 
-from app.config import get_settings
+from app import ai
 from app.database import get_db
 from app.models import User, Insight, Transaction, Account
 from app.schemas import InsightResponse, InsightListResponse
 from app.auth import get_current_user
+from app.projections import Projection, schema_columns
+from app.versions import bump_versions, conditional_get, INSIGHTS
 
 router = APIRouter()
-settings = get_settings()
 
-if settings.GEMINI_API_KEY:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
+INSIGHT_COLUMNS = schema_columns(InsightResponse, Insight)
+insight_list = Projection(InsightListResponse)
 
 
-@router.get("", response_model=InsightListResponse)
+def active_insight_filter(user_id: UUID, now: datetime):
+    """Conditions for insights that should still be shown to the user."""
+    return and_(
+        Insight.user_id == user_id,
+        Insight.is_dismissed == False,
+        or_(Insight.valid_until.is_(None), Insight.valid_until > now),
+    )
+
+
+def encode_cursor(insight: Insight) -> str:
+    payload = json.dumps([insight.priority, insight.created_at.isoformat(), str(insight.id)])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        priority, created_at, insight_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(priority), datetime.fromisoformat(created_at), UUID(insight_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+@router.get("", response_model=InsightListResponse, dependencies=[Depends(conditional_get(INSIGHTS))])
 async def list_insights(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get all valid insights for the user."""
-    # Get active insights
+    """Get valid insights for the user, one page at a time."""
+    now = datetime.now(timezone.utc)
+    active = active_insight_filter(current_user.id, now)
+    
+    # Keyset pagination on (priority, created_at, id), all descending
     query = (
-        select(Insight)
-        .where(Insight.user_id == current_user.id)
-        .where(Insight.is_dismissed == False)
-        # .where(Insight.valid_until >= datetime.utcnow()) # Optional: filter expired
-        .order_by(Insight.priority.desc(), Insight.created_at.desc())
+        select(*INSIGHT_COLUMNS)
+        .where(active)
+        .order_by(Insight.priority.desc(), Insight.created_at.desc(), Insight.id.desc())
+        .limit(limit + 1)
     )
+    if cursor:
+        query = query.where(
+            tuple_(Insight.priority, Insight.created_at, Insight.id) < tuple_(*decode_cursor(cursor))
+        )
     
     result = await db.execute(query)
-    insights = result.scalars().all()
+    insights = result.all()
     
-    # Count unread
-    unread_count = sum(1 for i in insights if not i.is_read)
+    next_cursor = None
+    if len(insights) > limit:
+        insights = insights[:limit]
+        next_cursor = encode_cursor(insights[-1])
     
-    return InsightListResponse(
-        insights=[InsightResponse.model_validate(i) for i in insights],
-        unread_count=unread_count
+    # Count unread across all pages
+    unread_result = await db.execute(
+        select(func.count()).select_from(Insight).where(active, Insight.is_read == False)
     )
+    unread_count = unread_result.scalar_one()
+    
+    return insight_list.render({
+        "insights": [i._mapping for i in insights],
+        "unread_count": unread_count,
+        "next_cursor": next_cursor,
+    }, response)
 
 
 @router.post("/{insight_id}/read")
@@ -65,6 +107,7 @@ async def mark_read(
         raise HTTPException(status_code=404, detail="Insight not found")
         
     insight.is_read = True
+    await bump_versions(db, current_user.id, INSIGHTS)
     await db.commit()
     return {"status": "success"}
 
@@ -87,6 +130,7 @@ async def dismiss_insight(
         raise HTTPException(status_code=404, detail="Insight not found")
         
     insight.is_dismissed = True
+    await bump_versions(db, current_user.id, INSIGHTS)
     await db.commit()
     return {"status": "success"}
 
@@ -97,7 +141,7 @@ async def generate_insights(
     db: AsyncSession = Depends(get_db)
 ):
     """Manually trigger AI insight generation."""
-    if not settings.GEMINI_API_KEY:
+    if not ai.is_configured():
         raise HTTPException(status_code=503, detail="AI service not configured")
         
     # 1. Gather recent data
@@ -110,7 +154,7 @@ async def generate_insights(
     transactions = transactions_res.scalars().all()
     
     accounts_res = await db.execute(
-        select(Account).where(Account.user_id == current_user.id)
+        select(Account).where(Account.user_id == current_user.id).where(Account.deleted_at.is_(None))
     )
     accounts = accounts_res.scalars().all()
     
@@ -142,12 +186,10 @@ async def generate_insights(
     """
     
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = await model.generate_content_async(prompt)
+        text = await ai.generate_text(prompt)
         # cleanup response text if it has markdown ticks
-        text = response.text.replace("```json", "").replace("```", "").strip()
+        text = text.replace("```json", "").replace("```", "").strip()
         
-        import json
         insights_data = json.loads(text)
         
         generated_count = 0
@@ -165,6 +207,7 @@ async def generate_insights(
             db.add(insight)
             generated_count += 1
             
+        await bump_versions(db, current_user.id, INSIGHTS)
         await db.commit()
         return {"message": f"Generated {generated_count} insights"}
         
@@ -1,54 +1,142 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
+from datetime import date
 from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select, func
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select, func, literal_column
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app import amortization
+from app.cache import LRUCache
 from app.database import get_db
+from app.fx import FxRateStore, get_fx_rates, unconverted_currencies
 from app.models import User, Liability
-from app.schemas import LiabilityCreate, LiabilityUpdate, LiabilityResponse, LiabilityListResponse
+from app.schemas import (
+    LiabilityCreate,
+    LiabilityUpdate,
+    LiabilityResponse,
+    LiabilityListResponse,
+    LiabilityBatchRequest,
+    LiabilityBatchResult,
+    LiabilityBatchResponse,
+    AmortizationRow,
+    AmortizationScheduleResponse,
+    PrepaymentRequest,
+    PrepaymentResult,
+    PrepaymentResponse,
+    LiabilityInterestItem,
+    InterestSummaryResponse,
+)
 from app.auth import get_current_user
+from app.projections import Projection, schema_columns
+from app.versions import bump_versions, conditional_get, LIABILITIES, PROFILE
 
 router = APIRouter()
 
+# (liability id, updated_at, as-of date) -> AmortizationScheduleResponse
+schedule_cache = LRUCache("liability_schedules", maxsize=2048)
 
-@router.get("", response_model=LiabilityListResponse)
+LIABILITY_COLUMNS = schema_columns(LiabilityResponse, Liability)
+liability_list = Projection(LiabilityListResponse)
+
+
+def _money(value: float) -> Optional[Decimal]:
+    return Decimal(f"{value:.2f}") if np.isfinite(value) else None
+
+
+def _months(value: float) -> Optional[int]:
+    return int(value) if np.isfinite(value) else None
+
+
+def _emi_day(liability: Liability) -> int:
+    if liability.emi_day:
+        return liability.emi_day
+    return liability.start_date.day if liability.start_date else 1
+
+
+def _loan_terms(liabilities: List[Liability]):
+    """Arrays of (balance, monthly rate, emi, emi day), one element per liability."""
+    balance = np.array([float(l.current_balance) for l in liabilities], dtype=np.float64)
+    rate = amortization.monthly_rate([float(l.interest_rate or 0) for l in liabilities])
+    emi = np.array([float(l.emi_amount) for l in liabilities], dtype=np.float64)
+    emi_day = np.array([_emi_day(l) for l in liabilities], dtype=np.int64)
+    return balance, rate, emi, emi_day
+
+
+def build_schedule(liability: Liability, today: date) -> AmortizationScheduleResponse:
+    balance, rate, emi, emi_day = _loan_terms([liability])
+    months = amortization.remaining_months(balance, rate, emi)
+    interest_left = amortization.interest_outstanding(balance, rate, emi, months)
+    
+    count = int(min(months[0], amortization.MAX_MONTHS))
+    payment, principal, interest, closing = (
+        np.round(a[0], 2).tolist() for a in amortization.schedule(balance, rate, emi, count)
+    )
+    next_due = amortization.next_emi_dates(emi_day, today)[0]
+    due_dates = amortization.emi_dates(next_due, int(emi_day[0]), count).tolist()
+    
+    finite = np.isfinite(months[0])
+    return AmortizationScheduleResponse(
+        liability_id=liability.id,
+        emi_amount=liability.emi_amount,
+        interest_rate=liability.interest_rate or Decimal(0),
+        remaining_months=_months(months[0]),
+        interest_outstanding=_money(interest_left[0]),
+        total_payable=_money(balance[0] + interest_left[0]),
+        next_emi_date=next_due.item() if count else None,
+        payoff_date=due_dates[-1] if finite and count else None,
+        schedule=[
+            AmortizationRow(
+                installment=i + 1,
+                due_date=due_dates[i],
+                payment=Decimal(f"{payment[i]:.2f}"),
+                principal=Decimal(f"{principal[i]:.2f}"),
+                interest=Decimal(f"{interest[i]:.2f}"),
+                balance=Decimal(f"{closing[i]:.2f}"),
+            )
+            for i in range(count)
+        ],
+    )
+
+
+@router.get("", response_model=LiabilityListResponse, dependencies=[Depends(conditional_get(LIABILITIES))])
 async def list_liabilities(
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """List all liabilities."""
     result = await db.execute(
-        select(Liability)
+        select(*LIABILITY_COLUMNS)
         .where(Liability.user_id == current_user.id)
         .order_by(Liability.created_at.desc())
     )
-    liabilities = result.scalars().all()
     
     total_liability = Decimal(0)
     monthly_emi_total = Decimal(0)
     
-    liability_responses = []
-    for l in liabilities:
-        resp = LiabilityResponse.model_validate(l)
-        if l.principal_amount and l.principal_amount > 0:
-            paid_amount = l.principal_amount - l.current_balance
-            resp.paid_percent = float((paid_amount / l.principal_amount) * 100)
+    liabilities = []
+    for row in result.mappings():
+        l = dict(row)
+        if l["principal_amount"] and l["principal_amount"] > 0:
+            paid_amount = l["principal_amount"] - l["current_balance"]
+            l["paid_percent"] = float((paid_amount / l["principal_amount"]) * 100)
         else:
-            resp.paid_percent = 0.0
+            l["paid_percent"] = 0.0
             
-        liability_responses.append(resp)
-        total_liability += l.current_balance
-        if l.emi_amount:
-            monthly_emi_total += l.emi_amount
+        liabilities.append(l)
+        total_liability += l["current_balance"]
+        if l["emi_amount"]:
+            monthly_emi_total += l["emi_amount"]
             
-    return LiabilityListResponse(
-        liabilities=liability_responses,
-        total_liability=total_liability,
-        monthly_emi_total=monthly_emi_total
-    )
+    return liability_list.render({
+        "liabilities": liabilities,
+        "total_liability": total_liability,
+        "monthly_emi_total": monthly_emi_total,
+    }, response)
 
 
 @router.post("", response_model=LiabilityResponse, status_code=status.HTTP_201_CREATED)
@@ -71,6 +159,7 @@ async def create_liability(
     )
     
     db.add(liability)
+    await bump_versions(db, current_user.id, LIABILITIES)
     await db.commit()
     await db.refresh(liability)
     
@@ -82,7 +171,141 @@ async def create_liability(
     return resp
 
 
-@router.get("/{liab_id}", response_model=LiabilityResponse)
+@router.post("/batch", response_model=LiabilityBatchResponse)
+async def upsert_liabilities(
+    batch: LiabilityBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create or update many liabilities in one statement, matched on client_key."""
+    keys = [item.client_key for item in batch.items]
+    if len(set(keys)) != len(keys):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Duplicate client_key in batch")
+    
+    stmt = insert(Liability).values([
+        {"user_id": current_user.id, **item.model_dump()}
+        for item in batch.items
+    ])
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_liabilities_user_client_key",
+        set_={
+            "name": stmt.excluded.name,
+            "liability_type": stmt.excluded.liability_type,
+            "current_balance": stmt.excluded.current_balance,
+            "principal_amount": stmt.excluded.principal_amount,
+            "interest_rate": stmt.excluded.interest_rate,
+            "emi_amount": stmt.excluded.emi_amount,
+            "emi_day": stmt.excluded.emi_day,
+            "lender": stmt.excluded.lender,
+            "updated_at": func.now(),
+        }
+    ).returning(
+        *Liability.__table__.c,
+        # xmax is 0 only for freshly inserted row versions
+        (literal_column("xmax") == 0).label("inserted")
+    )
+    
+    rows = (await db.execute(stmt)).all()
+    await bump_versions(db, current_user.id, LIABILITIES)
+    await db.commit()
+    
+    updated_ids = {row.id for row in rows if not row.inserted}
+    if updated_ids:
+        schedule_cache.invalidate_where(lambda key: key[0] in updated_ids)
+    
+    by_key = {row.client_key: row for row in rows}
+    results = []
+    for key in keys:
+        row = by_key[key]
+        resp = LiabilityResponse.model_validate(row)
+        if row.principal_amount and row.principal_amount > 0:
+            paid_amount = row.principal_amount - row.current_balance
+            resp.paid_percent = float((paid_amount / row.principal_amount) * 100)
+        results.append(LiabilityBatchResult(
+            client_key=key,
+            status="created" if row.inserted else "updated",
+            liability=resp
+        ))
+    created = sum(1 for r in results if r.status == "created")
+    
+    return LiabilityBatchResponse(results=results, created=created, updated=len(results) - created)
+
+
+@router.get(
+    "/interest-summary",
+    response_model=InterestSummaryResponse,
+    # PROFILE: totals are in the user's currency
+    dependencies=[Depends(conditional_get(LIABILITIES, PROFILE, daily=True))],
+)
+async def get_interest_summary(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    fx: FxRateStore = Depends(get_fx_rates)
+):
+    """Interest outstanding and next EMI dates across all EMI-based liabilities.
+
+    Items are in each liability's own currency; totals and the weighted rate
+    are in the user's currency, leaving out liabilities without an FX rate.
+    """
+    result = await db.execute(
+        select(Liability)
+        .where(Liability.user_id == current_user.id)
+        .where(Liability.emi_amount > 0)
+        .order_by(Liability.created_at.desc())
+    )
+    liabilities = result.scalars().all()
+    
+    if not liabilities:
+        return InterestSummaryResponse(
+            liabilities=[],
+            total_interest_outstanding=Decimal(0),
+            monthly_interest_total=Decimal(0),
+            weighted_interest_rate=0.0,
+            not_amortizing=0,
+            currency=current_user.currency
+        )
+    
+    balance, rate, emi, emi_day = _loan_terms(liabilities)
+    months = amortization.remaining_months(balance, rate, emi)
+    interest_left = amortization.interest_outstanding(balance, rate, emi, months)
+    monthly_interest = balance * rate
+    next_due = amortization.next_emi_dates(emi_day, date.today())
+    
+    finite = np.isfinite(interest_left)
+    
+    # Per-liability factor into the user's currency; NaN where there is no rate
+    factors = fx.factors(current_user.currency)
+    factor = np.array([float(factors.get(l.currency, "nan")) for l in liabilities], dtype=np.float64)
+    converted = np.isfinite(factor)
+    counted = finite & converted
+    total_balance = (balance * factor)[converted].sum()
+    weighted_rate = float((rate * balance * factor)[converted].sum() / total_balance * 1200) if total_balance > 0 else 0.0
+    
+    return InterestSummaryResponse(
+        liabilities=[
+            LiabilityInterestItem(
+                id=l.id,
+                name=l.name,
+                currency=l.currency,
+                remaining_months=_months(months[i]),
+                interest_outstanding=_money(interest_left[i]),
+                monthly_interest=_money(monthly_interest[i]),
+                next_emi_date=next_due[i].item() if months[i] > 0 else None,
+            )
+            for i, l in enumerate(liabilities)
+        ],
+        total_interest_outstanding=_money((interest_left * factor)[counted].sum()),
+        monthly_interest_total=_money((monthly_interest * factor)[converted].sum()),
+        weighted_interest_rate=round(weighted_rate, 2),
+        not_amortizing=int((~finite).sum()),
+        currency=current_user.currency,
+        unconverted_currencies=unconverted_currencies(
+            current_user.id, [l.currency for i, l in enumerate(liabilities) if not converted[i]]
+        )
+    )
+
+
+@router.get("/{liab_id}", response_model=LiabilityResponse, dependencies=[Depends(conditional_get(LIABILITIES))])
 async def get_liability(
     liab_id: UUID,
     current_user: User = Depends(get_current_user),
@@ -132,7 +355,9 @@ async def update_liability(
     if liab_data.notes is not None:
         liability.notes = liab_data.notes
         
+    await bump_versions(db, current_user.id, LIABILITIES)
     await db.commit()
+    schedule_cache.invalidate_where(lambda key: key[0] == liab_id)
     await db.refresh(liability)
     
     resp = LiabilityResponse.model_validate(liability)
@@ -161,4 +386,90 @@ async def delete_liability(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Liability not found")
         
     await db.delete(liability)
+    await bump_versions(db, current_user.id, LIABILITIES)
     await db.commit()
+    schedule_cache.invalidate_where(lambda key: key[0] == liab_id)
+
+
+@router.get("/{liab_id}/schedule", response_model=AmortizationScheduleResponse, dependencies=[Depends(conditional_get(LIABILITIES, daily=True))])
+async def get_liability_schedule(
+    liab_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Full amortization schedule from the next EMI until payoff."""
+    result = await db.execute(
+        select(Liability)
+        .where(Liability.id == liab_id)
+        .where(Liability.user_id == current_user.id)
+    )
+    liability = result.scalar_one_or_none()
+    
+    if not liability:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Liability not found")
+    
+    if not liability.emi_amount or liability.emi_amount <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Liability has no EMI to amortize")
+    
+    today = date.today()
+    key = (liability.id, liability.updated_at, today)
+    schedule = schedule_cache.get(key)
+    if schedule is None:
+        schedule = build_schedule(liability, today)
+        schedule_cache.set(key, schedule)
+    return schedule
+
+
+@router.post("/{liab_id}/prepayments", response_model=PrepaymentResponse)
+async def evaluate_prepayments(
+    liab_id: UUID,
+    request: PrepaymentRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Evaluate a batch of prepayment what-if scenarios for one liability."""
+    result = await db.execute(
+        select(Liability)
+        .where(Liability.id == liab_id)
+        .where(Liability.user_id == current_user.id)
+    )
+    liability = result.scalar_one_or_none()
+    
+    if not liability:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Liability not found")
+    
+    if not liability.emi_amount or liability.emi_amount <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Liability has no EMI to amortize")
+    
+    balance, rate, emi, _ = _loan_terms([liability])
+    base_months = amortization.remaining_months(balance, rate, emi)[0]
+    base_interest = amortization.interest_outstanding(balance, rate, emi)[0]
+    
+    scenarios = request.scenarios
+    new_emi, months, interest = amortization.evaluate_prepayments(
+        balance[0],
+        rate[0],
+        emi[0],
+        lump_sum=[float(sc.lump_sum) for sc in scenarios],
+        extra_monthly=[float(sc.extra_monthly) for sc in scenarios],
+        reduce_emi=[sc.mode == "reduce_emi" for sc in scenarios],
+    )
+    
+    return PrepaymentResponse(
+        liability_id=liability.id,
+        remaining_months=_months(base_months),
+        interest_outstanding=_money(base_interest),
+        scenarios=[
+            PrepaymentResult(
+                lump_sum=sc.lump_sum,
+                extra_monthly=sc.extra_monthly,
+                mode=sc.mode,
+                emi_amount=_money(new_emi[i]),
+                remaining_months=_months(months[i]),
+                interest_outstanding=_money(interest[i]),
+                months_saved=_months(base_months - months[i]),
+                interest_saved=_money(base_interest - interest[i]),
+            )
+            for i, sc in enumerate(scenarios)
+        ]
+    )
@@ -0,0 +1,84 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.downsample import lttb
+from app.models import User, NetWorthHistory, NetWorthRollup
+from app.schemas import NetWorthHistoryItem, NetWorthHistoryResponse
+from app.auth import get_current_user
+from app.versions import conditional_get, NETWORTH
+
+router = APIRouter()
+
+INTERVAL_DAYS = {"day": 1, "week": 7, "month": 30}
+
+
+def pick_interval(date_from: date, date_to: date, points: int) -> str:
+    """Finest source that yields at most ~2x the requested points."""
+    days = max((date_to - date_from).days, 1)
+    for interval in ("day", "week", "month"):
+        if days / INTERVAL_DAYS[interval] <= points * 2:
+            return interval
+    return "month"
+
+
+@router.get("/history", response_model=NetWorthHistoryResponse, dependencies=[Depends(conditional_get(NETWORTH, daily=True))])
+async def get_networth_history(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    interval: Optional[str] = Query(None, pattern="^(day|week|month)$"),
+    points: int = Query(200, ge=10, le=2000),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Net worth over time, downsampled to at most ``points`` points.
+
+    Long ranges read the precomputed weekly/monthly rollups instead of daily
+    snapshots; anything still above ``points`` is reduced with LTTB.
+    """
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=365)
+    if date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from must be before date_to")
+    
+    interval = interval or pick_interval(date_from, date_to, points)
+    start = datetime.combine(date_from, datetime.min.time())
+    end = datetime.combine(date_to, datetime.max.time())
+    
+    if interval == "day":
+        query = (
+            select(NetWorthHistory.snapshot_date, NetWorthHistory.net_worth)
+            .where(NetWorthHistory.user_id == current_user.id)
+            .where(NetWorthHistory.snapshot_date.between(start, end))
+            .order_by(NetWorthHistory.snapshot_date)
+        )
+    else:
+        query = (
+            select(NetWorthRollup.snapshot_date, NetWorthRollup.net_worth)
+            .where(NetWorthRollup.user_id == current_user.id)
+            .where(NetWorthRollup.period == interval)
+            .where(NetWorthRollup.snapshot_date.between(start, end))
+            .order_by(NetWorthRollup.snapshot_date)
+        )
+    rows = (await db.execute(query)).all()
+    
+    if len(rows) > points:
+        series = [(r.snapshot_date.timestamp(), float(r.net_worth)) for r in rows]
+        rows = [rows[i] for i in lttb(series, points)]
+    
+    growth = {"absolute": Decimal(0), "percent": 0.0}
+    if rows:
+        first, last = rows[0].net_worth, rows[-1].net_worth
+        growth["absolute"] = last - first
+        growth["percent"] = round(float((last - first) / first * 100), 2) if first else 0.0
+    
+    return NetWorthHistoryResponse(
+        history=[NetWorthHistoryItem(date=r.snapshot_date, net_worth=r.net_worth) for r in rows],
+        growth=growth,
+        interval=interval
+    )
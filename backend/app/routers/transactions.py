@@ -3,43 +3,64 @@ from uuid import UUID
 from datetime import datetime
 from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy import select, func, desc
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func, desc, Select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.database import get_db
-from app.models import User, Transaction, Account, Category
+from app.merchants import resolve_merchants
+from app.models import User, Transaction, Account, Category, Merchant
 from app.schemas import (
     TransactionCreate, 
     TransactionUpdate, 
     TransactionResponse, 
     TransactionListResponse,
+    TransactionSearchResponse,
     TransactionStats
 )
 from app.auth import get_current_user
+from app.categories import CategoryTree, get_category_tree
+from app.exports import stream_csv, stream_ndjson
+from app.fx import FxRateStore, convert_column, get_fx_rates, unconverted_column, unconverted_currencies, as_date, CENT
+from app.projections import Projection, nest, schema_columns
+from app.querybudget import query_budget
+from app.search import query_words, search_condition
+from app.versions import bump_versions, conditional_get, ACCOUNTS, TRANSACTIONS
 
 router = APIRouter()
 
+TRANSACTION_COLUMNS = (
+    *schema_columns(TransactionResponse, Transaction, account_name=Account.name),
+    Category.id.label("category_id"),
+    Category.name.label("category_name"),
+    Category.icon.label("category_icon"),
+)
+transaction_list = Projection(TransactionListResponse)
+transaction_search = Projection(TransactionSearchResponse)
 
-@router.get("", response_model=TransactionListResponse)
-async def list_transactions(
+# Transactions of an account marked deleted disappear before the background purge
+# reaches them; an anti-join against the few accounts in idx_accounts_deleted
+ACCOUNT_NOT_DELETED = ~(
+    select(Account.id)
+    .where(Account.id == Transaction.account_id)
+    .where(Account.deleted_at.is_not(None))
+    .correlate(Transaction)
+    .exists()
+)
+
+
+def filter_transactions(
+    query: Select,
     account_id: Optional[UUID] = None,
     category_id: Optional[int] = None,
     transaction_type: Optional[str] = None,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
-    limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
-    """List transactions with filtering."""
-    query = (
-        select(Transaction)
-        .options(selectinload(Transaction.category))
-        .where(Transaction.user_id == current_user.id)
-    )
+) -> Select:
+    """Apply the shared list/export filters to a transaction query."""
+    query = query.where(ACCOUNT_NOT_DELETED)
     
     if account_id:
         query = query.where(Transaction.account_id == account_id)
@@ -55,38 +76,54 @@ async def list_transactions(
         
     if date_to:
         query = query.where(Transaction.transaction_date <= date_to)
+    
+    return query
+
+
+def transaction_page(query: Select, limit: int, offset: int) -> Select:
+    """Sort and paginate a filtered query, selecting only the columns the response needs."""
+    return (
+        query.with_only_columns(*TRANSACTION_COLUMNS)
+        .select_from(Transaction)
+        .outerjoin(Account, Account.id == Transaction.account_id)
+        .outerjoin(Category, Category.id == Transaction.category_id)
+        .order_by(desc(Transaction.transaction_date), desc(Transaction.created_at))
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+@router.get("", response_model=TransactionListResponse, dependencies=[Depends(conditional_get(TRANSACTIONS, ACCOUNTS))])
+@query_budget(4)
+async def list_transactions(
+    response: Response,
+    account_id: Optional[UUID] = None,
+    category_id: Optional[int] = None,
+    transaction_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """List transactions with filtering."""
+    query = select(Transaction.id).where(Transaction.user_id == current_user.id)
+    query = filter_transactions(query, account_id, category_id, transaction_type, date_from, date_to)
         
     # Get total count
     count_query = select(func.count()).select_from(query.subquery())
     count_result = await db.execute(count_query)
     total = count_result.scalar_one()
     
-    # Sort and paginate
-    query = query.order_by(desc(Transaction.transaction_date), desc(Transaction.created_at))
-    query = query.limit(limit).offset(offset)
+    result = await db.execute(transaction_page(query, limit, offset))
     
-    result = await db.execute(query)
-    transactions = result.scalars().all()
-    
-    transaction_responses = []
-    for txn in transactions:
-        # Get account name
-        account_name = None
-        # Optimization: could join Accounts table or cache this
-        if txn.account_id:
-            account_res = await db.execute(select(Account.name).where(Account.id == txn.account_id))
-            account_name = account_res.scalar_one_or_none()
-
-        response = TransactionResponse.model_validate(txn)
-        response.account_name = account_name
-        transaction_responses.append(response)
-
-    return TransactionListResponse(
-        transactions=transaction_responses,
-        total=total,
-        limit=limit,
-        offset=offset
-    )
+    return transaction_list.render({
+        "transactions": [nest(dict(row), "category", "category_") for row in result.mappings()],
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+    }, response)
 
 
 @router.post("", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
@@ -98,7 +135,10 @@ async def create_transaction(
     """Create a new transaction manually."""
     # Verify account belongs to user
     account_result = await db.execute(
-        select(Account).where(Account.id == txn_data.account_id).where(Account.user_id == current_user.id)
+        select(Account)
+        .where(Account.id == txn_data.account_id)
+        .where(Account.user_id == current_user.id)
+        .where(Account.deleted_at.is_(None))
     )
     account = account_result.scalar_one_or_none()
     
@@ -109,6 +149,7 @@ async def create_transaction(
         )
     
     # Create transaction
+    merchant_ids = await resolve_merchants(db, [txn_data.merchant_name])
     txn = Transaction(
         user_id=current_user.id,
         account_id=txn_data.account_id,
@@ -116,6 +157,7 @@ async def create_transaction(
         transaction_type=txn_data.transaction_type,
         description=txn_data.description,
         merchant_name=txn_data.merchant_name,
+        merchant_id=merchant_ids.get(txn_data.merchant_name),
         category_id=txn_data.category_id,
         transaction_date=txn_data.transaction_date
     )
@@ -127,6 +169,7 @@ async def create_transaction(
         account.current_balance -= abs(txn_data.amount)  # Ensure amount is subtracted
         
     db.add(txn)
+    await bump_versions(db, current_user.id, TRANSACTIONS, ACCOUNTS)
     await db.commit()
     await db.refresh(txn)
 
@@ -143,7 +186,103 @@ async def create_transaction(
     return response
 
 
-@router.get("/{txn_id}", response_model=TransactionResponse)
+EXPORT_COLUMNS = (
+    Transaction.id,
+    Transaction.transaction_date,
+    Transaction.posted_date,
+    Transaction.amount,
+    Transaction.currency,
+    Transaction.transaction_type,
+    Transaction.description,
+    Transaction.merchant_name,
+    Category.name.label("category"),
+    Transaction.account_id,
+    Account.name.label("account_name"),
+    Transaction.tags,
+    Transaction.is_recurring,
+    Transaction.created_at,
+)
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", stream_csv),
+    "ndjson": ("application/x-ndjson", stream_ndjson),
+}
+
+
+@router.get("/export")
+async def export_transactions(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    account_id: Optional[UUID] = None,
+    category_id: Optional[int] = None,
+    transaction_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream the full (filtered) transaction history as CSV or NDJSON."""
+    query = (
+        select(*EXPORT_COLUMNS)
+        .select_from(Transaction)
+        .join(Account, Account.id == Transaction.account_id)
+        .outerjoin(Category, Category.id == Transaction.category_id)
+        .where(Transaction.user_id == current_user.id)
+    )
+    query = filter_transactions(query, account_id, category_id, transaction_type, date_from, date_to)
+    query = query.order_by(desc(Transaction.transaction_date), desc(Transaction.created_at))
+    
+    media_type, writer = EXPORT_FORMATS[format]
+    columns = [c.key for c in EXPORT_COLUMNS]
+    filename = f"transactions-{datetime.utcnow():%Y%m%d}.{format}"
+    
+    return StreamingResponse(
+        writer(query, columns),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/search", response_model=TransactionSearchResponse, dependencies=[Depends(conditional_get(TRANSACTIONS, ACCOUNTS))])
+@query_budget(3)
+async def search_transactions(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100),
+    account_id: Optional[UUID] = None,
+    category_id: Optional[int] = None,
+    transaction_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Search merchant names and memos, best match first (see app.search).
+
+    Words match as prefixes and, for longer words, despite a typo; the list
+    filters apply on top.
+    """
+    if not query_words(q):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="q must contain a letter or digit")
+    
+    condition, rank = search_condition(q)
+    query = select(Transaction.id).where(Transaction.user_id == current_user.id).where(condition)
+    query = filter_transactions(query, account_id, category_id, transaction_type, date_from, date_to)
+    query = (
+        transaction_page(query, limit, offset)
+        .add_columns(rank.label("rank"))
+        .order_by(None)
+        .order_by(desc("rank"), desc(Transaction.transaction_date), desc(Transaction.created_at))
+    )
+    result = await db.execute(query)
+    
+    return transaction_search.render({
+        "transactions": [nest(dict(row), "category", "category_") for row in result.mappings()],
+        "limit": limit,
+        "offset": offset,
+    }, response)
+
+
+@router.get("/{txn_id}", response_model=TransactionResponse, dependencies=[Depends(conditional_get(TRANSACTIONS, ACCOUNTS))])
 async def get_transaction(
     txn_id: UUID,
     current_user: User = Depends(get_current_user),
@@ -192,11 +331,13 @@ async def update_transaction(
         txn.description = txn_data.description
     if txn_data.merchant_name is not None:
         txn.merchant_name = txn_data.merchant_name
+        txn.merchant_id = (await resolve_merchants(db, [txn_data.merchant_name])).get(txn_data.merchant_name)
     if txn_data.category_id is not None:
         txn.category_id = txn_data.category_id
     if txn_data.tags is not None:
         txn.tags = txn_data.tags
         
+    await bump_versions(db, current_user.id, TRANSACTIONS)
     await db.commit()
     await db.refresh(txn)
     
@@ -238,6 +379,7 @@ async def delete_transaction(
             account.current_balance += abs(txn.amount)
 
     await db.delete(txn)
+    await bump_versions(db, current_user.id, TRANSACTIONS, ACCOUNTS)
     await db.commit()
 
 
@@ -245,65 +387,111 @@ async def delete_transaction(
 async def get_transaction_stats(
     date_from: datetime,
     date_to: datetime,
+    depth: Optional[int] = Query(None, ge=0, description="Deepest category level to list; deeper spending is rolled into it"),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    fx: FxRateStore = Depends(get_fx_rates),
+    tree: CategoryTree = Depends(get_category_tree)
 ):
-    """Get summarized transaction statistics."""
-    # Income
-    income_query = select(func.sum(Transaction.amount)).where(
+    """Get summarized transaction statistics in the user's currency.
+
+    Foreign-currency amounts are converted at the rates in effect on ``date_to``;
+    currencies without a rate are left out and listed in ``unconverted_currencies``.
+    ``by_category`` lists every category with activity, each amount rolled up
+    from its whole subtree, parents before children. Subtrees under an income
+    root count credits and the rest count debits, so refunds and transfers in don't offset
+    spending; ``percent`` is the share of categorized income or of categorized
+    spending, whichever the category belongs to.
+    """
+    factors = fx.factors(current_user.currency, as_date(date_to))
+    amount = convert_column(Transaction.amount, Transaction.currency, factors)
+    in_period = (
         Transaction.user_id == current_user.id,
         Transaction.transaction_date >= date_from,
         Transaction.transaction_date <= date_to,
-        Transaction.transaction_type == "credit"
+        ACCOUNT_NOT_DELETED,
     )
-    income = (await db.execute(income_query)).scalar() or Decimal(0)
     
-    # Expenses
-    expense_query = select(func.sum(Transaction.amount)).where(
-        Transaction.user_id == current_user.id,
-        Transaction.transaction_date >= date_from,
-        Transaction.transaction_date <= date_to,
-        Transaction.transaction_type == "debit"
-    )
-    expenses = (await db.execute(expense_query)).scalar() or Decimal(0)
+    # Income and expenses in one pass
+    totals_query = select(
+        func.sum(amount).filter(Transaction.transaction_type == "credit").label("income"),
+        func.sum(amount).filter(Transaction.transaction_type == "debit").label("expenses"),
+        unconverted_column(Transaction.currency, factors),
+    ).where(*in_period)
+    totals = (await db.execute(totals_query)).one()
+    income = (totals.income or Decimal(0)).quantize(CENT)
+    expenses = (totals.expenses or Decimal(0)).quantize(CENT)
     
     # Absolute value of expenses for display
     expenses_abs = abs(expenses)
     
-    # By category
+    # By category: one grouped query, rolled up the tree in memory
     cat_query = (
-        select(Category.name, func.sum(Transaction.amount).label("total"))
-        .join(Transaction, Transaction.category_id == Category.id)
-        .where(
-            Transaction.user_id == current_user.id,
-            Transaction.transaction_date >= date_from,
-            Transaction.transaction_date <= date_to
+        select(
+            Transaction.category_id,
+            func.sum(amount).filter(Transaction.transaction_type == "credit").label("credits"),
+            func.sum(amount).filter(Transaction.transaction_type == "debit").label("debits"),
         )
-        .group_by(Category.name)
+        .where(*in_period, Transaction.category_id.is_not(None))
+        .group_by(Transaction.category_id)
     )
-    cat_results = (await db.execute(cat_query)).all()
-    by_category = [{"category": r.name, "amount": abs(r.total), "percent": 0.0} for r in cat_results]
+    def income_side(category_id: int) -> bool:
+        # A subtree takes its root's side, so its totals and percents add up
+        return tree.nodes[tree.ancestors[category_id][-1]].is_income
+
+    own = {}
+    for r in (await db.execute(cat_query)).all():
+        if r.category_id not in tree.nodes:
+            continue
+        total = (r.credits if income_side(r.category_id) else r.debits) or Decimal(0)
+        if total:
+            own[r.category_id] = abs(total)
+    rolled = tree.rollup(own)
+    categorized = {True: Decimal(0), False: Decimal(0)}
+    for category_id, total in rolled.items():
+        if tree.depth(category_id) == 0:
+            categorized[income_side(category_id)] += total
+    by_category = []
+    for category_id in tree.order:
+        if category_id not in rolled or (depth is not None and tree.depth(category_id) > depth):
+            continue
+        is_income = income_side(category_id)
+        whole = categorized[is_income]
+        by_category.append({
+            "category_id": category_id,
+            "category": tree.nodes[category_id].name,
+            "parent_id": tree.parent(category_id),
+            "depth": tree.depth(category_id),
+            "is_income": is_income,
+            "amount": rolled[category_id].quantize(CENT),
+            "own_amount": own.get(category_id, Decimal(0)).quantize(CENT),
+            "percent": round(float(rolled[category_id] / whole * 100), 1) if whole else 0.0,
+        })
     
-    # Top Merchants
-    merch_query = (
-        select(Transaction.merchant_name, func.sum(Transaction.amount).label("total"), func.count(Transaction.id).label("count"))
-        .where(
-            Transaction.user_id == current_user.id,
-            Transaction.transaction_date >= date_from,
-            Transaction.transaction_date <= date_to,
-            Transaction.transaction_type == "debit"
-        )
-        .group_by(Transaction.merchant_name)
-        .order_by(func.sum(Transaction.amount)) # Most negative amount first (largest expense)
+    # Top Merchants, grouped on the integer id and named afterwards
+    merch_totals = (
+        select(Transaction.merchant_id, func.sum(amount).label("total"), func.count(Transaction.id).label("count"))
+        .where(*in_period, Transaction.transaction_type == "debit")
+        .group_by(Transaction.merchant_id)
+        .order_by(func.sum(amount)) # Most negative amount first (largest expense)
         .limit(5)
+        .subquery()
+    )
+    merch_query = (
+        select(Merchant.name, merch_totals.c.total, merch_totals.c.count)
+        .select_from(merch_totals)
+        .outerjoin(Merchant, Merchant.id == merch_totals.c.merchant_id)
+        .order_by(merch_totals.c.total)
     )
     merch_results = (await db.execute(merch_query)).all()
-    top_merchants = [{"name": r.merchant_name or "Unknown", "amount": abs(r.total), "count": r.count} for r in merch_results]
+    top_merchants = [{"name": r.name or "Unknown", "amount": abs(r.total).quantize(CENT), "count": r.count} for r in merch_results]
 
     return TransactionStats(
         total_income=income,
         total_expenses=expenses_abs,
         net_cash_flow=income - expenses_abs,
         by_category=by_category,
-        top_merchants=top_merchants
+        top_merchants=top_merchants,
+        currency=current_user.currency,
+        unconverted_currencies=unconverted_currencies(current_user.id, totals.unconverted)
     )
@@ -1,15 +1,26 @@
+import logging
+import os
+import shutil
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 from sqlalchemy import select, func, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
-from app.models import User, Account, AccountType, Asset, Liability, NetWorthHistory
-from app.schemas import UserResponse, PortfolioResponse, PortfolioBreakdown
+from app.models import User, Account, AccountType, Asset, Liability, NetWorthHistory, TakeoutJob, Transaction
+from app.schemas import UserResponse, PortfolioResponse, PortfolioBreakdown, TakeoutJobResponse
 from app.auth import get_current_user
+from app.entitlements import invalidate_entitlements
+from app.fx import FxRateStore, convert_column, get_fx_rates, unconverted_column, unconverted_currencies, CENT
+from app.jobs import needs_background_purge, purge_user
+from app.takeout import get_job, start_takeout
+from app.versions import bump_versions, conditional_get, ACCOUNTS, ASSETS, LIABILITIES, PROFILE
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
@@ -35,6 +46,7 @@ async def update_profile(
     if theme is not None:
         current_user.theme = theme
     
+    await bump_versions(db, current_user.id, PROFILE)
     await db.commit()
     await db.refresh(current_user)
     
@@ -43,77 +55,97 @@ async def update_profile(
 
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_account(
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Delete current user account and all associated data."""
-    await db.delete(current_user)
-    await db.commit()
+    if await needs_background_purge(db, Transaction.user_id, current_user.id):
+        # Hide the user now and delete their transactions in batches after responding
+        current_user.deleted_at = datetime.now(timezone.utc)
+        await db.commit()
+        background_tasks.add_task(purge_user, current_user.id)
+    else:
+        # Child rows go with the user through ON DELETE CASCADE
+        await db.delete(current_user)
+        await db.commit()
+    
+    invalidate_entitlements(current_user.id)
 
 
-@router.get("/me/portfolio", response_model=PortfolioResponse)
+@router.get(
+    "/me/portfolio",
+    response_model=PortfolioResponse,
+    dependencies=[Depends(conditional_get(ACCOUNTS, ASSETS, LIABILITIES, PROFILE, daily=True))],
+)
 async def get_portfolio(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    fx: FxRateStore = Depends(get_fx_rates)
 ):
-    """Get portfolio summary for current user."""
+    """Get portfolio summary for current user, converted into their currency."""
+    factors = fx.factors(current_user.currency)
     
-    # Calculate totals from accounts
+    # Account totals per type, converted in SQL
     result = await db.execute(
-        select(
-            func.coalesce(func.sum(
-                func.case((AccountType.is_asset == True, Account.current_balance), else_=Decimal(0))
-            ), Decimal(0)).label("total_account_assets"),
-            func.count(Account.id).label("account_count")
-        )
-        .select_from(Account)
-        .outerjoin(AccountType, Account.account_type_id == AccountType.id)
-        .where(Account.user_id == current_user.id)
-        .where(Account.is_archived == False)
-    )
-    row = result.one()
-    total_account_assets = row.total_account_assets or Decimal(0)
-    account_count = row.account_count or 0
-    
-    # Get breakdown by type
-    breakdown_result = await db.execute(
         select(
             AccountType.name,
-            func.coalesce(func.sum(Account.current_balance), Decimal(0)).label("total")
+            AccountType.is_asset,
+            func.coalesce(
+                func.sum(convert_column(Account.current_balance, Account.currency, factors)), Decimal(0)
+            ).label("total"),
+            func.count(Account.id).label("account_count"),
+            unconverted_column(Account.currency, factors)
         )
         .select_from(Account)
         .outerjoin(AccountType, Account.account_type_id == AccountType.id)
         .where(Account.user_id == current_user.id)
+        .where(Account.deleted_at.is_(None))
         .where(Account.is_archived == False)
-        .group_by(AccountType.name)
+        .group_by(AccountType.name, AccountType.is_asset)
     )
-    breakdown_rows = breakdown_result.all()
     
+    total_account_assets = Decimal(0)
+    account_count = 0
     breakdown = PortfolioBreakdown()
-    for row in breakdown_rows:
+    unconverted = []
+    for row in result.all():
+        unconverted.append(row.unconverted)
+        total = row.total.quantize(CENT)
+        account_count += row.account_count
+        if row.is_asset:
+            total_account_assets += total
         if row.name == "bank":
-            breakdown.banks = row.total
+            breakdown.banks = total
         elif row.name == "investment":
-            breakdown.investments = row.total
+            breakdown.investments = total
         elif row.name == "crypto":
-            breakdown.crypto = row.total
+            breakdown.crypto = total
         elif row.name == "wallet":
-            breakdown.wallets = row.total
+            breakdown.wallets = total
     
     # Manual assets
     assets_result = await db.execute(
-        select(func.coalesce(func.sum(Asset.current_value), Decimal(0)))
+        select(
+            func.coalesce(func.sum(convert_column(Asset.current_value, Asset.currency, factors)), Decimal(0)),
+            unconverted_column(Asset.currency, factors)
+        )
         .where(Asset.user_id == current_user.id)
     )
-    manual_assets = assets_result.scalar() or Decimal(0)
+    manual_assets, assets_unconverted = assets_result.one()
+    manual_assets = manual_assets.quantize(CENT)
     breakdown.manual_assets = manual_assets
     
     # Liabilities
     liabilities_result = await db.execute(
-        select(func.coalesce(func.sum(Liability.current_balance), Decimal(0)))
+        select(
+            func.coalesce(func.sum(convert_column(Liability.current_balance, Liability.currency, factors)), Decimal(0)),
+            unconverted_column(Liability.currency, factors)
+        )
         .where(Liability.user_id == current_user.id)
     )
-    total_liabilities = liabilities_result.scalar() or Decimal(0)
+    total_liabilities, liabilities_unconverted = liabilities_result.one()
+    total_liabilities = total_liabilities.quantize(CENT)
     
     # Calculate net worth
     total_assets = total_account_assets + manual_assets
@@ -139,5 +171,72 @@ async def get_portfolio(
         total_liabilities=total_liabilities,
         breakdown=breakdown,
         connected_accounts=account_count,
+        currency=current_user.currency,
+        unconverted_currencies=unconverted_currencies(
+            current_user.id, *unconverted, assets_unconverted, liabilities_unconverted
+        ),
         last_updated=datetime.utcnow()
     )
+
+
+@router.get("/me/export")
+async def export_ledger(
+    format: str = Query("parquet", pattern="^(parquet|arrow)$"),
+    current_user: User = Depends(get_current_user)
+):
+    """Download transactions, accounts, assets and liabilities as typed columnar files."""
+    # pyarrow is only imported once someone asks for a columnar export
+    from app.columnar import export_user_archive
+    
+    zip_path, temp_dir = await export_user_archive(current_user.id, format)
+    filename = f"payfolio-ledger-{datetime.utcnow():%Y%m%d}-{format}.zip"
+    
+    return FileResponse(
+        zip_path,
+        media_type="application/zip",
+        filename=filename,
+        background=BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True),
+    )
+
+
+def _takeout_response(job: TakeoutJob) -> TakeoutJobResponse:
+    resp = TakeoutJobResponse.model_validate(job)
+    if job.status == "done":
+        resp.download_url = f"/v1/users/me/takeout/{job.id}/download"
+    return resp
+
+
+@router.post("/me/takeout", response_model=TakeoutJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_takeout(current_user: User = Depends(get_current_user)):
+    """Start building a zip of everything we hold about the current user."""
+    return _takeout_response(await start_takeout(current_user.id))
+
+
+@router.get("/me/takeout/{job_id}", response_model=TakeoutJobResponse)
+async def get_takeout(job_id: str, current_user: User = Depends(get_current_user)):
+    """Progress of a takeout job."""
+    job = await get_job(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Takeout not found")
+    
+    return _takeout_response(job)
+
+
+@router.get("/me/takeout/{job_id}/download")
+async def download_takeout(job_id: str, current_user: User = Depends(get_current_user)):
+    """Download a finished takeout archive."""
+    job = await get_job(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Takeout not found")
+    if job.status != "done":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Takeout is not ready")
+    if not os.path.exists(job.path):
+        # Built by a worker that doesn't share TAKEOUT_DIR with this one
+        logger.error("takeout %s archive %s is missing on this worker", job.id, job.path)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Takeout archive not found")
+    
+    return FileResponse(
+        job.path,
+        media_type="application/zip",
+        filename=f"payfolio-takeout-{job.created_at:%Y%m%d}.zip",
+    )
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from typing import Optional, List
 from uuid import UUID
@@ -42,6 +42,22 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 
+class TakeoutJobResponse(BaseModel):
+    id: str
+    status: str  # pending, running, done, failed
+    current_table: Optional[str] = None
+    tables_done: int
+    tables_total: int
+    rows_written: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    download_url: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
 class AuthResponse(BaseModel):
     access_token: str
     refresh_token: str
@@ -63,6 +79,7 @@ class AccountUpdate(BaseModel):
     institution: Optional[str] = None
     current_balance: Optional[Decimal] = None
     is_hidden: Optional[bool] = None
+    is_archived: Optional[bool] = None
 
 
 class AccountResponse(BaseModel):
@@ -115,6 +132,21 @@ class CategoryResponse(BaseModel):
         from_attributes = True
 
 
+class CategoryTreeNode(BaseModel):
+    id: int
+    name: str
+    parent_id: Optional[int]
+    icon: Optional[str]
+    color: Optional[str]
+    is_income: bool
+    depth: int
+    path: List[str]  # names from the root down to this category
+
+
+class CategoryTreeResponse(BaseModel):
+    categories: List[CategoryTreeNode]  # depth-first, parents before children
+
+
 class TransactionResponse(BaseModel):
     id: UUID
     account_id: UUID
@@ -139,12 +171,25 @@ class TransactionListResponse(BaseModel):
     offset: int
 
 
+class TransactionSearchResult(TransactionResponse):
+    rank: float
+
+
+class TransactionSearchResponse(BaseModel):
+    transactions: List[TransactionSearchResult]  # best match first
+    limit: int
+    offset: int
+
+
 class TransactionStats(BaseModel):
     total_income: Decimal
     total_expenses: Decimal
     net_cash_flow: Decimal
     by_category: List[dict]
     top_merchants: List[dict]
+    currency: str = "INR"
+    # Currencies without an FX rate; their rows are left out of every total
+    unconverted_currencies: List[str] = []
 
 
 # ============ Asset Schemas ============
@@ -155,12 +200,16 @@ class AssetCreate(BaseModel):
     current_value: Decimal
     purchase_value: Optional[Decimal] = None
     purchase_date: Optional[datetime] = None
+    symbol: Optional[str] = Field(None, max_length=64)
+    quantity: Optional[Decimal] = None
     notes: Optional[str] = None
 
 
 class AssetUpdate(BaseModel):
     name: Optional[str] = None
     current_value: Optional[Decimal] = None
+    symbol: Optional[str] = Field(None, max_length=64)
+    quantity: Optional[Decimal] = None
     notes: Optional[str] = None
 
 
@@ -170,6 +219,8 @@ class AssetResponse(BaseModel):
     asset_type: Optional[str]
     current_value: Decimal
     purchase_value: Optional[Decimal]
+    symbol: Optional[str] = None
+    quantity: Optional[Decimal] = None
     gain: Optional[Decimal] = None
     gain_percent: Optional[float] = None
     created_at: datetime
@@ -178,6 +229,26 @@ class AssetResponse(BaseModel):
         from_attributes = True
 
 
+class AssetBatchItem(AssetCreate):
+    client_key: str = Field(min_length=1, max_length=100)
+
+
+class AssetBatchRequest(BaseModel):
+    items: List[AssetBatchItem] = Field(min_length=1, max_length=500)
+
+
+class AssetBatchResult(BaseModel):
+    client_key: str
+    status: str  # created, updated
+    asset: AssetResponse
+
+
+class AssetBatchResponse(BaseModel):
+    results: List[AssetBatchResult]
+    created: int
+    updated: int
+
+
 # ============ Liability Schemas ============
 
 class LiabilityCreate(BaseModel):
@@ -219,6 +290,97 @@ class LiabilityListResponse(BaseModel):
     monthly_emi_total: Decimal
 
 
+class LiabilityBatchItem(LiabilityCreate):
+    client_key: str = Field(min_length=1, max_length=100)
+
+
+class LiabilityBatchRequest(BaseModel):
+    items: List[LiabilityBatchItem] = Field(min_length=1, max_length=500)
+
+
+class LiabilityBatchResult(BaseModel):
+    client_key: str
+    status: str  # created, updated
+    liability: LiabilityResponse
+
+
+class LiabilityBatchResponse(BaseModel):
+    results: List[LiabilityBatchResult]
+    created: int
+    updated: int
+
+
+class AmortizationRow(BaseModel):
+    installment: int
+    due_date: date
+    payment: Decimal
+    principal: Decimal
+    interest: Decimal
+    balance: Decimal
+
+
+class AmortizationScheduleResponse(BaseModel):
+    liability_id: UUID
+    emi_amount: Decimal
+    interest_rate: Decimal
+    remaining_months: Optional[int]  # None if the EMI never covers the interest
+    interest_outstanding: Optional[Decimal]
+    total_payable: Optional[Decimal]
+    next_emi_date: Optional[date]
+    payoff_date: Optional[date]
+    schedule: List[AmortizationRow]
+
+
+class PrepaymentScenario(BaseModel):
+    lump_sum: Decimal = Field(Decimal("0"), ge=0)
+    extra_monthly: Decimal = Field(Decimal("0"), ge=0)
+    mode: str = Field("reduce_tenure", pattern="^(reduce_tenure|reduce_emi)$")
+
+
+class PrepaymentRequest(BaseModel):
+    scenarios: List[PrepaymentScenario] = Field(min_length=1, max_length=100)
+
+
+class PrepaymentResult(BaseModel):
+    lump_sum: Decimal
+    extra_monthly: Decimal
+    mode: str
+    emi_amount: Decimal
+    remaining_months: Optional[int]
+    interest_outstanding: Optional[Decimal]
+    months_saved: Optional[int]
+    interest_saved: Optional[Decimal]
+
+
+class PrepaymentResponse(BaseModel):
+    liability_id: UUID
+    remaining_months: Optional[int]
+    interest_outstanding: Optional[Decimal]
+    scenarios: List[PrepaymentResult]
+
+
+class LiabilityInterestItem(BaseModel):
+    id: UUID
+    name: str
+    currency: str  # of the amounts in this item
+    remaining_months: Optional[int]
+    interest_outstanding: Optional[Decimal]
+    monthly_interest: Decimal
+    next_emi_date: Optional[date]
+
+
+class InterestSummaryResponse(BaseModel):
+    liabilities: List[LiabilityInterestItem]
+    # Totals are in the user's currency
+    total_interest_outstanding: Decimal
+    monthly_interest_total: Decimal
+    weighted_interest_rate: float
+    not_amortizing: int  # liabilities whose EMI does not cover interest
+    currency: str = "INR"
+    # Currencies without an FX rate; their liabilities are left out of the totals
+    unconverted_currencies: List[str] = []
+
+
 # ============ Insight Schemas ============
 
 class InsightResponse(BaseModel):
@@ -241,6 +403,7 @@ class InsightResponse(BaseModel):
 class InsightListResponse(BaseModel):
     insights: List[InsightResponse]
     unread_count: int
+    next_cursor: Optional[str] = None
 
 
 # ============ Portfolio Schemas ============
@@ -261,6 +424,9 @@ class PortfolioResponse(BaseModel):
     total_liabilities: Decimal
     breakdown: PortfolioBreakdown
     connected_accounts: int
+    currency: str = "INR"
+    # Currencies without an FX rate; their balances are left out of every total
+    unconverted_currencies: List[str] = []
     last_updated: datetime
 
 
@@ -272,6 +438,7 @@ class NetWorthHistoryItem(BaseModel):
 class NetWorthHistoryResponse(BaseModel):
     history: List[NetWorthHistoryItem]
     growth: dict
+    interval: str = "day"
 
 
 # ============ Billing Schemas ============
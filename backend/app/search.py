@@ -0,0 +1,47 @@
+"""Transaction search over merchant names and memos.
+
+Two indexed matchers run side by side, both scoped to one user's rows
+through GIN indexes that lead with ``user_id``:
+
+* full text on the generated ``search_vector`` column, where every word of
+  the query must match the start of a word (``swig food`` finds
+  ``Swiggy Food Order``), and
+* trigram word similarity on ``merchant_name`` and ``description``
+  (``pg_trgm``'s ``%>``), which tolerates typos (``amazn``, ``swigy``).
+
+A row matches when either does. Rank is the full-text rank (merchant words
+weigh more than memo words) plus the best trigram similarity, so exact
+prefix hits come first and typo hits after them.
+"""
+import re
+from typing import List, Tuple
+
+from sqlalchemy import ColumnElement, Float, func, literal, or_
+
+from app.models import Transaction
+
+# tsquery syntax characters never reach to_tsquery; words are split the way
+# search_vector's expression splits stored text
+WORD = re.compile(r"[^\W_]+")
+
+
+def query_words(q: str) -> List[str]:
+    return WORD.findall(q.lower())
+
+
+def search_condition(q: str) -> Tuple[ColumnElement, ColumnElement]:
+    """``(where clause, rank)`` for search text ``q``, which must contain at least one word."""
+    words = query_words(q)
+    phrase = " ".join(words)
+    tsquery = func.to_tsquery("simple", " & ".join(f"{word}:*" for word in words))
+    similarity = func.greatest(
+        func.coalesce(func.word_similarity(phrase, Transaction.merchant_name), 0),
+        func.coalesce(func.word_similarity(phrase, Transaction.description), 0),
+    )
+    condition = or_(
+        Transaction.search_vector.op("@@")(tsquery),
+        Transaction.merchant_name.op("%>")(literal(phrase)),
+        Transaction.description.op("%>")(literal(phrase)),
+    )
+    rank = (func.ts_rank(Transaction.search_vector, tsquery) + similarity).cast(Float)
+    return condition, rank
@@ -0,0 +1,402 @@
+"""Full data takeout: everything we hold about a user in one zip.
+
+Every table is read from a server-side cursor and written straight into its
+zip entry one cursor partition at a time, so memory stays flat however many
+transactions a user has. Jobs run in the background of the API process that
+accepted them; their state is kept in ``takeout_jobs`` and archives are
+written under ``TAKEOUT_DIR``, so with several workers (or hosts) any of them
+can report progress through ``GET /v1/users/me/takeout/{job_id}`` and serve
+the download, provided ``TAKEOUT_DIR`` is storage they all share.
+"""
+import asyncio
+import csv
+import io
+import logging
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+from uuid import UUID, uuid4
+
+from sqlalchemy import Select, delete, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import get_settings
+from app.database import async_session
+from app.exports import csv_value, stream_rows
+from app.models import (
+    Account, AccountType, Asset, Category, Insight, Liability, NetWorthHistory, TakeoutJob, Transaction, User
+)
+from app.responses import dumps
+from app.routers.transactions import ACCOUNT_NOT_DELETED
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PROFILE_COLUMNS = (
+    User.id,
+    User.email,
+    User.full_name,
+    User.phone,
+    User.plan,
+    User.plan_expires_at,
+    User.currency,
+    User.locale,
+    User.theme,
+    User.email_verified,
+    User.last_login_at,
+    User.created_at,
+)
+
+
+def _accounts(user_id: UUID) -> Select:
+    return (
+        select(
+            Account.id,
+            AccountType.name.label("account_type"),
+            Account.name,
+            Account.institution,
+            Account.current_balance,
+            Account.available_balance,
+            Account.currency,
+            Account.connection_type,
+            Account.provider,
+            Account.sync_status,
+            Account.is_hidden,
+            Account.is_archived,
+            Account.last_synced_at,
+            Account.created_at,
+        )
+        .outerjoin(AccountType, Account.account_type_id == AccountType.id)
+        .where(Account.user_id == user_id)
+        .where(Account.deleted_at.is_(None))
+        .order_by(Account.created_at)
+    )
+
+
+def _transactions(user_id: UUID) -> Select:
+    return (
+        select(
+            Transaction.id,
+            Transaction.account_id,
+            Transaction.transaction_date,
+            Transaction.posted_date,
+            Transaction.amount,
+            Transaction.currency,
+            Transaction.transaction_type,
+            Transaction.description,
+            Transaction.merchant_name,
+            Category.name.label("category"),
+            Transaction.tags,
+            Transaction.is_recurring,
+            Transaction.is_subscription,
+            Transaction.created_at,
+        )
+        .outerjoin(Category, Category.id == Transaction.category_id)
+        .where(Transaction.user_id == user_id)
+        # Same accounts as accounts.csv
+        .where(ACCOUNT_NOT_DELETED)
+        .order_by(Transaction.transaction_date, Transaction.id)
+    )
+
+
+def _assets(user_id: UUID) -> Select:
+    return (
+        select(
+            Asset.id,
+            Asset.name,
+            Asset.asset_type,
+            Asset.current_value,
+            Asset.purchase_value,
+            Asset.purchase_date,
+            Asset.currency,
+            Asset.symbol,
+            Asset.quantity,
+            Asset.notes,
+            Asset.created_at,
+            Asset.updated_at,
+        )
+        .where(Asset.user_id == user_id)
+        .order_by(Asset.created_at)
+    )
+
+
+def _liabilities(user_id: UUID) -> Select:
+    return (
+        select(
+            Liability.id,
+            Liability.linked_account_id,
+            Liability.name,
+            Liability.liability_type,
+            Liability.principal_amount,
+            Liability.current_balance,
+            Liability.interest_rate,
+            Liability.currency,
+            Liability.emi_amount,
+            Liability.emi_day,
+            Liability.start_date,
+            Liability.end_date,
+            Liability.lender,
+            Liability.notes,
+            Liability.created_at,
+        )
+        .where(Liability.user_id == user_id)
+        .order_by(Liability.created_at)
+    )
+
+
+def _insights(user_id: UUID) -> Select:
+    return (
+        select(
+            Insight.id,
+            Insight.insight_type,
+            Insight.title,
+            Insight.description,
+            Insight.severity,
+            Insight.data,
+            Insight.is_read,
+            Insight.is_dismissed,
+            Insight.valid_until,
+            Insight.created_at,
+        )
+        .where(Insight.user_id == user_id)
+        .order_by(Insight.created_at)
+    )
+
+
+def _net_worth_history(user_id: UUID) -> Select:
+    return (
+        select(
+            NetWorthHistory.snapshot_date,
+            NetWorthHistory.total_assets,
+            NetWorthHistory.total_liabilities,
+            NetWorthHistory.net_worth,
+            NetWorthHistory.breakdown,
+        )
+        .where(NetWorthHistory.user_id == user_id)
+        .order_by(NetWorthHistory.snapshot_date)
+    )
+
+
+# zip entry -> query for one user
+TABLES: Dict[str, Callable[[UUID], Select]] = {
+    "accounts.csv": _accounts,
+    "transactions.csv": _transactions,
+    "assets.csv": _assets,
+    "liabilities.csv": _liabilities,
+    "insights.csv": _insights,
+    "net_worth_history.csv": _net_worth_history,
+}
+
+
+# Progress is written back at most this often; the writes double as a heartbeat
+PROGRESS_INTERVAL_SECONDS = 2
+# An unfinished job without a heartbeat for this long died with its worker
+STALE_SECONDS = 60
+UNFINISHED = ("pending", "running")
+
+# Jobs running in this process
+_tasks = set()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _archive_dir(job_id: str) -> str:
+    return os.path.join(settings.TAKEOUT_DIR or tempfile.gettempdir(), f"payfolio-takeout-{job_id}")
+
+
+def _stale(job: TakeoutJob) -> bool:
+    return job.status in UNFINISHED and (_now() - job.updated_at).total_seconds() > STALE_SECONDS
+
+
+async def _save(job: TakeoutJob, force: bool = True) -> None:
+    """Write the job's progress to its row; without ``force``, at most every ``PROGRESS_INTERVAL_SECONDS``."""
+    now = _now()
+    if not force and (now - job.updated_at).total_seconds() < PROGRESS_INTERVAL_SECONDS:
+        return
+    job.updated_at = now
+    async with async_session() as db:
+        await db.execute(
+            update(TakeoutJob)
+            .where(TakeoutJob.id == job.id)
+            .values(
+                status=job.status,
+                current_table=job.current_table,
+                tables_done=job.tables_done,
+                rows_written=job.rows_written,
+                error=job.error,
+                path=job.path,
+                updated_at=job.updated_at,
+                finished_at=job.finished_at,
+            )
+        )
+        await db.commit()
+
+
+async def _write_table(archive: zipfile.ZipFile, name: str, query: Select, job: TakeoutJob) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(query.selected_columns.keys())
+
+    with archive.open(name, "w", force_zip64=True) as entry:
+        async for partition in stream_rows(query):
+            writer.writerows([csv_value(v) for v in row] for row in partition)
+            # Compress off the event loop; only one partition is held at a time
+            await asyncio.to_thread(entry.write, buffer.getvalue().encode())
+            buffer.seek(0)
+            buffer.truncate(0)
+            job.rows_written += len(partition)
+            await _save(job, force=False)
+        if buffer.tell():
+            entry.write(buffer.getvalue().encode())
+
+
+async def run_takeout(job: TakeoutJob) -> None:
+    job.status = "running"
+    await _save(job)
+    archive_dir = _archive_dir(job.id)
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, "takeout.zip")
+    started = time.perf_counter()
+
+    try:
+        archive = await asyncio.to_thread(zipfile.ZipFile, path, "w", zipfile.ZIP_DEFLATED)
+        try:
+            job.current_table = "profile.json"
+            async with async_session() as db:
+                profile = (await db.execute(select(*PROFILE_COLUMNS).where(User.id == job.user_id))).mappings().one()
+            archive.writestr("profile.json", dumps(dict(profile)))
+            job.tables_done += 1
+
+            for name, build_query in TABLES.items():
+                job.current_table = name
+                await _save(job, force=False)
+                await _write_table(archive, name, build_query(job.user_id), job)
+                job.tables_done += 1
+        finally:
+            await asyncio.to_thread(archive.close)
+
+        job.path = path
+        job.status = "done"
+        logger.info("takeout %s: %d rows in %.1fs", job.id, job.rows_written, time.perf_counter() - started)
+    except asyncio.CancelledError:
+        job.status = "failed"
+        job.error = "interrupted by shutdown"
+        shutil.rmtree(archive_dir, ignore_errors=True)
+        raise
+    except Exception as exc:
+        logger.exception("takeout %s failed", job.id)
+        job.status = "failed"
+        job.error = str(exc)
+        shutil.rmtree(archive_dir, ignore_errors=True)
+    finally:
+        job.current_table = None
+        job.finished_at = _now()
+        await _save(job)
+
+
+async def prune_jobs() -> None:
+    """Delete finished jobs older than ``TAKEOUT_TTL_SECONDS`` and their archives."""
+    cutoff = _now() - timedelta(seconds=settings.TAKEOUT_TTL_SECONDS)
+    async with async_session() as db:
+        expired = (await db.scalars(
+            delete(TakeoutJob).where(TakeoutJob.finished_at < cutoff).returning(TakeoutJob.id)
+        )).all()
+        await db.commit()
+    for job_id in expired:
+        shutil.rmtree(_archive_dir(job_id), ignore_errors=True)
+
+
+async def _mark_lost(db, job: TakeoutJob) -> None:
+    job.status = "failed"
+    job.error = "interrupted; the worker running it stopped"
+    job.finished_at = _now()
+    await db.execute(
+        update(TakeoutJob)
+        .where(TakeoutJob.id == job.id)
+        .where(TakeoutJob.status.in_(UNFINISHED))
+        .values(status=job.status, error=job.error, finished_at=job.finished_at)
+    )
+
+
+async def start_takeout(user_id: UUID) -> TakeoutJob:
+    """Start a takeout for ``user_id``, or return the one already in progress.
+
+    Job state lives in ``takeout_jobs`` so any worker can report progress
+    and serve the download; at most one unfinished job per user is enforced
+    by a partial unique index, also across workers.
+    """
+    await prune_jobs()
+    now = _now()
+    job = TakeoutJob(
+        id=uuid4().hex,
+        user_id=user_id,
+        status="pending",
+        tables_done=0,
+        tables_total=len(TABLES) + 1,  # + profile.json
+        rows_written=0,
+        created_at=now,
+        updated_at=now,
+    )
+    async with async_session() as db:
+        current = await db.scalar(
+            select(TakeoutJob).where(TakeoutJob.user_id == user_id).where(TakeoutJob.status.in_(UNFINISHED))
+        )
+        if current is not None:
+            if not _stale(current):
+                return current
+            await _mark_lost(db, current)
+
+        stmt = insert(TakeoutJob).values(
+            {column.key: getattr(job, column.key) for column in TakeoutJob.__table__.columns}
+        )
+        inserted = await db.scalar(
+            stmt.on_conflict_do_nothing(
+                index_elements=[TakeoutJob.user_id],
+                # Literal, so Postgres can match it to uq_takeout_jobs_user_unfinished
+                index_where=text("status IN ('pending', 'running')"),
+            ).returning(TakeoutJob.id)
+        )
+        await db.commit()
+        if inserted is None:
+            # Another worker started one between our read and insert
+            return await db.scalar(
+                select(TakeoutJob).where(TakeoutJob.user_id == user_id).where(TakeoutJob.status.in_(UNFINISHED))
+            )
+
+    task = asyncio.create_task(run_takeout(job))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
+
+
+async def get_job(job_id: str, user_id: UUID) -> Optional[TakeoutJob]:
+    async with async_session() as db:
+        job = await db.scalar(
+            select(TakeoutJob).where(TakeoutJob.id == job_id).where(TakeoutJob.user_id == user_id)
+        )
+        if job is not None and _stale(job):
+            await _mark_lost(db, job)
+            await db.commit()
+    if job is not None and job.finished_at is not None:
+        if (_now() - job.finished_at).total_seconds() > settings.TAKEOUT_TTL_SECONDS:
+            return None
+    return job
+
+
+async def shutdown(timeout: float) -> None:
+    """Give this process's running takeouts ``timeout`` seconds, then cancel them.
+
+    Cancelled jobs are recorded as failed; finished archives stay in
+    ``TAKEOUT_DIR`` for other workers to serve until they expire.
+    """
+    if _tasks:
+        _, pending = await asyncio.wait(set(_tasks), timeout=max(timeout, 0))
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
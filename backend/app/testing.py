@@ -0,0 +1,62 @@
+"""Pytest plugin for query budgets.
+
+Enable it with ``pytest -p app.testing`` or ``pytest_plugins = ["app.testing"]``
+in a conftest. Every test then runs with ``QUERY_BUDGET_MODE=raise``, and a
+test whose requests overran a route's budget fails at teardown with the
+offending statement fingerprints, even if it never looked at the response.
+
+The ``query_counter`` fixture measures code called directly in the test's
+own task, such as a service function::
+
+    async def test_purge(db, query_counter):
+        with query_counter(max_queries=4) as counted:
+            await purge_account(account_id)
+        assert counted.statements
+"""
+from contextlib import contextmanager
+from typing import List, Optional
+
+import pytest
+
+from app import querybudget
+from app.metrics import RequestStats, current_request
+
+
+def _format(violations: List[querybudget.QueryBudgetExceeded]) -> str:
+    lines = []
+    for exceeded in violations:
+        lines.append(str(exceeded))
+        lines.extend(f"    {count}x {statement}" for statement, count in exceeded.statements[:10])
+    return "\n".join(lines)
+
+
+@pytest.fixture(autouse=True)
+def query_budget_guard(monkeypatch):
+    """Enforce every route's query budget for the duration of a test."""
+    monkeypatch.setattr(querybudget.settings, "QUERY_BUDGET_MODE", "raise")
+    violations: List[querybudget.QueryBudgetExceeded] = []
+    querybudget.listeners.append(violations.append)
+    try:
+        yield violations
+    finally:
+        querybudget.listeners.remove(violations.append)
+    if violations:
+        pytest.fail("query budget exceeded:\n" + _format(violations), pytrace=False)
+
+
+@pytest.fixture
+def query_counter():
+    """Count statements run in a block (same task / thread only)."""
+    @contextmanager
+    def counter(max_queries: Optional[int] = None):
+        stats = RequestStats()
+        stats.statements = querybudget.Counter()
+        token = current_request.set(stats)
+        try:
+            yield stats
+        finally:
+            current_request.reset(token)
+        if max_queries is not None and stats.queries > max_queries:
+            exceeded = querybudget.QueryBudgetExceeded("block", "query_counter", stats.queries, max_queries, stats.statements)
+            pytest.fail(_format([exceeded]), pytrace=False)
+    return counter
@@ -0,0 +1,140 @@
+"""Bulk re-valuation of manual assets from a price feed.
+
+Prices live in ``asset_prices`` keyed by symbol (e.g. ``RELIANCE.NS``) or by
+asset type (e.g. ``gold``, price per unit). Every asset with a ``quantity``
+is re-valued as ``quantity * price``, matching its ``symbol`` first and its
+``asset_type`` otherwise. Each batch is a single ``UPDATE ... FROM`` over a
+primary-key range that also bumps the owners' asset versions; gains are
+generated columns and follow automatically.
+
+After market close::
+
+    python -m app.valuation prices.csv
+
+where ``prices.csv`` has ``key,price[,price_date]`` columns.
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import time
+from datetime import date
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import get_settings
+from app.database import async_session
+from app.models import Asset, AssetPrice
+from app.versions import ASSETS, bump_versions_for
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PRICE_UPSERT_CHUNK = 5000
+
+
+def read_price_file(path: str) -> List[Tuple[str, Decimal, Optional[date]]]:
+    with open(path, newline="") as f:
+        return [
+            (
+                row["key"].strip(),
+                Decimal(row["price"]),
+                date.fromisoformat(row["price_date"]) if row.get("price_date") else None,
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+async def load_prices(prices: Iterable[Tuple[str, Decimal, Optional[date]]]) -> int:
+    """Upsert prices into ``asset_prices``; returns the number of rows written."""
+    prices = list(prices)
+    async with async_session() as db:
+        for start in range(0, len(prices), PRICE_UPSERT_CHUNK):
+            chunk = prices[start:start + PRICE_UPSERT_CHUNK]
+            stmt = insert(AssetPrice).values(
+                [{"key": key, "price": price, "price_date": price_date} for key, price, price_date in chunk]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[AssetPrice.key],
+                set_={"price": stmt.excluded.price, "price_date": stmt.excluded.price_date, "updated_at": func.now()},
+            )
+            await db.execute(stmt)
+        await db.commit()
+    return len(prices)
+
+
+def revalue_statement(lower, upper):
+    """Re-value priced assets with ``lower < id <= upper``; either bound may be None."""
+    new_value = func.round(Asset.quantity * AssetPrice.price, 2)
+    stmt = (
+        update(Asset)
+        .where(Asset.quantity.is_not(None))
+        .where(AssetPrice.key == func.coalesce(Asset.symbol, Asset.asset_type))
+        # Skip rows whose value did not move, so unchanged assets keep their ETags
+        .where(Asset.current_value.is_distinct_from(new_value))
+        .values(current_value=new_value, updated_at=func.now())
+        .returning(Asset.user_id)
+    )
+    if lower is not None:
+        stmt = stmt.where(Asset.id > lower)
+    if upper is not None:
+        stmt = stmt.where(Asset.id <= upper)
+    return stmt
+
+
+async def revalue_assets(batch_size: int = None) -> int:
+    """Re-value every priced asset in primary-key batches; returns rows updated."""
+    batch_size = batch_size or settings.VALUATION_BATCH_SIZE
+    lower = None
+    total = 0
+    
+    while True:
+        async with async_session() as db:
+            # Last id of the next batch; None means this is the final batch
+            bound = (
+                select(Asset.id)
+                .where(Asset.quantity.is_not(None))
+                .order_by(Asset.id)
+                .offset(batch_size - 1)
+                .limit(1)
+            )
+            if lower is not None:
+                bound = bound.where(Asset.id > lower)
+            upper = (await db.execute(bound)).scalar()
+            
+            # One statement: update the batch, bump owners' versions, count rows
+            updated = revalue_statement(lower, upper).cte("updated")
+            bumped = bump_versions_for(updated, ASSETS).cte("bumped")
+            result = await db.execute(select(func.count()).select_from(updated).add_cte(bumped))
+            total += result.scalar_one()
+            await db.commit()
+        
+        if upper is None:
+            break
+        lower = upper
+    
+    return total
+
+
+async def run(path: str, batch_size: int = None) -> None:
+    started = time.perf_counter()
+    loaded = await load_prices(read_price_file(path))
+    updated = await revalue_assets(batch_size)
+    logger.info("loaded %d prices, re-valued %d assets in %.1fs", loaded, updated, time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load a price file and re-value manual assets")
+    parser.add_argument("price_file")
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.price_file, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Per-user data versions for ETag / conditional GET support.
+
+Every write endpoint bumps the version of the resources it touches inside
+the same transaction as the write. Read endpoints derive a weak ETag from
+those versions and answer ``If-None-Match`` with 304 before running the
+queries that would build the payload.
+"""
+import hashlib
+import time
+from datetime import date
+from typing import Dict, Iterable
+from uuid import UUID
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import BigInteger, String, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import get_current_user
+from app.database import get_db
+from app.events import publish_on_commit
+from app.models import User, UserDataVersion
+
+ACCOUNTS = "accounts"
+TRANSACTIONS = "transactions"
+ASSETS = "assets"
+LIABILITIES = "liabilities"
+INSIGHTS = "insights"
+PROFILE = "profile"
+# Bumped by the rollup job whenever a user's rollups change, which a new daily snapshot always does
+NETWORTH = "networth"
+
+# Insights expire by time without any write, so their validators also roll over
+INSIGHT_ETAG_WINDOW_SECONDS = 300
+
+
+async def bump_versions(db: AsyncSession, user_id: UUID, *resources: str) -> None:
+    """Increment the version of each resource; call before ``db.commit()``.
+
+    The user's open event streams hear about ``resources`` once the commit succeeds.
+    """
+    for resource in resources:
+        stmt = insert(UserDataVersion).values(user_id=user_id, resource=resource, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserDataVersion.user_id, UserDataVersion.resource],
+            set_={"version": UserDataVersion.version + 1, "updated_at": func.now()},
+        )
+        await db.execute(stmt)
+    publish_on_commit(db, user_id, resources)
+
+
+def bump_versions_for(user_ids, resource: str):
+    """Statement bumping ``resource`` for every user id produced by ``user_ids``.
+
+    ``user_ids`` is a selectable with a single ``user_id`` column, typically a
+    CTE over ``UPDATE ... RETURNING user_id``, so bulk writers can invalidate
+    validators in the same statement as the write.
+    """
+    rows = select(
+        user_ids.c.user_id,
+        literal(resource, String(30)),
+        literal(1, BigInteger),
+    ).distinct()
+    stmt = insert(UserDataVersion).from_select(["user_id", "resource", "version"], rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[UserDataVersion.user_id, UserDataVersion.resource],
+        set_={"version": UserDataVersion.version + 1, "updated_at": func.now()},
+    )
+
+
+async def get_versions(db: AsyncSession, user_id: UUID, resources: Iterable[str]) -> Dict[str, int]:
+    """Return the current version of each resource (0 if never written)."""
+    resources = list(resources)
+    if not resources:
+        return {}
+    result = await db.execute(
+        select(UserDataVersion.resource, UserDataVersion.version)
+        .where(UserDataVersion.user_id == user_id)
+        .where(UserDataVersion.resource.in_(resources))
+    )
+    versions = dict.fromkeys(resources, 0)
+    versions.update({row.resource: row.version for row in result})
+    return versions
+
+
+def make_etag(user_id: UUID, versions: Dict[str, int], scope: str, extra: str = "") -> str:
+    parts = [str(user_id), scope, extra] + [f"{k}={versions[k]}" for k in sorted(versions)]
+    digest = hashlib.blake2b("|".join(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: ignore the W/ prefix on both sides
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def conditional_get(*resources: str, daily: bool = False):
+    """Dependency factory that short-circuits unchanged GETs with 304.
+
+    ``daily`` mixes the current date into the ETag for payloads that also
+    depend on scheduled snapshots (e.g. net worth history).
+    """
+    async def dependency(
+        request: Request,
+        response: Response,
+        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db),
+    ) -> str:
+        versions = await get_versions(db, current_user.id, resources)
+        extra = []
+        if daily:
+            extra.append(date.today().isoformat())
+        if INSIGHTS in resources:
+            extra.append(str(int(time.time() // INSIGHT_ETAG_WINDOW_SECONDS)))
+        
+        scope = request.url.path + "?" + str(request.url.query)
+        etag = make_etag(current_user.id, versions, scope, ",".join(extra))
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        response.headers.update(headers)
+        return etag
+    
+    return dependency
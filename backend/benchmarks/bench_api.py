@@ -0,0 +1,229 @@
+"""End-to-end API benchmark against a seeded database.
+
+Usage (from ``backend/``, after ``python -m benchmarks.seed``)::
+
+    python -m benchmarks.bench_api [--requests 500] [--concurrency 16] [--url http://localhost:8000]
+    python -m benchmarks.bench_api --save-baseline benchmarks/baselines/api.json
+    python -m benchmarks.bench_api --baseline benchmarks/baselines/api.json [--tolerance 0.15]
+
+Drives every read endpoint with an async client as the seeded benchmark
+users, in-process through ASGI by default or over HTTP with ``--url``, and
+reports throughput and p50/p95/p99 latency per endpoint. With ``--baseline``
+the run is compared against a stored result and exits non-zero if any
+endpoint's p95 rose, or its throughput fell, by more than the tolerance.
+Baselines are only comparable on the same machine, database and seed.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# Rate limits would throttle the run; set before the app reads its settings
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+from sqlalchemy import select
+
+from app.auth import create_access_token
+from app.database import async_session, engine
+from app.models import Liability, Transaction, User
+from benchmarks.seed import EMAIL_DOMAIN
+
+
+class Endpoint(NamedTuple):
+    name: str
+    # user context -> (path, query params)
+    request: Callable[[dict], tuple]
+
+
+# The seed's history ends on 2026-01-01
+MONTH = {"date_from": "2025-12-01T00:00:00", "date_to": "2025-12-31T23:59:59"}
+YEAR = {"date_from": "2025-01-01T00:00:00", "date_to": "2025-12-31T23:59:59"}
+
+ENDPOINTS = [
+    Endpoint("GET /v1/users/me", lambda u: ("/v1/users/me", {})),
+    Endpoint("GET /v1/accounts", lambda u: ("/v1/accounts", {})),
+    Endpoint("GET /v1/transactions", lambda u: ("/v1/transactions", {"limit": 50})),
+    Endpoint("GET /v1/transactions (deep page)", lambda u: ("/v1/transactions", {"limit": 100, "offset": 5000})),
+    Endpoint("GET /v1/transactions (filtered)", lambda u: ("/v1/transactions", {"transaction_type": "credit", **YEAR})),
+    Endpoint("GET /v1/transactions/search (prefix)", lambda u: ("/v1/transactions/search", {"q": "swig"})),
+    Endpoint("GET /v1/transactions/search (typo)", lambda u: ("/v1/transactions/search", {"q": "amazn"})),
+    Endpoint("GET /v1/transactions/{id}", lambda u: (f"/v1/transactions/{u['transaction_id']}", {})),
+    Endpoint("GET /v1/transactions/stats/summary (month)", lambda u: ("/v1/transactions/stats/summary", MONTH)),
+    Endpoint("GET /v1/transactions/stats/summary (year)", lambda u: ("/v1/transactions/stats/summary", YEAR)),
+    Endpoint("GET /v1/assets", lambda u: ("/v1/assets", {})),
+    Endpoint("GET /v1/liabilities", lambda u: ("/v1/liabilities", {})),
+    Endpoint("GET /v1/liabilities/interest-summary", lambda u: ("/v1/liabilities/interest-summary", {})),
+    Endpoint("GET /v1/liabilities/{id}/schedule", lambda u: (f"/v1/liabilities/{u['liability_id']}/schedule", {})),
+    Endpoint("GET /v1/insights", lambda u: ("/v1/insights", {})),
+    Endpoint("GET /v1/networth/history", lambda u: ("/v1/networth/history", {"date_from": "2025-01-01", "date_to": "2025-12-31"})),
+]
+
+
+async def load_users(limit: int) -> List[dict]:
+    """Benchmark users with a token and one of their transaction and liability ids."""
+    async with async_session() as db:
+        users = (await db.execute(
+            select(User.id, User.plan)
+            .where(User.email.like(f"%@{EMAIL_DOMAIN}"))
+            .order_by(User.email)
+            .limit(limit)
+        )).all()
+        contexts = []
+        for user in users:
+            contexts.append({
+                "token": create_access_token(user.id, user.plan),
+                "transaction_id": (await db.execute(
+                    select(Transaction.id).where(Transaction.user_id == user.id).limit(1)
+                )).scalar(),
+                "liability_id": (await db.execute(
+                    select(Liability.id).where(Liability.user_id == user.id).limit(1)
+                )).scalar(),
+            })
+    return contexts
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+async def run_endpoint(
+    client: httpx.AsyncClient,
+    endpoint: Endpoint,
+    users: List[dict],
+    requests: int,
+    concurrency: int,
+    warmup: int,
+) -> dict:
+    rng = random.Random(endpoint.name)
+    plan = [rng.choice(users) for _ in range(warmup + requests)]
+    latencies: List[float] = []
+    errors = 0
+
+    async def call(user: dict, record: bool) -> None:
+        nonlocal errors
+        path, params = endpoint.request(user)
+        started = time.perf_counter()
+        response = await client.get(path, params=params, headers={"Authorization": f"Bearer {user['token']}"})
+        await response.aread()
+        if not record:
+            return
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+
+    async def worker(queue: List[dict], record: bool) -> None:
+        while queue:
+            await call(queue.pop(), record)
+
+    for record, batch in ((False, plan[:warmup]), (True, plan[warmup:])):
+        queue = list(reversed(batch))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(queue, record) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        **{f"p{q}_ms": round(percentile(latencies, q) * 1000, 2) for q in (50, 95, 99)},
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Regressions of ``results`` against ``baseline``, as printable lines."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} rps")
+        if current["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {current['errors']}")
+    return regressions
+
+
+def client_for(url: Optional[str]) -> httpx.AsyncClient:
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=60)
+    from app.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+
+async def run(args) -> Dict[str, dict]:
+    users = await load_users(args.users)
+    if not users:
+        sys.exit("no benchmark users found; run `python -m benchmarks.seed` first")
+
+    selected = [e for e in ENDPOINTS if not args.only or any(part in e.name for part in args.only)]
+    results = {}
+    async with client_for(args.url) as client:
+        for endpoint in selected:
+            results[endpoint.name] = stats = await run_endpoint(
+                client, endpoint, users, args.requests, args.concurrency, args.warmup
+            )
+            print(
+                f"{endpoint.name:45} {stats['throughput_rps']:8.1f} rps  "
+                f"p50 {stats['p50_ms']:8.2f}  p95 {stats['p95_ms']:8.2f}  p99 {stats['p99_ms']:8.2f} ms"
+                + (f"  {stats['errors']} errors" if stats["errors"] else "")
+            )
+    await engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--users", type=int, default=10, help="benchmark users to spread requests over")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--only", nargs="*", help="run endpoints whose name contains any of these")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", help="write the results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "target": args.url or "in-process",
+        "settings": {"requests": args.requests, "concurrency": args.concurrency, "users": args.users},
+        "endpoints": results,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["endpoints"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            print("\n".join(f"  {line}" for line in regressions))
+            sys.exit(1)
+        print(f"\nno regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
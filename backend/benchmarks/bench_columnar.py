@@ -0,0 +1,125 @@
+"""Compare the JSON API path with the columnar export path.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_columnar [--rows 200000]
+
+Uses synthetic transaction rows shaped like each query's output (the
+columnar export gets cents and epoch microseconds from Postgres), so no
+database is needed; reports rows/s and output size for each path.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+import pyarrow as pa
+
+from app.columnar import open_writer, table_schema, to_record_batch
+from app.exports import EXPORT_BATCH_SIZE
+from app.responses import dumps
+from app.schemas import TransactionResponse
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MERCHANTS = ["Swiggy", "Amazon India", "Zomato", "Uber", "BigBasket", "Netflix", "IRCTC", "Myntra"]
+
+
+def synthetic_rows(count: int) -> list:
+    rng = random.Random(7)
+    account_id = str(uuid4())
+    start = datetime(2020, 1, 1)
+    created = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return [
+        (
+            str(uuid4()),
+            account_id,
+            rng.randint(5, 14),
+            Decimal(rng.randint(-500000, 500000)) / 100,
+            "INR",
+            rng.choice(["debit", "credit"]),
+            f"UPI/{rng.randint(10**9, 10**10)}",
+            rng.choice(MERCHANTS),
+            False,
+            False,
+            None,
+            start + timedelta(minutes=i),
+            None,
+            created + timedelta(minutes=i),
+        )
+        for i in range(count)
+    ]
+
+
+def export_rows(rows) -> list:
+    """The same rows as the columnar export query returns them."""
+    def encode(value):
+        if isinstance(value, Decimal):
+            return int(value * 100)
+        if isinstance(value, datetime):
+            epoch = EPOCH if value.tzinfo else EPOCH.replace(tzinfo=None)
+            return (value - epoch) // timedelta(microseconds=1)
+        return value
+    return [tuple(encode(value) for value in row) for row in rows]
+
+
+def batches(rows):
+    for i in range(0, len(rows), EXPORT_BATCH_SIZE):
+        yield rows[i:i + EXPORT_BATCH_SIZE]
+
+
+def json_api_path(rows, columns) -> int:
+    """Roughly what list_transactions does per row: validate, dump, encode."""
+    size = 0
+    for batch in batches(rows):
+        page = []
+        for row in batch:
+            record = dict(zip(columns, row))
+            record["category"] = None
+            page.append(TransactionResponse.model_validate(record).model_dump(mode="json"))
+        size += len(dumps({"transactions": page}))
+    return size
+
+
+def ndjson_path(rows, columns) -> int:
+    return sum(len(dumps(dict(zip(columns, row)))) + 1 for row in rows)
+
+
+def columnar_path(rows, fmt: str) -> int:
+    schema = table_schema("transactions")
+    sink = pa.BufferOutputStream()
+    writer = open_writer(sink, schema, fmt)
+    for batch in batches(rows):
+        writer.write_batch(to_record_batch(batch, schema))
+    writer.close()
+    return sink.getvalue().size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3, help="report the best of this many runs")
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    exported = export_rows(rows)
+    columns = table_schema("transactions").names
+    paths = {
+        "json (API models)": lambda: json_api_path(rows, columns),
+        "ndjson export": lambda: ndjson_path(rows, columns),
+        "arrow ipc": lambda: columnar_path(exported, "arrow"),
+        "parquet (zstd)": lambda: columnar_path(exported, "parquet"),
+    }
+    print(f"{args.rows} transaction rows")
+    for name, run in paths.items():
+        elapsed = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            size = run()
+            elapsed = min(elapsed, time.perf_counter() - start)
+        print(f"  {name:18} {args.rows / elapsed:12,.0f} rows/s  {size / 1e6:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
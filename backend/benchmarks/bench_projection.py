@@ -0,0 +1,181 @@
+"""Per-row CPU of the ORM list path vs the Core projection fast path.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_projection [--iterations 500] [--db]
+
+Renders a 100-row ``GET /v1/transactions`` page both ways. The ORM path
+loads entities, calls ``model_validate`` on each and leaves FastAPI to
+re-validate and serialize the response model. The projection path takes
+row mappings through the precompiled ``Projection``. By default the rows
+are synthetic, which measures the response-shaping half. ``--db`` also runs
+both queries against a database seeded by ``benchmarks.seed`` and counts
+process CPU time, so entity loading is included and time spent waiting on
+Postgres is not.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from uuid import uuid4
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import desc, select
+from sqlalchemy.orm import selectinload
+
+from app.models import Account, Category, Transaction, User
+from app.responses import FastJSONResponse
+from app.routers.transactions import TRANSACTION_COLUMNS, transaction_list
+from app.projections import nest
+from app.schemas import TransactionListResponse, TransactionResponse
+from benchmarks.seed import EMAIL_DOMAIN
+
+ROWS = 100
+MERCHANTS = ["Swiggy", "Amazon India", "Zomato", "Uber", "BigBasket", "Netflix", "IRCTC", "Myntra"]
+CATEGORIES = [(5, "Food & Dining", "🍔"), (6, "Shopping", "🛒"), (7, "Transportation", "🚗"), None]
+
+response_field = create_response_field("Response_list_transactions", TransactionListResponse)
+
+
+async def render_orm(transactions, total: int) -> bytes:
+    """What list_transactions did before: model_validate per row, then FastAPI's response handling."""
+    responses = []
+    for txn, account_name in transactions:
+        response = TransactionResponse.model_validate(txn)
+        response.account_name = account_name
+        responses.append(response)
+    content = TransactionListResponse(transactions=responses, total=total, limit=ROWS, offset=0)
+    return FastJSONResponse(await serialize_response(field=response_field, response_content=content)).body
+
+
+def render_projection(rows, total: int) -> bytes:
+    content = {
+        "transactions": [nest(dict(row), "category", "category_") for row in rows],
+        "total": total,
+        "limit": ROWS,
+        "offset": 0,
+    }
+    return transaction_list.render(content).body
+
+
+def synthetic_page():
+    rng = random.Random(42)
+    account_id = uuid4()
+    now = datetime(2026, 1, 10, 10, 0, 0)
+    entities, rows = [], []
+    for i in range(ROWS):
+        category = rng.choice(CATEGORIES)
+        values = {
+            "id": uuid4(),
+            "account_id": account_id,
+            "amount": Decimal(rng.randint(-500000, 500000)) / 100,
+            "transaction_type": rng.choice(["debit", "credit"]),
+            "description": f"UPI/{rng.randint(10**9, 10**10)}/{rng.choice(MERCHANTS)}",
+            "merchant_name": rng.choice(MERCHANTS),
+            "transaction_date": now - timedelta(hours=i * 7),
+            "is_recurring": rng.random() < 0.1,
+            "created_at": (now - timedelta(hours=i * 7)).replace(tzinfo=timezone.utc),
+        }
+        # Stand-ins for loaded entities: model_validate reads them by attribute
+        category_obj = SimpleNamespace(id=category[0], name=category[1], icon=category[2]) if category else None
+        entities.append((SimpleNamespace(**values, category=category_obj), "HDFC Savings"))
+        rows.append({
+            **values,
+            "account_name": "HDFC Savings",
+            "category_id": category and category[0],
+            "category_name": category and category[1],
+            "category_icon": category and category[2],
+        })
+    return entities, rows
+
+
+def report(name: str, orm_seconds: float, projection_seconds: float, iterations: int) -> None:
+    orm_us = orm_seconds / (iterations * ROWS) * 1e6
+    projection_us = projection_seconds / (iterations * ROWS) * 1e6
+    print(f"{name}")
+    print(f"  ORM + model_validate  {orm_us:8.2f} us/row")
+    print(f"  Core projection       {projection_us:8.2f} us/row  ({orm_us / projection_us:.1f}x, {orm_us - projection_us:.2f} us/row saved)")
+
+
+async def bench_synthetic(iterations: int) -> None:
+    entities, rows = synthetic_page()
+    assert await render_orm(entities, 12500) == render_projection(rows, 12500), "paths disagree"
+
+    started = time.process_time()
+    for _ in range(iterations):
+        await render_orm(entities, 12500)
+    orm = time.process_time() - started
+
+    started = time.process_time()
+    for _ in range(iterations):
+        render_projection(rows, 12500)
+    projection = time.process_time() - started
+    report(f"response shaping, {ROWS}-row page (synthetic rows)", orm, projection, iterations)
+
+
+async def bench_database(iterations: int) -> None:
+    from app.database import async_session, engine
+
+    async with async_session() as db:
+        user_id = (await db.execute(
+            select(User.id).where(User.email.like(f"%@{EMAIL_DOMAIN}")).order_by(User.email).limit(1)
+        )).scalar()
+    if user_id is None:
+        print("no benchmark users found; run `python -m benchmarks.seed` first")
+        return
+
+    order = (desc(Transaction.transaction_date), desc(Transaction.created_at))
+    orm_query = (
+        select(Transaction, Account.name)
+        .options(selectinload(Transaction.category))
+        .outerjoin(Account, Account.id == Transaction.account_id)
+        .where(Transaction.user_id == user_id)
+        .order_by(*order)
+        .limit(ROWS)
+    )
+    projection_query = (
+        select(*TRANSACTION_COLUMNS)
+        .select_from(Transaction)
+        .outerjoin(Account, Account.id == Transaction.account_id)
+        .outerjoin(Category, Category.id == Transaction.category_id)
+        .where(Transaction.user_id == user_id)
+        .order_by(*order)
+        .limit(ROWS)
+    )
+
+    async def orm_page() -> bytes:
+        async with async_session() as db:
+            return await render_orm((await db.execute(orm_query)).all(), 0)
+
+    async def projection_page() -> bytes:
+        async with async_session() as db:
+            return render_projection((await db.execute(projection_query)).mappings(), 0)
+
+    assert await orm_page() == await projection_page(), "paths disagree"
+    timings = {}
+    for name, page in (("orm", orm_page), ("projection", projection_page)):
+        started = time.process_time()
+        for _ in range(iterations):
+            await page()
+        timings[name] = time.process_time() - started
+    await engine.dispose()
+    report(f"query + response, {ROWS}-row page (seeded database, process CPU)", timings["orm"], timings["projection"], iterations)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--db", action="store_true", help="also benchmark against a seeded database")
+    args = parser.parse_args()
+
+    asyncio.run(bench_synthetic(args.iterations))
+    if args.db:
+        asyncio.run(bench_database(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Compare JSON rendering time and bytes on the wire.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_serialization [--iterations 2000]
+
+Measures the stock ``JSONResponse`` against ``FastJSONResponse`` for a
+100-row transaction page and a portfolio response, and reports the payload
+size raw, gzipped and brotli-compressed at the levels the API uses.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from uuid import uuid4
+
+from fastapi.responses import JSONResponse
+
+from app.compression import CompressionMiddleware
+from app.responses import FastJSONResponse
+from app.schemas import (
+    CategoryResponse,
+    PortfolioBreakdown,
+    PortfolioResponse,
+    TransactionListResponse,
+    TransactionResponse,
+)
+
+MERCHANTS = ["Swiggy", "Amazon India", "Zomato", "Uber", "BigBasket", "Netflix", "IRCTC", "Myntra"]
+CATEGORIES = [
+    CategoryResponse(id=5, name="Food & Dining", icon="🍔"),
+    CategoryResponse(id=6, name="Shopping", icon="🛒"),
+    CategoryResponse(id=7, name="Transportation", icon="🚗"),
+    CategoryResponse(id=12, name="Subscriptions", icon="📦"),
+]
+
+
+def transaction_page(rows: int = 100) -> dict:
+    rng = random.Random(42)
+    account_id = uuid4()
+    now = datetime(2026, 1, 10, 10, 0, 0)
+    transactions = [
+        TransactionResponse(
+            id=uuid4(),
+            account_id=account_id,
+            account_name="HDFC Savings",
+            amount=Decimal(rng.randint(-500000, 500000)) / 100,
+            transaction_type=rng.choice(["debit", "credit"]),
+            description=f"UPI/{rng.randint(10**9, 10**10)}/{rng.choice(MERCHANTS)}",
+            merchant_name=rng.choice(MERCHANTS),
+            category=rng.choice(CATEGORIES),
+            transaction_date=now - timedelta(hours=i * 7),
+            is_recurring=rng.random() < 0.1,
+            created_at=now - timedelta(hours=i * 7),
+        )
+        for i in range(rows)
+    ]
+    page = TransactionListResponse(transactions=transactions, total=12500, limit=rows, offset=0)
+    return page.model_dump(mode="json")
+
+
+def portfolio() -> dict:
+    resp = PortfolioResponse(
+        net_worth=Decimal("12345678.00"),
+        net_worth_change=Decimal("234567.00"),
+        net_worth_change_percent=1.9,
+        total_assets=Decimal("13500000.00"),
+        total_liabilities=Decimal("1154322.00"),
+        breakdown=PortfolioBreakdown(
+            banks=Decimal("1850000.00"),
+            investments=Decimal("8920000.00"),
+            crypto=Decimal("1200000.00"),
+            wallets=Decimal("530000.00"),
+            manual_assets=Decimal("1000000.00"),
+        ),
+        connected_accounts=8,
+        last_updated=datetime(2026, 1, 10, 10, 0, 0),
+    )
+    return resp.model_dump(mode="json")
+
+
+def time_render(response_class, content, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        response_class(content)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def wire_sizes(body: bytes) -> dict:
+    middleware = CompressionMiddleware(app=None)
+    sizes = {"raw": len(body)}
+    for encoding in ("gzip", "br"):
+        try:
+            compressor = middleware.compressor(encoding)
+        except AttributeError:  # brotli not installed
+            continue
+        sizes[encoding] = len(compressor.compress(body) + compressor.finish())
+    return sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    payloads = {"transactions (100 rows)": transaction_page(), "portfolio": portfolio()}
+    for name, content in payloads.items():
+        stock_us = time_render(JSONResponse, content, args.iterations)
+        fast_us = time_render(FastJSONResponse, content, args.iterations)
+        sizes = wire_sizes(FastJSONResponse(content).body)
+
+        print(f"{name}")
+        print(f"  JSONResponse      {stock_us:9.1f} us/render")
+        print(f"  FastJSONResponse  {fast_us:9.1f} us/render  ({stock_us / fast_us:.1f}x)")
+        print("  bytes on wire     " + "  ".join(f"{k}={v}" for k, v in sizes.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Cold-start time of an API worker, checked against a budget.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.bench_startup [--runs 5] [--budget benchmarks/startup_budget.json]
+
+Each run starts a fresh interpreter that imports ``app.main``, runs the
+app's lifespan startup (without pool warm-up unless ``--warmup``), and
+serves ``GET /health`` through ASGI. Reported are the
+median import time, time to first response (import + startup + request)
+and total process time. The run fails (exit 1) when a median exceeds the
+budget, or when a module on the budget's ``forbidden_modules`` list was
+imported before the first response; provider SDKs must load on first use.
+``--importtime`` lists the slowest imports of one run.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_BUDGET = os.path.join(os.path.dirname(__file__), "startup_budget.json")
+
+# Runs in the child interpreter; prints one JSON line
+CHILD = r"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+async def first_request():
+    import httpx
+    async with app.main.app.router.lifespan_context(app.main.app):
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            response = await client.get("/health")
+            response.raise_for_status()
+            return time.perf_counter()
+
+responded = asyncio.run(first_request())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": (responded - started) * 1000,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+def run_once(env: dict) -> dict:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def slowest_imports(env: dict, count: int = 15) -> list:
+    """``(cumulative ms, module)`` for the slowest top-level imports under ``app``."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"], env=env, capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line[12:]:
+            continue
+        _, cumulative, name = (part.strip() for part in line[12:].split("|"))
+        if cumulative.isdigit():
+            rows.append((int(cumulative) / 1000, name))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="JSON budget file; pass '' to only report")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    parser.add_argument("--warmup", action="store_true", help="include connection pool warm-up (needs the database)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # Periodic jobs would start hitting the database during the measurement
+    for name in ("INSIGHT_PURGE_INTERVAL_SECONDS", "NETWORTH_ROLLUP_INTERVAL_SECONDS",
+                 "DELETED_PURGE_INTERVAL_SECONDS", "BILLING_RETRY_INTERVAL_SECONDS"):
+        env.setdefault(name, "0")
+    if not args.warmup:
+        # Pool warm-up time depends on the database, not on the code under budget
+        env["POOL_WARMUP_CONNECTIONS"] = "0"
+
+    runs = [run_once(env) for _ in range(args.runs)]
+    medians = {
+        key: statistics.median(run[key] for run in runs)
+        for key in ("import_ms", "first_request_ms", "process_ms")
+    }
+    print(f"median of {args.runs} cold starts")
+    print(f"  import app.main      {medians['import_ms']:8.0f} ms")
+    print(f"  first response       {medians['first_request_ms']:8.0f} ms")
+    print(f"  process total        {medians['process_ms']:8.0f} ms")
+
+    if args.importtime:
+        print("slowest imports (cumulative)")
+        for ms, name in slowest_imports(env):
+            print(f"  {ms:8.1f} ms  {name}")
+
+    if not args.budget:
+        return
+    with open(args.budget) as f:
+        budget = json.load(f)
+
+    failures = [
+        f"{key} {medians[key]:.0f} ms > budget {budget[key]} ms"
+        for key in ("import_ms", "first_request_ms")
+        if key in budget and medians[key] > budget[key]
+    ]
+    loaded = set(runs[0]["modules"])
+    failures += [
+        f"{module} was imported at startup"
+        for module in budget.get("forbidden_modules", [])
+        if module in loaded
+    ]
+    if failures:
+        print("\nstartup budget exceeded:")
+        print("\n".join(f"  {line}" for line in failures))
+        sys.exit(1)
+    print(f"\nwithin budget ({args.budget})")
+
+
+if __name__ == "__main__":
+    main()
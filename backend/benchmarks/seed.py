@@ -0,0 +1,407 @@
+"""Seed a database with synthetic, reproducible users for benchmarking.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.seed --users 20 --transactions 250000 [--seed 42] [--reset]
+
+Creates users (all with password ``benchmark``) on a mix of plans, each
+with accounts across every ``AccountType``, transactions drawn from a
+catalogue of realistic merchants with matching categories and amounts,
+plus assets, liabilities, insights and net worth history. The same seed
+always produces the same data. Transactions are loaded with ``COPY`` so
+millions of rows take minutes, not hours. Benchmark users live under
+``@bench.payfolio.test`` and ``--reset`` removes them first.
+
+Seed reference data (account types, categories) is inserted when the
+tables are empty; ``--create-schema`` creates missing tables from the models.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterator, List, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, func, insert, select, text
+
+from app.auth import hash_password
+from app.database import Base, async_session, engine
+from app.entitlements import max_accounts_for
+from app.merchants import resolve_merchants
+from app.models import (
+    Account,
+    AccountType,
+    Asset,
+    Category,
+    Insight,
+    Liability,
+    NetWorthHistory,
+    Subscription,
+    Transaction,
+    User,
+)
+
+EMAIL_DOMAIN = "bench.payfolio.test"
+PASSWORD = "benchmark"
+COPY_BATCH_SIZE = 50_000
+
+# Mirrors the seed data in database_schema.md
+ACCOUNT_TYPES = [
+    ("bank", "🏦", "#3B82F6", True),
+    ("wallet", "📱", "#10B981", True),
+    ("investment", "📈", "#8B5CF6", True),
+    ("crypto", "₿", "#F59E0B", True),
+    ("credit_card", "💳", "#EF4444", False),
+    ("loan", "🏠", "#EF4444", False),
+    ("business", "🏢", "#3B82F6", True),
+    ("manual", "✏️", "#6B7280", True),
+]
+CATEGORIES = [
+    ("Salary", "💰", "#10B981", True),
+    ("Business Income", "🏢", "#10B981", True),
+    ("Investment Returns", "📈", "#10B981", True),
+    ("Freelance", "💻", "#10B981", True),
+    ("Food & Dining", "🍔", "#F59E0B", False),
+    ("Shopping", "🛒", "#8B5CF6", False),
+    ("Transportation", "🚗", "#3B82F6", False),
+    ("Bills & Utilities", "📱", "#EF4444", False),
+    ("Entertainment", "🎬", "#EC4899", False),
+    ("Health", "🏥", "#10B981", False),
+    ("Travel", "✈️", "#06B6D4", False),
+    ("Subscriptions", "📦", "#8B5CF6", False),
+    ("Transfer", "↔️", "#6B7280", False),
+    ("Other", "📌", "#6B7280", False),
+]
+
+# (merchant, category, min amount, max amount, relative frequency, recurring)
+MERCHANTS = [
+    ("Swiggy", "Food & Dining", 120, 1500, 40, False),
+    ("Zomato", "Food & Dining", 150, 1800, 35, False),
+    ("Starbucks", "Food & Dining", 250, 900, 8, False),
+    ("BigBasket", "Shopping", 400, 6000, 15, False),
+    ("Amazon India", "Shopping", 200, 25000, 25, False),
+    ("Flipkart", "Shopping", 300, 30000, 15, False),
+    ("Myntra", "Shopping", 500, 8000, 8, False),
+    ("Uber", "Transportation", 90, 1200, 30, False),
+    ("Ola", "Transportation", 80, 1000, 20, False),
+    ("Indian Oil", "Transportation", 500, 4000, 10, False),
+    ("IRCTC", "Travel", 300, 6000, 6, False),
+    ("MakeMyTrip", "Travel", 2500, 60000, 3, False),
+    ("IndiGo", "Travel", 3000, 18000, 3, False),
+    ("Airtel", "Bills & Utilities", 299, 999, 4, True),
+    ("Tata Power", "Bills & Utilities", 800, 6000, 4, True),
+    ("Jio", "Bills & Utilities", 239, 719, 4, True),
+    ("Netflix", "Subscriptions", 199, 649, 4, True),
+    ("Spotify", "Subscriptions", 119, 179, 4, True),
+    ("Disney+ Hotstar", "Subscriptions", 299, 1499, 2, True),
+    ("BookMyShow", "Entertainment", 200, 2500, 6, False),
+    ("Apollo Pharmacy", "Health", 150, 3500, 5, False),
+    ("Practo", "Health", 400, 1500, 2, False),
+    ("NEFT Transfer", "Transfer", 1000, 100000, 6, False),
+    ("ATM Withdrawal", "Other", 500, 10000, 5, False),
+]
+# (source, category, min amount, max amount, relative frequency)
+INCOME = [
+    ("Salary Credit", "Salary", 60000, 350000, 10),
+    ("Upwork", "Freelance", 5000, 80000, 2),
+    ("Dividend", "Investment Returns", 100, 20000, 2),
+    ("Client Payment", "Business Income", 10000, 250000, 1),
+]
+
+# (account type, name, institution)
+ACCOUNTS = [
+    ("bank", "HDFC Savings", "HDFC Bank"),
+    ("bank", "ICICI Salary", "ICICI Bank"),
+    ("wallet", "Paytm Wallet", "Paytm"),
+    ("investment", "Zerodha Demat", "Zerodha"),
+    ("crypto", "WazirX", "WazirX"),
+    ("credit_card", "Amazon Pay ICICI", "ICICI Bank"),
+    ("loan", "Home Loan", "SBI"),
+    ("business", "Current Account", "Kotak Mahindra Bank"),
+    ("manual", "Cash", None),
+]
+# Accounts that carry spending
+SPENDING_TYPES = ("bank", "wallet", "credit_card", "business")
+
+ASSETS = [
+    ("Apartment", "real_estate", 4_500_000, 9_000_000, None),
+    ("Gold Coins", "gold", 150_000, 600_000, None),
+    ("Reliance Industries", "stock", 50_000, 400_000, "RELIANCE"),
+    ("Nifty 50 Index Fund", "mutual_fund", 100_000, 1_500_000, None),
+    ("Fixed Deposit", "fixed_deposit", 100_000, 1_000_000, None),
+    ("Car", "vehicle", 400_000, 1_500_000, None),
+]
+LIABILITIES = [
+    ("Home Loan", "home_loan", 2_000_000, 8_000_000, 8.5, "SBI"),
+    ("Car Loan", "vehicle_loan", 300_000, 1_200_000, 9.2, "HDFC Bank"),
+    ("Personal Loan", "personal_loan", 100_000, 800_000, 13.5, "Bajaj Finserv"),
+    ("Education Loan", "education_loan", 300_000, 2_000_000, 10.0, "Axis Bank"),
+]
+INSIGHTS = [
+    ("spending_alert", "Food delivery spend is up 23% this month", "warning"),
+    ("savings_opportunity", "You could save ₹1,200/month on subscriptions", "info"),
+    ("investment_tip", "Your emergency fund covers 4.5 months of expenses", "success"),
+    ("bill_reminder", "Credit card bill of ₹18,450 is due in 3 days", "warning"),
+]
+PLANS = (("free", 5), ("pro", 3), ("business", 1), ("enterprise", 1))
+
+HISTORY_DAYS = 730
+
+
+def _uuid(rng: random.Random) -> UUID:
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+def _amount(rng: random.Random, low: float, high: float) -> Decimal:
+    # Skewed towards the low end, like real spending
+    return Decimal(round(low + (high - low) * rng.random() ** 2.5, 2)).quantize(Decimal("0.01"))
+
+
+async def seed_reference_data(db) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Insert account types and categories if absent; returns name -> id for both."""
+    if not (await db.execute(select(func.count(AccountType.id)))).scalar_one():
+        await db.execute(insert(AccountType), [
+            {"name": name, "icon": icon, "color": color, "is_asset": is_asset}
+            for name, icon, color, is_asset in ACCOUNT_TYPES
+        ])
+    if not (await db.execute(select(func.count(Category.id)))).scalar_one():
+        await db.execute(insert(Category), [
+            {"name": name, "icon": icon, "color": color, "is_income": is_income}
+            for name, icon, color, is_income in CATEGORIES
+        ])
+    account_types = dict((await db.execute(select(AccountType.name, AccountType.id))).all())
+    categories = dict((await db.execute(select(Category.name, Category.id).where(Category.parent_id.is_(None)))).all())
+    return account_types, categories
+
+
+def transaction_rows(
+    rng: random.Random,
+    user_id: UUID,
+    accounts: List[Tuple[UUID, str]],
+    categories: Dict[str, int],
+    merchants: Dict[str, int],
+    count: int,
+    end: datetime,
+) -> Iterator[tuple]:
+    """``count`` transactions over the last two years, oldest first, in ``COPY`` column order."""
+    spending = [account_id for account_id, type_name in accounts if type_name in SPENDING_TYPES]
+    income_accounts = [account_id for account_id, type_name in accounts if type_name in ("bank", "business")]
+    merchant_weights = [m[4] for m in MERCHANTS]
+    income_weights = [i[4] for i in INCOME]
+    step = HISTORY_DAYS * 86400 / max(count, 1)
+    start = end - timedelta(days=HISTORY_DAYS)
+
+    for i in range(count):
+        txn_date = start + timedelta(seconds=i * step + rng.random() * step)
+        if rng.random() < 0.06:
+            source, category, low, high, _ = rng.choices(INCOME, income_weights)[0]
+            account_id = rng.choice(income_accounts)
+            amount, txn_type, recurring = _amount(rng, low, high), "credit", source == "Salary Credit"
+            merchant = source
+        else:
+            merchant, category, low, high, _, recurring = rng.choices(MERCHANTS, merchant_weights)[0]
+            account_id = rng.choice(spending)
+            amount, txn_type = -_amount(rng, low, high), "debit"
+        yield (
+            _uuid(rng),
+            user_id,
+            account_id,
+            categories.get(category),
+            amount,
+            "INR",
+            txn_type,
+            f"UPI/{rng.randint(10**11, 10**12 - 1)}/{merchant.upper()}",
+            merchant,
+            merchants.get(merchant),
+            recurring,
+            recurring and category == "Subscriptions",
+            txn_date,
+            txn_date + timedelta(days=rng.randint(0, 2)),
+            txn_date.replace(tzinfo=timezone.utc),
+        )
+
+
+TRANSACTION_COLUMNS = [
+    "id", "user_id", "account_id", "category_id", "amount", "currency", "transaction_type", "description",
+    "merchant_name", "merchant_id", "is_recurring", "is_subscription", "transaction_date", "posted_date", "created_at",
+]
+
+
+async def copy_transactions(rows: Iterator[tuple]) -> int:
+    """Bulk-load rows with ``COPY``, one batch per round trip."""
+    total = 0
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        while True:
+            batch = [row for _, row in zip(range(COPY_BATCH_SIZE), rows)]
+            if not batch:
+                break
+            await raw.driver_connection.copy_records_to_table(
+                Transaction.__tablename__, records=batch, columns=TRANSACTION_COLUMNS
+            )
+            total += len(batch)
+        await conn.commit()
+    return total
+
+
+async def seed_user(
+    rng: random.Random,
+    index: int,
+    password_hash: str,
+    account_types: Dict[str, int],
+    categories: Dict[str, int],
+    merchants: Dict[str, int],
+    transactions: int,
+    now: datetime,
+) -> int:
+    user_id = _uuid(rng)
+    plan = rng.choices([p for p, _ in PLANS], [w for _, w in PLANS])[0]
+    accounts = [(_uuid(rng), type_name, name, institution) for type_name, name, institution in ACCOUNTS]
+
+    async with async_session() as db:
+        db.add(User(
+            id=user_id,
+            email=f"user{index:05d}@{EMAIL_DOMAIN}",
+            password_hash=password_hash,
+            full_name=f"Benchmark User {index}",
+            plan=plan,
+            email_verified=True,
+        ))
+        await db.flush()
+        db.add(Subscription(user_id=user_id, plan=plan, status="active", max_accounts=max(max_accounts_for(plan), len(accounts))))
+        await db.execute(insert(Account), [
+            {
+                "id": account_id,
+                "user_id": user_id,
+                "account_type_id": account_types.get(type_name),
+                "name": name,
+                "institution": institution,
+                "current_balance": _amount(rng, 1000, 2_000_000),
+                "connection_type": "manual" if type_name == "manual" else "aggregator",
+                "last_synced_at": now,
+            }
+            for account_id, type_name, name, institution in accounts
+        ])
+        await db.execute(insert(Asset), [
+            {
+                "user_id": user_id,
+                "name": name,
+                "asset_type": asset_type,
+                "current_value": _amount(rng, low, high),
+                "purchase_value": _amount(rng, low * 0.7, high * 0.9),
+                "purchase_date": now.replace(tzinfo=None) - timedelta(days=rng.randint(90, 3000)),
+                "symbol": symbol,
+                "quantity": Decimal(rng.randint(1, 500)) if symbol else None,
+            }
+            for name, asset_type, low, high, symbol in rng.sample(ASSETS, rng.randint(2, len(ASSETS)))
+        ])
+        loan_account = next(account_id for account_id, type_name, _, _ in accounts if type_name == "loan")
+        liabilities = []
+        for name, liability_type, low, high, rate, lender in rng.sample(LIABILITIES, rng.randint(1, len(LIABILITIES))):
+            principal = _amount(rng, low, high)
+            start = now.replace(tzinfo=None) - timedelta(days=rng.randint(180, 2500))
+            liabilities.append({
+                "user_id": user_id,
+                "linked_account_id": loan_account if liability_type == "home_loan" else None,
+                "name": name,
+                "liability_type": liability_type,
+                "principal_amount": principal,
+                "current_balance": (principal * Decimal(rng.uniform(0.2, 0.95))).quantize(Decimal("0.01")),
+                "interest_rate": Decimal(str(rate)),
+                "emi_amount": (principal / 120).quantize(Decimal("0.01")),
+                "emi_day": rng.randint(1, 28),
+                "start_date": start,
+                "end_date": start + timedelta(days=3650),
+                "lender": lender,
+            })
+        await db.execute(insert(Liability), liabilities)
+        await db.execute(insert(Insight), [
+            {
+                "user_id": user_id,
+                "insight_type": insight_type,
+                "title": title,
+                "description": title,
+                "severity": severity,
+                "is_read": rng.random() < 0.5,
+                "valid_until": now + timedelta(days=30),
+            }
+            for insight_type, title, severity in INSIGHTS
+        ])
+        net_worth = _amount(rng, 500_000, 20_000_000)
+        history = []
+        for day in range(HISTORY_DAYS, -1, -1):
+            net_worth *= Decimal(1 + rng.gauss(0.0004, 0.01))
+            total_assets = net_worth * Decimal("1.3")
+            history.append({
+                "user_id": user_id,
+                "snapshot_date": (now - timedelta(days=day)).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0),
+                "total_assets": total_assets.quantize(Decimal("0.01")),
+                "total_liabilities": (total_assets - net_worth).quantize(Decimal("0.01")),
+                "net_worth": net_worth.quantize(Decimal("0.01")),
+            })
+        await db.execute(insert(NetWorthHistory), history)
+        await db.commit()
+
+    rows = transaction_rows(
+        rng, user_id, [(account_id, type_name) for account_id, type_name, _, _ in accounts],
+        categories, merchants, transactions, now.replace(tzinfo=None),
+    )
+    return await copy_transactions(rows)
+
+
+async def reset() -> int:
+    async with async_session() as db:
+        result = await db.execute(delete(User).where(User.email.like(f"%@{EMAIL_DOMAIN}")))
+        await db.commit()
+    return result.rowcount
+
+
+async def seed(users: int, transactions: int, seed: int = 42, create_schema: bool = False) -> None:
+    # Fixed "now" so two runs with the same seed are identical
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    if create_schema:
+        async with engine.begin() as conn:
+            # Transaction search indexes need both
+            for extension in ("pg_trgm", "btree_gin"):
+                await conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {extension}"))
+            await conn.run_sync(Base.metadata.create_all)
+
+    async with async_session() as db:
+        account_types, categories = await seed_reference_data(db)
+        # Resolved once up front; every COPY row carries its merchant_id
+        merchants = await resolve_merchants(db, [m[0] for m in MERCHANTS] + [i[0] for i in INCOME])
+        await db.commit()
+
+    password_hash = hash_password(PASSWORD)
+    started = time.perf_counter()
+    total = 0
+    for index in range(users):
+        # Each user gets its own stream so --users N is a prefix of --users N+1
+        total += await seed_user(
+            random.Random(f"{seed}:{index}"), index, password_hash, account_types, categories, merchants, transactions, now
+        )
+        print(f"user {index + 1}/{users}: {total} transactions ({total / (time.perf_counter() - started):,.0f} rows/s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--transactions", type=int, default=100_000, help="per user")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="delete existing benchmark users first")
+    parser.add_argument("--create-schema", action="store_true", help="create missing tables from the models")
+    args = parser.parse_args()
+
+    async def run():
+        if args.reset:
+            print(f"removed {await reset()} benchmark users")
+        await seed(args.users, args.transactions, args.seed, args.create_schema)
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Shared fixtures.
+
+Tests that need the database run against a disposable Postgres::
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost/payfolio_test pytest
+
+Its tables are dropped and recreated from the models on every run. Without
+``TEST_DATABASE_URL`` those tests are skipped and the rest still run.
+"""
+import os
+
+# Settings are read once, on first import of the app
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL", "")
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL or "postgresql://payfolio@localhost/payfolio_test"
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_test")
+os.environ.setdefault("RAZORPAY_WEBHOOK_SECRET", "rzp_test")
+
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import delete, text
+
+from app.database import Base, async_session, engine
+from app.models import User
+
+# Every test enforces the routes' query budgets
+pytest_plugins = ["app.testing"]
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    # One event loop for the whole run, so pooled asyncpg connections stay usable
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def database(anyio_backend):
+    if not TEST_DATABASE_URL:
+        pytest.skip("set TEST_DATABASE_URL to run database tests")
+    async with engine.begin() as conn:
+        for extension in ("pg_trgm", "btree_gin"):
+            await conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {extension}"))
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def user(database):
+    async with async_session() as db:
+        user = User(email=f"{uuid4().hex}@test.payfolio.app", plan="free", currency="INR")
+        db.add(user)
+        await db.commit()
+    yield user
+    # Everything the user owns goes with it through ON DELETE CASCADE
+    async with async_session() as db:
+        await db.execute(delete(User).where(User.id == user.id))
+        await db.commit()
@@ -0,0 +1,241 @@
+import asyncio
+import random
+import time
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import func, select, update
+
+from app import billing_events
+from app.billing_events import (
+    EventDispatcher,
+    SignatureError,
+    UnknownPlanError,
+    fake_event,
+    parse_webhook,
+    process_event,
+    replay,
+    sign_stripe,
+    store_event,
+    subscription_change,
+)
+from app.database import async_session
+from app.models import BillingEvent, Subscription, User
+
+pytestmark = pytest.mark.anyio
+
+
+def _headers(headers):
+    # Starlette hands the webhook lower-cased header names
+    return {key.lower(): value for key, value in headers.items()}
+
+
+def _customer() -> str:
+    return f"cus_{uuid4().hex[:14]}"
+
+
+async def _receive(body: bytes, headers) -> BillingEvent:
+    event = parse_webhook(body, _headers(headers))
+    async with async_session() as db:
+        event.id = await store_event(db, event)
+        await db.commit()
+    return event
+
+
+async def _plan(user_id) -> str:
+    async with async_session() as db:
+        return await db.scalar(select(User.plan).where(User.id == user_id))
+
+
+# ============ Signatures ============
+
+@pytest.mark.parametrize("provider", ["stripe", "razorpay"])
+def test_signed_fake_event_parses(provider):
+    customer = _customer()
+    body, headers = fake_event(provider, "subscription.activated", customer, status="active")
+
+    event = parse_webhook(body, _headers(headers))
+
+    assert event.provider == provider
+    assert event.customer_id == customer
+    assert event.event_type == "subscription.activated"
+
+
+def test_tampered_stripe_body_is_rejected():
+    body, headers = fake_event("stripe", "customer.subscription.updated", _customer(), status="active")
+    tampered = body.replace(b'"active"', b'"canceled"')
+
+    with pytest.raises(SignatureError):
+        parse_webhook(tampered, _headers(headers))
+
+
+def test_stripe_signature_with_wrong_secret_is_rejected():
+    body, headers = fake_event("stripe", "customer.subscription.updated", _customer(), secret="whsec_other")
+
+    with pytest.raises(SignatureError):
+        parse_webhook(body, _headers(headers))
+
+
+def test_stale_stripe_signature_is_rejected():
+    body, headers = fake_event("stripe", "customer.subscription.updated", _customer())
+    headers["Stripe-Signature"] = sign_stripe(body, "whsec_test", int(time.time()) - 3600)
+
+    with pytest.raises(SignatureError):
+        parse_webhook(body, _headers(headers))
+
+
+def test_tampered_razorpay_body_is_rejected():
+    body, headers = fake_event("razorpay", "subscription.charged", _customer(), status="active")
+    tampered = body.replace(b'"active"', b'"cancelled"')
+
+    with pytest.raises(SignatureError):
+        parse_webhook(tampered, _headers(headers))
+
+
+def test_unsigned_delivery_is_rejected():
+    body, _ = fake_event("stripe", "customer.subscription.updated", _customer())
+
+    with pytest.raises(SignatureError):
+        parse_webhook(body, {"content-type": "application/json"})
+
+
+# ============ Plans ============
+
+def test_price_lookup_key_maps_to_plan():
+    body, headers = fake_event(
+        "stripe", "customer.subscription.updated", _customer(),
+        status="active", items={"data": [{"price": {"lookup_key": "business_yearly", "recurring": {"interval": "year"}}}]},
+    )
+
+    change = subscription_change(parse_webhook(body, _headers(headers)))
+
+    assert change["plan"] == "business"
+    assert change["billing_cycle"] == "yearly"
+
+
+@pytest.mark.parametrize("fields", [
+    {"items": {"data": [{"price": {"lookup_key": "pro_weekly"}}]}},
+    {"metadata": {"plan": "platinum"}},
+])
+def test_unknown_plan_is_refused(fields):
+    body, headers = fake_event("stripe", "customer.subscription.updated", _customer(), status="active", **fields)
+
+    with pytest.raises(UnknownPlanError):
+        subscription_change(parse_webhook(body, _headers(headers)))
+
+
+# ============ Ordering ============
+
+async def test_dispatcher_keeps_each_customers_events_in_order(monkeypatch):
+    processed = []
+
+    async def record(event_pk):
+        # Uneven processing times would reorder events if one customer's went to several workers
+        await asyncio.sleep(random.random() / 100)
+        processed.append(event_pk)
+        return "processed"
+
+    monkeypatch.setattr(billing_events, "process_event", record)
+    dispatcher = EventDispatcher(workers=4)
+    submitted = {}
+    for index in range(60):
+        customer = f"cus_{index % 6}"
+        submitted.setdefault(customer, []).append((customer, index))
+        dispatcher.submit((customer, index), customer)
+    await dispatcher.stop(timeout=5)
+
+    assert len(processed) == 60
+    for customer, events in submitted.items():
+        assert [pk for pk in processed if pk[0] == customer] == events
+
+
+# ============ Storage and processing ============
+
+async def test_redelivered_event_is_stored_once(database):
+    body, headers = fake_event("stripe", "customer.subscription.updated", _customer(), status="active")
+
+    first = await _receive(body, headers)
+    second = await _receive(body, headers)
+
+    assert first.id is not None
+    assert second.id is None
+    async with async_session() as db:
+        count = await db.scalar(select(func.count()).where(BillingEvent.event_id == first.event_id))
+    assert count == 1
+
+
+async def test_events_apply_the_plan(user):
+    customer = _customer()
+    checkout = await _receive(*fake_event(
+        "stripe", "checkout.session.completed", customer,
+        client_reference_id=str(user.id), subscription="sub_1", metadata={"plan": "pro"},
+    ))
+
+    assert await process_event(checkout.id) == "processed"
+    assert await _plan(user.id) == "pro"
+
+
+async def test_older_event_is_skipped_once_a_newer_one_applied(user):
+    customer = _customer()
+    now = int(time.time())
+    await _link(user, customer, occurred_at=now - 120)
+    newer = await _receive(*fake_event(
+        "stripe", "customer.subscription.updated", customer, occurred_at=now,
+        status="active", metadata={"plan": "business"},
+    ))
+    older = await _receive(*fake_event(
+        "stripe", "customer.subscription.updated", customer, occurred_at=now - 60,
+        status="active", metadata={"plan": "pro"},
+    ))
+
+    assert await process_event(newer.id) == "processed"
+    assert await process_event(older.id) == "skipped"
+    assert await _plan(user.id) == "business"
+
+
+async def test_event_before_link_waits_and_applies_in_order(user):
+    customer = _customer()
+    now = int(time.time())
+    early = await _receive(*fake_event(
+        "stripe", "customer.subscription.updated", customer, occurred_at=now - 60,
+        status="past_due", metadata={"plan": "pro"},
+    ))
+
+    assert await process_event(early.id) == "unlinked"
+    assert await process_event(early.id) == "unlinked"
+
+    await _link(user, customer, occurred_at=now, plan="pro")
+
+    async with async_session() as db:
+        assert await db.scalar(select(BillingEvent.status).where(BillingEvent.id == early.id)) == "processed"
+        sub = await db.scalar(select(Subscription).where(Subscription.user_id == user.id))
+    # The earlier event's status survives; the later link event doesn't carry one
+    assert sub.status == "past_due"
+    assert sub.stripe_customer_id == customer
+
+
+async def test_replay_force_reapplies_processed_events(user):
+    customer = _customer()
+    checkout = await _link(user, customer, plan="pro")
+    async with async_session() as db:
+        await db.execute(update(User).where(User.id == user.id).values(plan="free"))
+        await db.commit()
+
+    # Without force a processed event is left alone
+    assert await process_event(checkout.id) == "processed"
+    assert await _plan(user.id) == "free"
+
+    assert await replay(event_ids=[checkout.event_id]) == {"processed": 1}
+    assert await _plan(user.id) == "pro"
+    async with async_session() as db:
+        attempts = await db.scalar(select(BillingEvent.attempts).where(BillingEvent.id == checkout.id))
+    assert attempts == 2
+
+
+async def _link(user, customer: str, occurred_at: int = None, plan: str = "pro") -> BillingEvent:
+    checkout = await _receive(*fake_event(
+        "stripe", "checkout.session.completed", customer, occurred_at=occurred_at,
+        client_reference_id=str(user.id), subscription=f"sub_{uuid4().hex[:14]}", metadata={"plan": plan},
+    ))
+    assert await process_event(checkout.id) == "processed"
+    return checkout
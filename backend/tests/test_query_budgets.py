@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import httpx
+import pytest
+
+from app.auth import create_access_token
+from app.database import async_session
+from app.main import app
+from app.models import Account, Transaction
+
+pytestmark = pytest.mark.anyio
+
+# Enough rows that a per-row query would blow any of the budgets
+ROWS = 20
+
+
+@pytest.fixture
+async def client(user):
+    headers = {"Authorization": f"Bearer {create_access_token(user.id, user.plan)}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", headers=headers) as client:
+        yield client
+
+
+@pytest.fixture
+async def accounts(user):
+    async with async_session() as db:
+        accounts = [Account(user_id=user.id, name=f"Account {index}", currency="INR") for index in range(ROWS)]
+        db.add_all(accounts)
+        await db.flush()
+        start = datetime(2024, 1, 1)
+        db.add_all(
+            Transaction(
+                user_id=user.id, account_id=account.id, amount=Decimal(-100 - index),
+                currency="INR", transaction_type="debit", transaction_date=start + timedelta(days=index),
+            )
+            for index, account in enumerate(accounts)
+        )
+        await db.commit()
+    return accounts
+
+
+async def test_list_accounts_stays_within_budget(client, accounts):
+    response = await client.get("/v1/accounts")
+
+    assert response.status_code == 200
+    assert response.json()["total"] == ROWS
+
+
+@pytest.mark.parametrize("params", [{}, {"transaction_type": "debit", "date_from": "2024-01-05T00:00:00"}])
+async def test_list_transactions_stays_within_budget(client, accounts, params):
+    response = await client.get("/v1/transactions", params={**params, "limit": 100})
+
+    assert response.status_code == 200
+    assert response.json()["transactions"]
+
+
+async def test_over_budget_request_fails_the_test(client, accounts, query_budget_guard, monkeypatch):
+    route = next(route for route in app.routes if getattr(route, "path", None) == "/v1/accounts")
+    monkeypatch.setattr(route.endpoint, "query_budget", 0)
+
+    response = await client.get("/v1/accounts")
+
+    assert response.status_code == 500
+    assert response.json()["detail"]["code"] == "QUERY_BUDGET_EXCEEDED"
+    # Drained so the guard doesn't fail this test at teardown
+    assert [exceeded.route for exceeded in query_budget_guard] == ["/v1/accounts"]
+    query_budget_guard.clear()
@@ -0,0 +1,14 @@
+from fastapi.testclient import TestClient
+
+from app.config import get_settings
+from app.main import app
+
+
+def test_payment_webhook_is_not_rate_limited():
+    client = TestClient(app)
+    bursts = get_settings().RATE_LIMIT_IP_PER_MINUTE + 5
+
+    statuses = {client.post("/v1/billing/webhook", content=b"{}").status_code for _ in range(bursts)}
+
+    # Unsigned, so refused, but never throttled
+    assert statuses == {400}
@@ -3,6 +3,7 @@
 import { useState, useEffect } from "react";
 import Link from "next/link";
 import { useRouter } from "next/navigation";
+import { api } from "@/lib/api";
 import {
     LayoutDashboard,
     Wallet,
@@ -52,6 +53,7 @@ export default function DashboardPage() {
     const router = useRouter();
     const [user, setUser] = useState<any>(null);
     const [isLoading, setIsLoading] = useState(true);
+    const [updatedAt, setUpdatedAt] = useState<Date | null>(null);
 
     useEffect(() => {
         // Check auth
@@ -62,6 +64,9 @@ export default function DashboardPage() {
         }
         setUser(JSON.parse(storedUser));
         setIsLoading(false);
+
+        // Pushed by the server on every write; no polling
+        return api.subscribe(() => setUpdatedAt(new Date()));
     }, [router]);
 
     const handleLogout = () => {
@@ -209,6 +214,11 @@ export default function DashboardPage() {
                             <div className="flex items-center justify-between mb-6">
                                 <h2 className="text-h3 text-text-primary">Accounts</h2>
                                 <div className="flex items-center gap-2">
+                                    {updatedAt && (
+                                        <span className="text-small text-text-secondary">
+                                            Updated {updatedAt.toLocaleTimeString()}
+                                        </span>
+                                    )}
                                     <button className="p-2 hover:bg-surface-elevated rounded-lg transition-colors">
                                         <RefreshCw className="w-4 h-4 text-text-secondary" />
                                     </button>
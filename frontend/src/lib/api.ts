@@ -6,7 +6,15 @@ interface RequestOptions {
     headers?: Record<string, string>;
 }
 
+interface CachedResponse {
+    etag: string;
+    data: any;
+}
+
 class ApiClient {
+    // Last payload per GET endpoint, revalidated with If-None-Match
+    private etagCache = new Map<string, CachedResponse>();
+
     private getToken(): string | null {
         if (typeof window === "undefined") return null;
         return localStorage.getItem("access_token");
@@ -24,18 +32,97 @@ class ApiClient {
             headers["Authorization"] = `Bearer ${token}`;
         }
 
+        const method = options.method || "GET";
+        const cached = method === "GET" ? this.etagCache.get(endpoint) : undefined;
+        if (cached) {
+            headers["If-None-Match"] = cached.etag;
+        }
+
         const res = await fetch(`${API_BASE}${endpoint}`, {
-            method: options.method || "GET",
+            method,
             headers,
             body: options.body ? JSON.stringify(options.body) : undefined,
         });
 
+        if (res.status === 304 && cached) {
+            return cached.data;
+        }
+
         if (!res.ok) {
             const error = await res.json().catch(() => ({ detail: "Request failed" }));
             throw new Error(error.detail || `HTTP ${res.status}`);
         }
 
-        return res.json();
+        if (res.status === 204) {
+            return undefined as T;
+        }
+
+        const data = await res.json();
+        const etag = res.headers.get("ETag");
+        if (method === "GET" && etag) {
+            this.etagCache.set(endpoint, { etag, data });
+        }
+        return data;
+    }
+
+    clearCache() {
+        this.etagCache.clear();
+    }
+
+    // Live updates: calls onChange with the changed resources ("accounts",
+    // "transactions", ...) instead of the page polling. Refetches stay cheap,
+    // since unchanged endpoints still answer 304. Returns an unsubscribe function.
+    subscribe(onChange: (resources: string[]) => void): () => void {
+        const controller = new AbortController();
+        let retryMs = 3000;
+
+        const connect = async () => {
+            const token = this.getToken();
+            const res = await fetch(`${API_BASE}/events`, {
+                headers: token ? { Authorization: `Bearer ${token}` } : {},
+                signal: controller.signal,
+            });
+            if (!res.ok || !res.body) {
+                throw new Error(`HTTP ${res.status}`);
+            }
+
+            const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+            let buffer = "";
+            for (;;) {
+                const { value, done } = await reader.read();
+                if (done) return;
+                buffer += value;
+                let end;
+                while ((end = buffer.indexOf("\n\n")) !== -1) {
+                    const frame = buffer.slice(0, end);
+                    buffer = buffer.slice(end + 2);
+                    let event = "message";
+                    let data = "";
+                    for (const line of frame.split("\n")) {
+                        if (line.startsWith("retry: ")) retryMs = Number(line.slice(7)) || retryMs;
+                        else if (line.startsWith("event: ")) event = line.slice(7);
+                        else if (line.startsWith("data: ")) data += line.slice(6);
+                    }
+                    if (event === "changed") {
+                        onChange(JSON.parse(data).resources);
+                    } else if (event === "ready") {
+                        // Writes may have landed while disconnected
+                        onChange([]);
+                    }
+                }
+            }
+        };
+
+        const run = async () => {
+            while (!controller.signal.aborted) {
+                await connect().catch(() => undefined);
+                if (controller.signal.aborted) return;
+                await new Promise((resolve) => setTimeout(resolve, retryMs));
+            }
+        };
+        run();
+
+        return () => controller.abort();
     }
 
     // Auth